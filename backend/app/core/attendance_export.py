@@ -0,0 +1,135 @@
+"""
+Streaming attendance export for payroll (CSV or newline-delimited JSON).
+
+One query reads attendance joined to the employee name and the day's short
+leaves, ordered by (employee_id, date_only) so the company composite index
+serves it without a sort, through a server-side cursor (yield_per). Leave
+rows are totalled per attendance row as they stream past instead of with
+a GROUP BY, so memory stays flat however long the range is. Output goes
+out in chunks of `chunk_size` rows; the CSV header goes out before the
+query runs.
+
+The generator opens its own session: it runs after the endpoint has
+returned, when the request's session is already closed.
+"""
+import csv
+import io
+import json
+from datetime import date
+from typing import Iterator, Optional
+
+from sqlalchemy import and_, select
+from sqlalchemy.orm import Session
+
+from app.db.database import SessionLocal
+from app.db.models import Attendance, Employee, ShortLeave
+
+EXPORT_FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+EXPORT_COLUMNS = (
+    "employee_id", "name", "date", "status", "check_in_time", "check_out_time", "worked_minutes",
+    "door_unlock_time", "is_emergency_checkout", "emergency_checkout_reason", "source", "method",
+    "short_leave_count", "short_leave_minutes"
+)
+
+
+def _minutes(start, end) -> Optional[int]:
+    return int((end - start).total_seconds() // 60) if start and end else None
+
+
+def _isoformat(value) -> Optional[str]:
+    return value.isoformat() if value else None
+
+
+def iter_attendance_rows(db: Session, company_id: int, start: date, end: date,
+                         employee_code: Optional[str] = None, chunk_size: int = 2000) -> Iterator[dict]:
+    """Export rows ordered by employee, then day"""
+    query = select(
+        Attendance.id, Attendance.employee_id, Employee.name, Attendance.date_only, Attendance.status,
+        Attendance.check_in_time, Attendance.check_out_time, Attendance.door_unlock_time,
+        Attendance.is_emergency_checkout, Attendance.emergency_checkout_reason,
+        Attendance.source, Attendance.method, ShortLeave.exit_time, ShortLeave.return_time
+    ).outerjoin(Employee, and_(
+        Employee.company_id == Attendance.company_id,
+        Employee.employee_id == Attendance.employee_id
+    )).outerjoin(ShortLeave, and_(
+        ShortLeave.company_id == Attendance.company_id,
+        ShortLeave.employee_id == Attendance.employee_id,
+        ShortLeave.date_only == Attendance.date_only
+    )).where(
+        Attendance.company_id == company_id,
+        Attendance.date_only >= start,
+        Attendance.date_only <= end
+    )
+    if employee_code:
+        query = query.where(Attendance.employee_id == employee_code)
+    # (employee_id, date_only) is unique per company, so a day's leave rows arrive together
+    query = query.order_by(Attendance.employee_id, Attendance.date_only)
+
+    current, leave_count, leave_minutes = None, 0, 0
+    # Core execution on the session's connection: plain tuples, no ORM loading per row
+    for row in db.connection().execute(query.execution_options(yield_per=chunk_size)):
+        if current is not None and row[0] != current[0]:
+            yield _export_row(current, leave_count, leave_minutes)
+            leave_count, leave_minutes = 0, 0
+        current = row
+        if row[12] is not None:
+            leave_count += 1
+            leave_minutes += _minutes(row[12], row[13]) or 0
+    if current is not None:
+        yield _export_row(current, leave_count, leave_minutes)
+
+
+def _export_row(row, leave_count: int, leave_minutes: int) -> dict:
+    (_, employee_id, name, date_only, status, check_in, check_out, door_unlock,
+     emergency, emergency_reason, source, method, _, _) = row
+    return {
+        "employee_id": employee_id,
+        "name": name,
+        "date": date_only.isoformat(),
+        "status": status,
+        "check_in_time": _isoformat(check_in),
+        "check_out_time": _isoformat(check_out),
+        "worked_minutes": _minutes(check_in, check_out),
+        "door_unlock_time": _isoformat(door_unlock),
+        "is_emergency_checkout": bool(emergency),
+        "emergency_checkout_reason": emergency_reason,
+        "source": source,
+        "method": method,
+        "short_leave_count": leave_count,
+        "short_leave_minutes": leave_minutes
+    }
+
+
+def stream_export(company_id: int, start: date, end: date, fmt: str,
+                  employee_code: Optional[str] = None, chunk_size: int = 2000) -> Iterator[str]:
+    """Encoded export chunks for a StreamingResponse"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS) if fmt == "csv" else None
+
+    def drain() -> str:
+        chunk = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return chunk
+
+    if writer:
+        writer.writeheader()
+        yield drain()
+
+    db = SessionLocal()
+    try:
+        pending = 0
+        for row in iter_attendance_rows(db, company_id, start, end, employee_code, chunk_size):
+            if writer:
+                writer.writerow(row)
+            else:
+                buffer.write(json.dumps(row))
+                buffer.write("\n")
+            pending += 1
+            if pending >= chunk_size:
+                yield drain()
+                pending = 0
+        if pending:
+            yield drain()
+    finally:
+        db.close()
@@ -0,0 +1,175 @@
+"""
+Per-company daily attendance counters (daily_attendance_summary).
+
+Dashboards read one row per day instead of counting raw attendance rows.
+Writers take `snapshot()` of a row before changing it and pass the
+before/after pair to `record_change()` ahead of their commit. The
+difference is added to the day's counters with an atomic upsert in the
+same transaction, so a rolled-back write never reaches the summary and
+concurrent writers can't lose each other's increments.
+
+Short leaves bump their counters with `add_counts()` directly. `rebuild()`
+recomputes days from attendance / short_leaves (backfill and repair); run
+it when the affected days are quiet, as writes landing mid-rebuild can be
+counted twice or not at all.
+"""
+from datetime import date, datetime, timedelta
+from typing import Iterable, Optional, Tuple
+
+from sqlalchemy import case, func, update, insert
+from sqlalchemy.orm import Session
+
+from app.db.models import Attendance, DailyAttendanceSummary, ShortLeave
+
+STATUS_COUNTERS = {"Present": "present", "Late": "late", "Super Late": "super_late"}
+ATTENDANCE_COUNTERS = ("present", "late", "super_late", "checked_out", "emergency_checkouts")
+COUNTERS = ATTENDANCE_COUNTERS + ("short_leaves", "on_short_leave")
+
+Snapshot = Tuple[int, date, dict]
+
+
+def _field(row, name: str):
+    return row.get(name) if isinstance(row, dict) else getattr(row, name, None)
+
+
+def snapshot(row) -> Optional[Snapshot]:
+    """(company_id, day, counters) an Attendance row (or insert dict) contributes; None for no row"""
+    if row is None or _field(row, "date_only") is None:
+        return None
+    counts = dict.fromkeys(ATTENDANCE_COUNTERS, 0)
+    column = STATUS_COUNTERS.get(_field(row, "status"))
+    if column:
+        counts[column] = 1
+    counts["checked_out"] = int(_field(row, "check_out_time") is not None)
+    counts["emergency_checkouts"] = int(bool(_field(row, "is_emergency_checkout")))
+    return _field(row, "company_id"), _field(row, "date_only"), counts
+
+
+def record_change(db: Session, before: Optional[Snapshot], after: Optional[Snapshot]):
+    record_changes(db, [(before, after)])
+
+
+def record_changes(db: Session, changes: Iterable[Tuple[Optional[Snapshot], Optional[Snapshot]]]):
+    """Adds sum(after - before) per (company, day) to the summary. Caller commits."""
+    deltas = {}
+    for before, after in changes:
+        for snap, sign in ((before, -1), (after, 1)):
+            if snap is None:
+                continue
+            company_id, day, counts = snap
+            bucket = deltas.setdefault((company_id, day), dict.fromkeys(COUNTERS, 0))
+            for column, value in counts.items():
+                bucket[column] += sign * value
+
+    rows = [
+        {"company_id": company_id, "date_only": day, **counts}
+        for (company_id, day), counts in deltas.items() if any(counts.values())
+    ]
+    _apply(db, rows)
+
+
+def add_counts(db: Session, company_id: int, day: date, **counts):
+    """e.g. add_counts(db, company_id, today, short_leaves=1, on_short_leave=1). Caller commits."""
+    _apply(db, [{"company_id": company_id, "date_only": day, **dict.fromkeys(COUNTERS, 0), **counts}])
+
+
+def _apply(db: Session, rows: list):
+    if not rows:
+        return
+    now = datetime.utcnow()
+    for row in rows:
+        row["updated_at"] = now
+    table = DailyAttendanceSummary.__table__
+    dialect = db.get_bind().dialect.name
+
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as upsert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as upsert
+        stmt = upsert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.company_id, table.c.date_only],
+            set_={
+                **{c: table.c[c] + stmt.excluded[c] for c in COUNTERS},
+                "updated_at": stmt.excluded.updated_at
+            }
+        )
+        db.execute(stmt, rows)
+        return
+
+    # Portable fallback: increment in place, insert the day when it has no row yet
+    for row in rows:
+        result = db.execute(update(table).where(
+            table.c.company_id == row["company_id"], table.c.date_only == row["date_only"]
+        ).values(**{c: table.c[c] + row[c] for c in COUNTERS}, updated_at=now))
+        if result.rowcount == 0:
+            db.execute(insert(table).values(**row))
+
+
+# --- READ ---
+def summary_range(db: Session, company_id: int, start: date, end: date) -> list:
+    """One entry per day in [start, end] (days without activity are zeros)"""
+    rows = {
+        r.date_only: r for r in db.query(DailyAttendanceSummary).filter(
+            DailyAttendanceSummary.company_id == company_id,
+            DailyAttendanceSummary.date_only >= start,
+            DailyAttendanceSummary.date_only <= end
+        )
+    }
+    days = []
+    for offset in range((end - start).days + 1):
+        day = start + timedelta(days=offset)
+        row = rows.get(day)
+        counts = {c: (getattr(row, c) or 0) if row else 0 for c in COUNTERS}
+        days.append({
+            "date": day.isoformat(),
+            "checked_in": counts["present"] + counts["late"] + counts["super_late"],
+            **counts
+        })
+    return days
+
+
+# --- BACKFILL / REPAIR ---
+def rebuild(db: Session, company_id: Optional[int] = None,
+            start: Optional[date] = None, end: Optional[date] = None) -> dict:
+    """Recomputes the summary for the given company / date range from the source tables. Caller commits."""
+    def scoped(query, model):
+        if company_id is not None:
+            query = query.filter(model.company_id == company_id)
+        if start is not None:
+            query = query.filter(model.date_only >= start)
+        if end is not None:
+            query = query.filter(model.date_only <= end)
+        return query
+
+    def counted(condition):
+        return func.sum(case((condition, 1), else_=0))
+
+    days = {}
+    for r in scoped(db.query(
+        Attendance.company_id, Attendance.date_only,
+        *[counted(Attendance.status == status).label(column) for status, column in STATUS_COUNTERS.items()],
+        counted(Attendance.check_out_time.isnot(None)).label("checked_out"),
+        counted(Attendance.is_emergency_checkout == True).label("emergency_checkouts")
+    ), Attendance).filter(Attendance.date_only.isnot(None)).group_by(Attendance.company_id, Attendance.date_only):
+        days[(r.company_id, r.date_only)] = {c: int(getattr(r, c) or 0) for c in ATTENDANCE_COUNTERS}
+
+    for r in scoped(db.query(
+        ShortLeave.company_id, ShortLeave.date_only,
+        func.count().label("short_leaves"),
+        counted(ShortLeave.return_time.is_(None)).label("on_short_leave")
+    ), ShortLeave).filter(ShortLeave.date_only.isnot(None)).group_by(ShortLeave.company_id, ShortLeave.date_only):
+        counts = days.setdefault((r.company_id, r.date_only), dict.fromkeys(ATTENDANCE_COUNTERS, 0))
+        counts["short_leaves"] = int(r.short_leaves or 0)
+        counts["on_short_leave"] = int(r.on_short_leave or 0)
+
+    removed = scoped(db.query(DailyAttendanceSummary), DailyAttendanceSummary).delete(synchronize_session=False)
+    now = datetime.utcnow()
+    rows = [
+        {"company_id": cid, "date_only": day, **dict.fromkeys(COUNTERS, 0), **counts, "updated_at": now}
+        for (cid, day), counts in days.items()
+    ]
+    if rows:
+        db.execute(insert(DailyAttendanceSummary.__table__), rows)
+    return {"days_removed": removed, "days_written": len(rows)}
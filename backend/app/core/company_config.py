@@ -0,0 +1,139 @@
+"""
+Compiled per-company settings for the employee endpoints.
+
+Check-in, checkout, short leave etc. all need the company clock and work
+schedule. Instead of loading Company and re-parsing the timezone and
+"HH:MM" strings on every request, `company_configs.get()` returns a
+frozen `CompanyConfig` with the pytz zone, parsed `time`s and office floats.
+
+The admin endpoints that change these columns call `invalidate()` after
+their commit. Each invalidation bumps the company's version, so a load that
+raced with the update can't install the old values. The TTL covers changes
+made through another worker process.
+"""
+import threading
+from dataclasses import dataclass
+from datetime import datetime, time, tzinfo
+from time import monotonic
+from typing import Dict, Optional, Tuple
+
+import pytz
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.models import Company
+
+DEFAULT_SUPER_LATE_MINUTES = 30
+
+
+def resolve_tz(name: Optional[str]) -> tzinfo:
+    try:
+        return pytz.timezone(name or "UTC")
+    except Exception:
+        return pytz.UTC
+
+
+def parse_hhmm(value: Optional[str]) -> Optional[time]:
+    try:
+        return datetime.strptime(value, "%H:%M").time() if value else None
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_float(value) -> Optional[float]:
+    try:
+        return float(value) if value not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+
+@dataclass(frozen=True)
+class CompanyConfig:
+    id: int
+    status: str
+    timezone: str
+    tz: tzinfo
+    work_start_time: Optional[str]  # As stored, for messages / the app
+    work_end_time: Optional[str]
+    work_start: Optional[time]      # None when unset or unparsable
+    work_end: Optional[time]
+    super_late_threshold: int
+    office_lat: Optional[float]
+    office_lng: Optional[float]
+    office_radius: Optional[float]
+    version: int = 0
+
+    @classmethod
+    def from_model(cls, company: Company, version: int = 0) -> "CompanyConfig":
+        threshold = getattr(company, "super_late_threshold", None)
+        return cls(
+            id=company.id,
+            status=company.status or "active",
+            timezone=company.timezone or "UTC",
+            tz=resolve_tz(company.timezone),
+            work_start_time=company.work_start_time,
+            work_end_time=company.work_end_time,
+            work_start=parse_hhmm(company.work_start_time),
+            work_end=parse_hhmm(company.work_end_time),
+            super_late_threshold=DEFAULT_SUPER_LATE_MINUTES if threshold is None else threshold,
+            office_lat=parse_float(company.office_lat),
+            office_lng=parse_float(company.office_lng),
+            office_radius=parse_float(company.office_radius),
+            version=version,
+        )
+
+
+class CompanyConfigCache:
+    def __init__(self, ttl_seconds: int):
+        self.ttl_seconds = ttl_seconds
+        self._entries: Dict[int, Tuple[CompanyConfig, float]] = {}
+        self._versions: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.loads = 0
+        self.invalidations = 0
+
+    def get(self, db: Session, company_id: int) -> Optional[CompanyConfig]:
+        entry = self._entries.get(company_id)
+        if entry is not None and monotonic() < entry[1]:
+            self.hits += 1
+            return entry[0]
+        return self.load(db, company_id)
+
+    def load(self, db: Session, company_id: int) -> Optional[CompanyConfig]:
+        version = self._versions.get(company_id, 0)
+        company = db.query(Company).filter(Company.id == company_id).first()
+        with self._lock:
+            self.loads += 1
+            if company is None:
+                self._entries.pop(company_id, None)
+                return None
+            config = CompanyConfig.from_model(company, version)
+            if self._versions.get(company_id, 0) == version:
+                self._entries[company_id] = (config, monotonic() + self.ttl_seconds)
+            return config
+
+    def invalidate(self, company_id: int):
+        with self._lock:
+            self._versions[company_id] = self._versions.get(company_id, 0) + 1
+            self._entries.pop(company_id, None)
+            self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.loads
+            return {
+                "companies": len(self._entries),
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "loads": self.loads,
+                "invalidations": self.invalidations,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+company_configs = CompanyConfigCache(ttl_seconds=settings.COMPANY_CONFIG_TTL_SECONDS)
@@ -17,6 +17,119 @@ class Settings(BaseSettings):
     # Hardware / IoT Config
     ZK_API_KEY: str = os.getenv("ZK_API_KEY", "")
     ZK_API_URL: str = os.getenv("ZK_API_URL", "https://api.zkteco.cloud")
+    ZK_SYNC_PAGE_SIZE: int = int(os.getenv("ZK_SYNC_PAGE_SIZE", "500"))
+    ZK_SYNC_MAX_PAGES: int = int(os.getenv("ZK_SYNC_MAX_PAGES", "200"))       # Per device, per run
+    ZK_SYNC_CONCURRENCY: int = int(os.getenv("ZK_SYNC_CONCURRENCY", "4"))      # Also the HTTP pool size
+    ZK_SYNC_TIMEOUT_SECONDS: int = int(os.getenv("ZK_SYNC_TIMEOUT_SECONDS", "15"))
+
+    # Device Credential Cache (Door Path)
+    DEVICE_CACHE_TTL_SECONDS: int = int(os.getenv("DEVICE_CACHE_TTL_SECONDS", "60"))
+    DEVICE_CACHE_MAX_ENTRIES: int = int(os.getenv("DEVICE_CACHE_MAX_ENTRIES", "10000"))
+
+    # Company Config Cache (tz / schedule / office for employee endpoints; TTL covers other workers)
+    COMPANY_CONFIG_TTL_SECONDS: int = int(os.getenv("COMPANY_CONFIG_TTL_SECONDS", "300"))
+
+    # Offline Replay (Batched Hardware Logs)
+    HARDWARE_BATCH_MAX_LOGS: int = int(os.getenv("HARDWARE_BATCH_MAX_LOGS", "5000"))
+    HARDWARE_BATCH_MAX_AGE_HOURS: int = int(os.getenv("HARDWARE_BATCH_MAX_AGE_HOURS", "72"))
+
+    # Batched GPS Uploads (/api/tracking/update/batch, offline replay from the app)
+    TRACKING_BATCH_MAX_FIXES: int = int(os.getenv("TRACKING_BATCH_MAX_FIXES", "1000"))
+    TRACKING_BATCH_MAX_AGE_HOURS: int = int(os.getenv("TRACKING_BATCH_MAX_AGE_HOURS", "72"))
+
+    # Session Registry (tracking session owner/company/tz kept in memory for pings)
+    SESSION_REGISTRY_TTL_SECONDS: int = int(os.getenv("SESSION_REGISTRY_TTL_SECONDS", "300"))
+    SESSION_REGISTRY_MAX_ENTRIES: int = int(os.getenv("SESSION_REGISTRY_MAX_ENTRIES", "50000"))
+
+    # Buffered Location Writes (fixes acknowledged after validation, inserted in batches)
+    LOCATION_BUFFER_ENABLED: bool = os.getenv("LOCATION_BUFFER_ENABLED", "true").lower() == "true"
+    LOCATION_BUFFER_MAX_SIZE: int = int(os.getenv("LOCATION_BUFFER_MAX_SIZE", "50000"))
+    LOCATION_BUFFER_PUT_TIMEOUT_MS: int = int(os.getenv("LOCATION_BUFFER_PUT_TIMEOUT_MS", "20"))
+    LOCATION_FLUSH_BATCH_SIZE: int = int(os.getenv("LOCATION_FLUSH_BATCH_SIZE", "1000"))
+    LOCATION_FLUSH_INTERVAL_MS: int = int(os.getenv("LOCATION_FLUSH_INTERVAL_MS", "1000"))
+
+    # Geofences (compiled per company, checked server-side)
+    GEOFENCE_CACHE_TTL_SECONDS: int = int(os.getenv("GEOFENCE_CACHE_TTL_SECONDS", "300"))
+    GEOFENCE_GRID_DEG: float = float(os.getenv("GEOFENCE_GRID_DEG", "0.01"))  # ~1.1 km cells
+    GEOFENCE_ENFORCE_CHECKIN: bool = os.getenv("GEOFENCE_ENFORCE_CHECKIN", "false").lower() == "true"
+
+    # Route Summaries (computed when a tracking session closes)
+    ROUTE_MOVING_SPEED_MPS: float = float(os.getenv("ROUTE_MOVING_SPEED_MPS", "0.5"))
+    ROUTE_JITTER_M: float = float(os.getenv("ROUTE_JITTER_M", "10"))
+    ROUTE_SMOOTH_SECONDS: float = float(os.getenv("ROUTE_SMOOTH_SECONDS", "10"))  # Fixes averaged before the jitter test
+    ROUTE_GAP_SECONDS: int = int(os.getenv("ROUTE_GAP_SECONDS", "600"))
+    ROUTE_DWELL_RADIUS_M: float = float(os.getenv("ROUTE_DWELL_RADIUS_M", "50"))
+    ROUTE_DWELL_MIN_SECONDS: int = int(os.getenv("ROUTE_DWELL_MIN_SECONDS", "300"))
+    ROUTE_SIMPLIFY_TOLERANCE_M: float = float(os.getenv("ROUTE_SIMPLIFY_TOLERANCE_M", "10"))
+    ROUTE_MAX_POINTS: int = int(os.getenv("ROUTE_MAX_POINTS", "500"))
+    ROUTE_REPLAY_DEFAULT_POINTS: int = int(os.getenv("ROUTE_REPLAY_DEFAULT_POINTS", "1000"))
+    ROUTE_REPLAY_MAX_POINTS: int = int(os.getenv("ROUTE_REPLAY_MAX_POINTS", "5000"))
+
+    # Location Archive (closed sessions packed into one blob; raw rows purged later)
+    LOCATION_COMPACTION_ENABLED: bool = os.getenv("LOCATION_COMPACTION_ENABLED", "true").lower() == "true"
+    LOCATION_COMPACTION_INTERVAL_MINUTES: int = int(os.getenv("LOCATION_COMPACTION_INTERVAL_MINUTES", "60"))
+    LOCATION_COMPACT_AFTER_HOURS: int = int(os.getenv("LOCATION_COMPACT_AFTER_HOURS", "72"))
+    LOCATION_RAW_RETENTION_DAYS: int = int(os.getenv("LOCATION_RAW_RETENTION_DAYS", "30"))
+    LOCATION_COMPACTION_BATCH: int = int(os.getenv("LOCATION_COMPACTION_BATCH", "200"))
+
+    # Tracking Rollups (hourly aggregates per session; reports read only these)
+    LOCATION_ROLLUP_ENABLED: bool = os.getenv("LOCATION_ROLLUP_ENABLED", "true").lower() == "true"
+    LOCATION_ROLLUP_INTERVAL_MINUTES: int = int(os.getenv("LOCATION_ROLLUP_INTERVAL_MINUTES", "15"))
+    LOCATION_ROLLUP_CHUNK_SIZE: int = int(os.getenv("LOCATION_ROLLUP_CHUNK_SIZE", "5000"))
+    TRACKING_REPORT_MAX_DAYS: int = int(os.getenv("TRACKING_REPORT_MAX_DAYS", "93"))
+
+    # Daily Attendance Summary (per-company counters kept current by the attendance writers)
+    ATTENDANCE_SUMMARY_MAX_DAYS: int = int(os.getenv("ATTENDANCE_SUMMARY_MAX_DAYS", "366"))
+
+    # Keyset Pagination (audit / history lists; ?cursor= from the previous page's next_cursor)
+    PAGE_MAX_SIZE: int = int(os.getenv("PAGE_MAX_SIZE", "500"))
+
+    # Attendance Export (payroll; streamed from a server-side cursor, no row cap)
+    ATTENDANCE_EXPORT_CHUNK_SIZE: int = int(os.getenv("ATTENDANCE_EXPORT_CHUNK_SIZE", "2000"))  # Rows per fetch / write
+
+    # Live Tracking Stream (SSE)
+    TRACKING_STREAM_KEEPALIVE_SECONDS: int = int(os.getenv("TRACKING_STREAM_KEEPALIVE_SECONDS", "15"))  # Access re-checked as often
+    TRACKING_STREAM_TICKET_SECONDS: int = int(os.getenv("TRACKING_STREAM_TICKET_SECONDS", "60"))  # ?ticket= must open the stream within this
+
+    # Write-Behind Door Mode (decide from memory, persist in background batches)
+    DOOR_WRITE_BEHIND: bool = os.getenv("DOOR_WRITE_BEHIND", "false").lower() == "true"
+    DOOR_QUEUE_MAX_SIZE: int = int(os.getenv("DOOR_QUEUE_MAX_SIZE", "10000"))
+    DOOR_QUEUE_PUT_TIMEOUT_MS: int = int(os.getenv("DOOR_QUEUE_PUT_TIMEOUT_MS", "50"))
+    DOOR_FLUSH_BATCH_SIZE: int = int(os.getenv("DOOR_FLUSH_BATCH_SIZE", "500"))
+    DOOR_FLUSH_INTERVAL_MS: int = int(os.getenv("DOOR_FLUSH_INTERVAL_MS", "200"))
+    # Batches the DB can't take at shutdown are spilled here and replayed on the next start; batches it
+    # rejects outright are dead-lettered here. Required with DOOR_WRITE_BEHIND: put it on persistent
+    # storage private to the service user (created 0700), never under a shared /tmp ("" = drop them)
+    WRITE_BEHIND_SPILL_DIR: str = os.getenv("WRITE_BEHIND_SPILL_DIR", "")
+
+    # Roster Index (door access decisions). Security bound: how long a deleted employee or suspended company
+    # can still open doors on another worker. PostgreSQL: until the NOTIFY arrives (TTL is only a backstop);
+    # no live listener (other dialects, listener reconnecting): the fallback TTL
+    ROSTER_TTL_SECONDS: int = int(os.getenv("ROSTER_TTL_SECONDS", "300"))
+    ROSTER_FALLBACK_TTL_SECONDS: int = int(os.getenv("ROSTER_FALLBACK_TTL_SECONDS", "5"))
+
+    # Duplicate-Scan Suppression (live door endpoint, in-memory per device + employee)
+    SCAN_DEDUPE_ENABLED: bool = os.getenv("SCAN_DEDUPE_ENABLED", "true").lower() == "true"
+    SCAN_DEDUPE_WINDOW_SECONDS: float = float(os.getenv("SCAN_DEDUPE_WINDOW_SECONDS", "3"))
+    SCAN_DEDUPE_MAX_ENTRIES: int = int(os.getenv("SCAN_DEDUPE_MAX_ENTRIES", "50000"))
+
+    # Device Heartbeats (in-memory last-seen map, flushed to DB periodically)
+    # The window is raised to at least flush + 2 beat intervals (see heartbeat.online_window_seconds)
+    DEVICE_ONLINE_WINDOW_SECONDS: int = int(os.getenv("DEVICE_ONLINE_WINDOW_SECONDS", "60"))
+    DEVICE_HEARTBEAT_INTERVAL_SECONDS: int = int(os.getenv("DEVICE_HEARTBEAT_INTERVAL_SECONDS", "10"))  # Device side
+    HEARTBEAT_FLUSH_SECONDS: int = int(os.getenv("HEARTBEAT_FLUSH_SECONDS", "30"))
+
+    # Device Command Channel (long-poll)
+    DEVICE_COMMAND_TTL_SECONDS: int = int(os.getenv("DEVICE_COMMAND_TTL_SECONDS", "30"))
+    DEVICE_COMMAND_QUEUE_MAX: int = int(os.getenv("DEVICE_COMMAND_QUEUE_MAX", "20"))
+    DEVICE_COMMAND_LEASE_SECONDS: float = float(os.getenv("DEVICE_COMMAND_LEASE_SECONDS", "5"))  # Unacked = redelivered
+    LONG_POLL_MAX_SECONDS: int = int(os.getenv("LONG_POLL_MAX_SECONDS", "30"))
+
+    # Door Event Retention (per-company override via /company/settings/retention)
+    DOOR_EVENT_RETENTION_DAYS: int = int(os.getenv("DOOR_EVENT_RETENTION_DAYS", "180"))
+    RETENTION_JOB_ENABLED: bool = os.getenv("RETENTION_JOB_ENABLED", "true").lower() == "true"
+    RETENTION_JOB_INTERVAL_MINUTES: int = int(os.getenv("RETENTION_JOB_INTERVAL_MINUTES", "60"))
+    RETENTION_CHUNK_SIZE: int = int(os.getenv("RETENTION_CHUNK_SIZE", "2000"))
 
     # Fix for Render's "postgres://" URL format
     def get_database_url(self):
@@ -0,0 +1,97 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+from app.core.config import settings
+
+
+@dataclass(frozen=True)
+class CachedDevice:
+    """Detached snapshot of an active HardwareDevice (safe to share across requests)"""
+    id: int
+    company_id: int
+    device_uid: str
+    device_type: str
+    location: str
+    secret_key: str
+
+    @classmethod
+    def from_model(cls, device) -> "CachedDevice":
+        return cls(
+            id=device.id,
+            company_id=device.company_id,
+            device_uid=device.device_uid,
+            device_type=device.device_type,
+            location=device.location,
+            secret_key=device.secret_key,
+        )
+
+
+class DeviceCache:
+    """
+    TTL + LRU cache of active hardware devices keyed by device_uid.
+    Only active devices are stored, so a miss always falls through to the DB.
+    The TTL bounds staleness when another worker process changes a device.
+    """
+
+    def __init__(self, ttl_seconds: int, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, device_uid: str) -> Optional[CachedDevice]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(device_uid)
+            if entry is None:
+                self.misses += 1
+                return None
+            device, expires_at = entry
+            if expires_at <= now:
+                del self._entries[device_uid]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(device_uid)
+            self.hits += 1
+            return device
+
+    def put(self, device: CachedDevice):
+        with self._lock:
+            self._entries[device.device_uid] = (device, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(device.device_uid)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, device_uid: str):
+        with self._lock:
+            self._entries.pop(device_uid, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+device_cache = DeviceCache(
+    ttl_seconds=settings.DEVICE_CACHE_TTL_SECONDS,
+    max_entries=settings.DEVICE_CACHE_MAX_ENTRIES,
+)
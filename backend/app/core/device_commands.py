@@ -0,0 +1,246 @@
+"""
+Per-device command queues with asyncio long-poll delivery.
+
+Commands are rows in device_commands, so any worker can deliver a command
+published on any other. Devices park on `await command_broker.wait(uid,
+timeout)`; each parked request is just a future on the event loop (no
+threadpool worker, no pooled DB connection). Admin endpoints call
+`publish()`, which commits the command row and wakes the device's parked
+futures on this worker with `loop.call_soon_threadsafe`.
+
+On PostgreSQL the commit also sends NOTIFY device_commands with the device
+uid. The worker's notify_listener (app.core.notify) hears it and wakes the
+polls parked there.
+
+Delivery is lease-and-ack. A poll leases its commands with one UPDATE ...
+RETURNING (claimed_at = now), so concurrent polls on any workers never get
+the same command. The device acks the ids it received (`?ack=` on its next
+poll, or POST .../commands/ack), which deletes them. A lease that runs out
+unacked, e.g. because the response was lost with the connection, makes the
+command claimable again until it expires: a device may see a command
+twice and should dedupe on its id. Other dialects have no cross-worker wake-up, so run
+one worker there: a poll parked on another worker would only claim the
+command at its next poll, possibly after the TTL.
+"""
+import asyncio
+import threading
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import and_, delete, or_, select as sql_select, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.notify import notify, notify_listener
+from app.db.database import SessionLocal
+from app.db.models import QueuedDeviceCommand
+
+NOTIFY_CHANNEL = "device_commands"
+
+
+@dataclass
+class DeviceCommand:
+    command: str
+    reason: str = ""
+    duration_ms: int = 3000
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    issued_at: datetime = field(default_factory=datetime.utcnow)
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "command": self.command,
+            "reason": self.reason,
+            "duration_ms": self.duration_ms,
+            "issued_at": self.issued_at.isoformat()
+        }
+
+
+def _wake(fut: asyncio.Future):
+    if not fut.done():
+        fut.set_result(True)
+
+
+class CommandBroker:
+    def __init__(self, ttl_seconds: int, max_queued: int, lease_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self.max_queued = max_queued
+        self.lease_seconds = lease_seconds
+        self._waiters: Dict[str, Set[Tuple[asyncio.AbstractEventLoop, asyncio.Future]]] = {}
+        self._lock = threading.Lock()
+
+        # Metrics
+        self.published = 0
+        self.delivered = 0
+        self.redelivered = 0
+        self.acked = 0
+        self.expired = 0  # Dropped undelivered / unacked: expired, or beyond the per-device cap
+        self.last_delivery_ms = 0.0
+        self.max_delivery_ms = 0.0
+        self._total_delivery_ms = 0.0
+
+    # --- Admin side (any thread) ---
+    def publish(self, db: Session, device_uid: str, command: DeviceCommand) -> int:
+        """
+        Queues the command and commits (with the caller's pending changes),
+        then releases polls parked on this worker; returns how many were parked
+        """
+        db.add(QueuedDeviceCommand(
+            id=command.id, device_uid=device_uid, command=command.command, reason=command.reason,
+            duration_ms=command.duration_ms, issued_at=command.issued_at,
+            expires_at=command.issued_at + timedelta(seconds=self.ttl_seconds)
+        ))
+        db.flush()
+        # Expired commands and the oldest beyond the per-device cap are dropped, like a bounded deque
+        keep = sql_select(QueuedDeviceCommand.id).where(
+            QueuedDeviceCommand.device_uid == device_uid
+        ).order_by(QueuedDeviceCommand.issued_at.desc()).limit(self.max_queued)
+        dropped = db.execute(delete(QueuedDeviceCommand).where(
+            QueuedDeviceCommand.device_uid == device_uid,
+            or_(QueuedDeviceCommand.expires_at < command.issued_at,
+                QueuedDeviceCommand.id.not_in(keep.scalar_subquery()))
+        )).rowcount
+        notify(db, NOTIFY_CHANNEL, device_uid)
+        db.commit()
+        with self._lock:
+            self.published += 1
+            self.expired += max(dropped, 0)
+        return self.wake(device_uid)
+
+    def wake(self, device_uid: str) -> int:
+        with self._lock:
+            waiters = list(self._waiters.get(device_uid, ()))
+        for loop, fut in waiters:
+            loop.call_soon_threadsafe(_wake, fut)
+        return len(waiters)
+
+    # --- Device side (event loop) ---
+    async def wait(self, device_uid: str, timeout: float, acked: Sequence[str] = ()) -> List[DeviceCommand]:
+        """
+        Acks `acked` (ids from earlier responses), then returns the device's
+        claimable commands, parking up to `timeout` seconds for new ones.
+        A claim that isn't acked within the lease is delivered again.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            # Park before each claim, so a publish in between still wakes us
+            fut = loop.create_future()
+            waiter = (loop, fut)
+            with self._lock:
+                self._waiters.setdefault(device_uid, set()).add(waiter)
+            try:
+                commands, retry_at = await loop.run_in_executor(None, self._take, device_uid, tuple(acked))
+                acked = ()
+                if commands:
+                    return commands
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    return []
+                # An unacked claim (say, a response lost with the connection) is retried when its lease ends
+                lease_ends = (retry_at - datetime.utcnow()).total_seconds() if retry_at else None
+                if lease_ends is None or lease_ends >= remaining:
+                    try:
+                        await asyncio.wait_for(fut, remaining)
+                    except asyncio.TimeoutError:
+                        return []  # Anything missed is claimed at the start of the next poll
+                else:
+                    try:
+                        await asyncio.wait_for(fut, max(lease_ends, 0.05))
+                    except asyncio.TimeoutError:
+                        pass  # Lease ran out: claim again
+            finally:
+                with self._lock:
+                    parked = self._waiters.get(device_uid)
+                    if parked is not None:
+                        parked.discard(waiter)
+                        if not parked:
+                            del self._waiters[device_uid]
+
+    def ack(self, db: Session, device_uid: str, command_ids: Sequence[str]) -> int:
+        """Deletes the device's delivered commands it confirmed; returns how many were still queued"""
+        if not command_ids:
+            return 0
+        acked = db.execute(delete(QueuedDeviceCommand).where(
+            QueuedDeviceCommand.device_uid == device_uid,
+            QueuedDeviceCommand.id.in_(list(command_ids)),
+            QueuedDeviceCommand.claimed_at != None
+        )).rowcount
+        db.commit()
+        with self._lock:
+            self.acked += max(acked, 0)
+        return acked
+
+    def _take(self, device_uid: str, acked: Tuple[str, ...] = ()) -> Tuple[List[DeviceCommand], Optional[datetime]]:
+        """
+        Leases every claimable (new, or lease run out) unexpired command of the
+        device. Returns (commands, when the earliest other lease ends or None).
+        """
+        now = datetime.utcnow()
+        lease_cutoff = now - timedelta(seconds=self.lease_seconds)
+        db = SessionLocal()
+        try:
+            self.ack(db, device_uid, acked)
+            table = QueuedDeviceCommand.__table__
+            live = and_(table.c.device_uid == device_uid, table.c.expires_at > now)
+            # Most polls find nothing: an index read, no write transaction
+            leases = [claimed_at for (claimed_at,) in db.execute(sql_select(table.c.claimed_at).where(live))]
+            if all(claimed_at is not None and claimed_at > lease_cutoff for claimed_at in leases):
+                retry_at = min(leases) + timedelta(seconds=self.lease_seconds) if leases else None
+                return [], retry_at
+
+            # The WHERE is re-checked per row under the write, so concurrent polls never lease the same row
+            claimable = and_(live, or_(table.c.claimed_at == None, table.c.claimed_at <= lease_cutoff))
+            lease = update(table).where(claimable).values(claimed_at=now, deliveries=table.c.deliveries + 1)
+            if db.get_bind().dialect.name in ("postgresql", "sqlite"):
+                rows = db.execute(lease.returning(*table.c)).all()
+            else:
+                ids = [r.id for r in db.execute(sql_select(table.c.id).where(claimable))]
+                db.execute(lease.where(table.c.id.in_(ids)))
+                rows = db.execute(table.select().where(table.c.id.in_(ids), table.c.claimed_at == now)).all()
+            db.commit()
+        finally:
+            db.close()
+
+        commands = []
+        with self._lock:
+            for row in sorted(rows, key=lambda r: r.issued_at):
+                if row.deliveries > 1:
+                    self.redelivered += 1
+                else:
+                    elapsed_ms = (now - row.issued_at).total_seconds() * 1000
+                    self.delivered += 1
+                    self.last_delivery_ms = elapsed_ms
+                    self.max_delivery_ms = max(self.max_delivery_ms, elapsed_ms)
+                    self._total_delivery_ms += elapsed_ms
+                commands.append(DeviceCommand(
+                    command=row.command, reason=row.reason or "", duration_ms=row.duration_ms,
+                    id=row.id, issued_at=row.issued_at
+                ))
+        return commands, None
+
+    def stats(self) -> dict:
+        with self._lock:
+            parked = sum(len(w) for w in self._waiters.values())
+        return {
+            "parked_polls": parked,
+            "published": self.published,
+            "delivered": self.delivered,
+            "redelivered": self.redelivered,
+            "acked": self.acked,
+            "expired": self.expired,
+            "last_delivery_ms": round(self.last_delivery_ms, 2),
+            "avg_delivery_ms": round(self._total_delivery_ms / self.delivered, 2) if self.delivered else 0.0,
+            "max_delivery_ms": round(self.max_delivery_ms, 2),
+            "listener": notify_listener.stats(),
+        }
+
+
+command_broker = CommandBroker(
+    ttl_seconds=settings.DEVICE_COMMAND_TTL_SECONDS,
+    max_queued=settings.DEVICE_COMMAND_QUEUE_MAX,
+    lease_seconds=settings.DEVICE_COMMAND_LEASE_SECONDS
+)
+notify_listener.subscribe(NOTIFY_CHANNEL, command_broker.wake)
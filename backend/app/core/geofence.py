@@ -0,0 +1,200 @@
+"""
+Server-side geofences.
+
+Each company's active GeofenceSite rows (or, when it has none, the legacy
+office_lat/office_lng/office_radius strings on Company) are compiled once into
+a `CompiledFences`: float bounding boxes, NumPy polygon vertices and a coarse
+lat/lng grid mapping cells to the sites that overlap them. A point check is
+a dict lookup plus an exact test against the one or two candidate sites.
+
+`classify()` is the vectorised bulk mode: it labels a whole array of fixes
+with the index of the site they fall in (-1 = outside) in one call.
+"""
+import math
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.route_summary import haversine_m
+from app.db.models import Company, GeofenceSite
+
+LEGACY_SITE_ID = 0  # Synthetic id for the company's single office circle
+METERS_PER_DEG_LAT = 111320.0
+
+
+@dataclass(frozen=True, eq=False)
+class Fence:
+    id: int
+    name: str
+    kind: str
+    bbox: Tuple[float, float, float, float]  # min_lat, min_lng, max_lat, max_lng
+    center: Tuple[float, float] = (0.0, 0.0)
+    radius_m: float = 0.0
+    lats: Optional[np.ndarray] = None  # Polygon vertices
+    lngs: Optional[np.ndarray] = None
+
+    def to_dict(self) -> dict:
+        data = {"id": self.id, "name": self.name, "kind": self.kind}
+        if self.kind == "circle":
+            data.update(lat=self.center[0], lng=self.center[1], radius_m=self.radius_m)
+        else:
+            data["polygon"] = [[float(a), float(b)] for a, b in zip(self.lats, self.lngs)]
+        return data
+
+
+def circle_fence(site_id: int, name: str, lat: float, lng: float, radius_m: float) -> Fence:
+    dlat = radius_m / METERS_PER_DEG_LAT
+    dlng = radius_m / (METERS_PER_DEG_LAT * max(math.cos(math.radians(lat)), 1e-6))
+    return Fence(site_id, name, "circle", (lat - dlat, lng - dlng, lat + dlat, lng + dlng), (lat, lng), radius_m)
+
+
+def polygon_fence(site_id: int, name: str, points: List[List[float]]) -> Fence:
+    lats = np.asarray([p[0] for p in points], dtype=np.float64)
+    lngs = np.asarray([p[1] for p in points], dtype=np.float64)
+    return Fence(site_id, name, "polygon", (lats.min(), lngs.min(), lats.max(), lngs.max()), lats=lats, lngs=lngs)
+
+
+def points_in_polygon(lats: np.ndarray, lngs: np.ndarray, fence: Fence) -> np.ndarray:
+    """Even-odd ray casting, vectorised over the points (one pass per edge)"""
+    inside = np.zeros(len(lats), dtype=bool)
+    vy, vx = fence.lats, fence.lngs
+    j = len(vy) - 1
+    for i in range(len(vy)):
+        crosses = (vy[i] > lats) != (vy[j] > lats)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            x_at = (vx[j] - vx[i]) * (lats - vy[i]) / (vy[j] - vy[i]) + vx[i]
+        inside ^= crosses & (lngs < x_at)
+        j = i
+    return inside
+
+
+class CompiledFences:
+    def __init__(self, fences: List[Fence], cell_deg: float):
+        self.fences = fences
+        self.cell_deg = cell_deg
+        self.grid: Dict[Tuple[int, int], List[int]] = {}
+        for idx, fence in enumerate(fences):
+            min_lat, min_lng, max_lat, max_lng = fence.bbox
+            for cy in range(self._cell(min_lat), self._cell(max_lat) + 1):
+                for cx in range(self._cell(min_lng), self._cell(max_lng) + 1):
+                    self.grid.setdefault((cy, cx), []).append(idx)
+
+    def _cell(self, value: float) -> int:
+        return math.floor(value / self.cell_deg)
+
+    def locate(self, lat: float, lng: float) -> Optional[Fence]:
+        """First site containing the point, or None"""
+        for idx in self.grid.get((self._cell(lat), self._cell(lng)), ()):
+            fence = self.fences[idx]
+            min_lat, min_lng, max_lat, max_lng = fence.bbox
+            if not (min_lat <= lat <= max_lat and min_lng <= lng <= max_lng):
+                continue
+            if fence.kind == "circle":
+                if haversine_m(fence.center[0], fence.center[1], lat, lng) <= fence.radius_m:
+                    return fence
+            elif points_in_polygon(np.array([lat]), np.array([lng]), fence)[0]:
+                return fence
+        return None
+
+    def classify(self, lats, lngs) -> np.ndarray:
+        """Index into self.fences for every point (-1 = outside all sites)"""
+        lats = np.asarray(lats, dtype=np.float64)
+        lngs = np.asarray(lngs, dtype=np.float64)
+        labels = np.full(len(lats), -1, dtype=np.int32)
+        for idx, fence in enumerate(self.fences):
+            min_lat, min_lng, max_lat, max_lng = fence.bbox
+            candidates = np.flatnonzero(
+                (labels < 0) & (lats >= min_lat) & (lats <= max_lat) & (lngs >= min_lng) & (lngs <= max_lng)
+            )
+            if not len(candidates):
+                continue
+            if fence.kind == "circle":
+                hit = haversine_m(fence.center[0], fence.center[1], lats[candidates], lngs[candidates]) <= fence.radius_m
+            else:
+                hit = points_in_polygon(lats[candidates], lngs[candidates], fence)
+            labels[candidates[hit]] = idx
+        return labels
+
+
+def compile_company(db: Session, company_id: int) -> CompiledFences:
+    fences = []
+    for site in db.query(GeofenceSite).filter(
+        GeofenceSite.company_id == company_id,
+        GeofenceSite.active == True
+    ).order_by(GeofenceSite.id):
+        if site.kind == "polygon" and site.polygon and len(site.polygon) >= 3:
+            fences.append(polygon_fence(site.id, site.name, site.polygon))
+        elif site.kind == "circle" and site.center_lat is not None and site.center_lng is not None and site.radius_m:
+            fences.append(circle_fence(site.id, site.name, site.center_lat, site.center_lng, site.radius_m))
+
+    if not fences:
+        # Legacy single office circle (stored as strings on Company)
+        office = db.query(Company.office_lat, Company.office_lng, Company.office_radius).filter(
+            Company.id == company_id
+        ).first()
+        try:
+            fences.append(circle_fence(
+                LEGACY_SITE_ID, "Office", float(office.office_lat), float(office.office_lng), float(office.office_radius)
+            ))
+        except (AttributeError, TypeError, ValueError):
+            pass
+
+    return CompiledFences(fences, settings.GEOFENCE_GRID_DEG)
+
+
+class GeofenceCache:
+    """
+    Per-company CompiledFences. Invalidated by the geofence/office-location
+    endpoints; the TTL covers changes made through another worker process.
+    """
+
+    def __init__(self, ttl_seconds: int):
+        self.ttl_seconds = ttl_seconds
+        self._fences: Dict[int, Tuple[CompiledFences, float]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.compiles = 0
+
+    def get(self, db: Session, company_id: int) -> CompiledFences:
+        entry = self._fences.get(company_id)
+        if entry is not None and time.monotonic() - entry[1] <= self.ttl_seconds:
+            self.hits += 1
+            return entry[0]
+
+        compiled = compile_company(db, company_id)
+        with self._lock:
+            self._fences[company_id] = (compiled, time.monotonic())
+            self.compiles += 1
+        return compiled
+
+    def invalidate(self, company_id: int):
+        with self._lock:
+            self._fences.pop(company_id, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "companies": len(self._fences),
+                "sites": sum(len(c.fences) for c, _ in self._fences.values()),
+                "hits": self.hits,
+                "compiles": self.compiles,
+            }
+
+
+geofence_cache = GeofenceCache(ttl_seconds=settings.GEOFENCE_CACHE_TTL_SECONDS)
+
+
+def parse_location(location: Optional[str]) -> Optional[Tuple[float, float]]:
+    """'lat,lng' strings as sent by the mobile app -> floats (None if not coordinates)"""
+    try:
+        lat, lng = (float(part) for part in (location or "").split(",")[:2])
+    except ValueError:
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return None
+    return lat, lng
@@ -0,0 +1,134 @@
+"""
+Device liveness tracking.
+
+Heartbeats only touch an in-memory map (uid -> last seen). A periodic task
+writes the beats that changed since the last flush to device_heartbeats in
+two executemany statements, so the database sees one write per device per
+flush interval instead of one per beat.
+
+Other workers only see the flushed last_seen_at, which can be a flush
+interval plus a beat interval old, so the online window is never shorter
+than that (plus one more beat interval of slack for a late beat or flush).
+"""
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import bindparam, insert, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.scheduler import PeriodicTask
+from app.db.database import SessionLocal
+from app.db.models import DeviceHeartbeat
+
+logger = logging.getLogger("saas_core")
+
+
+class HeartbeatTracker:
+    def __init__(self, online_window_seconds: int):
+        self.online_window = timedelta(seconds=online_window_seconds)
+        self._last_seen: Dict[str, Tuple[datetime, int]] = {}
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self.beats = 0
+        self.rows_flushed = 0
+
+    def beat(self, device_uid: str, company_id: int):
+        now = datetime.utcnow()
+        with self._lock:
+            self._last_seen[device_uid] = (now, company_id)
+            self._dirty.add(device_uid)
+            self.beats += 1
+
+    def last_seen(self, device_uid: str, persisted: Optional[datetime] = None) -> Optional[datetime]:
+        """Newest of the in-memory beat and the persisted one (another worker may have it)"""
+        entry = self._last_seen.get(device_uid)
+        seen = entry[0] if entry else None
+        if persisted and (seen is None or persisted > seen):
+            return persisted
+        return seen
+
+    def is_online(self, last_seen: Optional[datetime]) -> bool:
+        return last_seen is not None and datetime.utcnow() - last_seen <= self.online_window
+
+    def flush(self, db: Session) -> dict:
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            rows = [(uid, *self._last_seen[uid]) for uid in dirty]
+        if not rows:
+            return {"rows": 0}
+
+        try:
+            existing = {
+                uid for (uid,) in db.query(DeviceHeartbeat.device_uid).filter(
+                    DeviceHeartbeat.device_uid.in_([r[0] for r in rows])
+                )
+            }
+            updates = [{"b_uid": uid, "b_seen": seen} for uid, seen, _ in rows if uid in existing]
+            inserts = [
+                {"device_uid": uid, "company_id": company_id, "last_seen_at": seen}
+                for uid, seen, company_id in rows if uid not in existing
+            ]
+            if updates:
+                db.connection().execute(
+                    update(DeviceHeartbeat)
+                    .where(DeviceHeartbeat.device_uid == bindparam("b_uid"))
+                    .where(DeviceHeartbeat.last_seen_at < bindparam("b_seen"))
+                    .values(last_seen_at=bindparam("b_seen")),
+                    updates
+                )
+            if inserts:
+                db.execute(insert(DeviceHeartbeat), inserts)
+            db.commit()
+        except Exception:
+            db.rollback()
+            with self._lock:
+                self._dirty |= dirty  # Retry on the next flush
+            raise
+
+        self.rows_flushed += len(rows)
+        return {"rows": len(rows)}
+
+    def stats(self) -> dict:
+        tracked = list(self._last_seen.values())
+        return {
+            "tracked_devices": len(tracked),
+            "online_devices": sum(1 for seen, _ in tracked if self.is_online(seen)),
+            "pending_flush": len(self._dirty),
+            "beats": self.beats,
+            "rows_flushed": self.rows_flushed,
+        }
+
+
+def online_window_seconds() -> int:
+    """DEVICE_ONLINE_WINDOW_SECONDS, raised to what a worker reading flushed beats can observe"""
+    floor = settings.HEARTBEAT_FLUSH_SECONDS + 2 * settings.DEVICE_HEARTBEAT_INTERVAL_SECONDS
+    if settings.DEVICE_ONLINE_WINDOW_SECONDS < floor:
+        logger.warning(
+            "DEVICE_ONLINE_WINDOW_SECONDS=%s is shorter than HEARTBEAT_FLUSH_SECONDS + 2 x "
+            "DEVICE_HEARTBEAT_INTERVAL_SECONDS; using %s so devices don't flap offline on other workers",
+            settings.DEVICE_ONLINE_WINDOW_SECONDS, floor
+        )
+        return floor
+    return settings.DEVICE_ONLINE_WINDOW_SECONDS
+
+
+heartbeats = HeartbeatTracker(online_window_seconds=online_window_seconds())
+
+
+def _scheduled_flush():
+    db = SessionLocal()
+    try:
+        return heartbeats.flush(db)
+    finally:
+        db.close()
+
+
+heartbeat_flush_task = PeriodicTask(
+    "device-heartbeat-flush",
+    interval=settings.HEARTBEAT_FLUSH_SECONDS,
+    fn=_scheduled_flush,
+    run_on_stop=True
+)
@@ -0,0 +1,313 @@
+"""
+Columnar archive for closed tracking sessions (location_archives).
+
+A compacted session is one zlib-compressed blob instead of one ORM row per
+fix:
+
+    header   magic, version, n, t0 (ms), lat0, lon0 (1e-7 deg), status width
+    dt       uint32[n-1]   milliseconds between fixes
+    dlat     int32[n-1]    latitude deltas in 1e-7 degrees (~1 cm)
+    dlon     int32[n-1]    longitude deltas in 1e-7 degrees
+    status   uint8/16[n]   index into LocationArchive.statuses
+
+`ArchiveReader` decompresses on first use and decodes each column only when
+asked; `iter_points()` streams (recorded_at, lat, lng, status) in chunks.
+`load_session_points()` is the transparent read path: archive + any raw rows
+that arrived after compaction, or just the raw rows. `iter_session_points()`
+is the streaming variant for a time window (memory independent of session
+length apart from the compressed archive's decoded columns).
+
+The compaction job archives sessions that closed more than
+LOCATION_COMPACT_AFTER_HOURS ago, and deletes their raw rows once the session
+is older than LOCATION_RAW_RETENTION_DAYS.
+"""
+import heapq
+import struct
+import zlib
+from datetime import datetime, timedelta
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.scheduler import PeriodicTask
+from app.db.database import SessionLocal
+from app.db.models import DepartmentSession, LocationArchive, LocationLog, RollupWatermark
+
+MAGIC = b"LOCA"
+FORMAT_VERSION = 1
+COORD_SCALE = 10_000_000
+HEADER = struct.Struct("<4sBIqiiB")
+EPOCH = np.datetime64("1970-01-01T00:00:00", "ms")
+
+
+# --- ENCODING ---
+def encode_points(times: List[datetime], lats: List[float], lons: List[float], statuses: List[str]) -> Tuple[bytes, list]:
+    """Returns (blob, status dictionary); points must be sorted by time"""
+    n = len(times)
+    t = (np.asarray(times, dtype="datetime64[ms]") - EPOCH).astype(np.int64)
+    lat = np.rint(np.asarray(lats, dtype=np.float64) * COORD_SCALE).astype(np.int64)
+    lon = np.rint(np.asarray(lons, dtype=np.float64) * COORD_SCALE).astype(np.int64)
+
+    dictionary, codes = np.unique(np.asarray([s or "" for s in statuses], dtype=object), return_inverse=True)
+    status_dtype = np.uint8 if len(dictionary) <= 256 else np.uint16
+
+    header = HEADER.pack(
+        MAGIC, FORMAT_VERSION, n,
+        int(t[0]) if n else 0, int(lat[0]) if n else 0, int(lon[0]) if n else 0,
+        np.dtype(status_dtype).itemsize
+    )
+    body = b"".join((
+        np.diff(t).astype("<u4").tobytes(),
+        np.diff(lat).astype("<i4").tobytes(),
+        np.diff(lon).astype("<i4").tobytes(),
+        codes.astype(status_dtype).tobytes(),
+    ))
+    return header + zlib.compress(body, 6), [str(s) for s in dictionary]
+
+
+class ArchiveReader:
+    """Lazy decoder: nothing is decompressed until a column is read"""
+
+    def __init__(self, blob: bytes, statuses: list):
+        magic, version, self.count, self._t0, self._lat0, self._lon0, self._status_width = HEADER.unpack_from(blob)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError("Unknown location archive format")
+        self._blob = blob
+        self._statuses = statuses
+        self._body = None
+        self._columns = {}
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _raw(self) -> memoryview:
+        if self._body is None:
+            self._body = memoryview(zlib.decompress(self._blob[HEADER.size:]))
+        return self._body
+
+    def _column(self, name: str) -> np.ndarray:
+        if name not in self._columns:
+            n, body = self.count, self._raw()
+            step = 4 * max(n - 1, 0)
+            if name == "status":
+                dtype = np.uint8 if self._status_width == 1 else np.uint16
+                self._columns[name] = np.frombuffer(body[3 * step:], dtype=dtype, count=n)
+            else:
+                offset, dtype, first = {
+                    "t": (0, "<u4", self._t0), "lat": (step, "<i4", self._lat0), "lon": (2 * step, "<i4", self._lon0)
+                }[name]
+                values = np.empty(n, dtype=np.int64)
+                if n:
+                    values[0] = first
+                    np.cumsum(np.frombuffer(body[offset:offset + step], dtype=dtype), dtype=np.int64, out=values[1:])
+                    values[1:] += first
+                self._columns[name] = values
+        return self._columns[name]
+
+    def times_ms(self) -> np.ndarray:
+        return self._column("t")
+
+    def times(self) -> np.ndarray:
+        return EPOCH + self._column("t").astype("timedelta64[ms]")
+
+    def latitudes(self) -> np.ndarray:
+        return self._column("lat") / COORD_SCALE
+
+    def longitudes(self) -> np.ndarray:
+        return self._column("lon") / COORD_SCALE
+
+    def statuses(self) -> List[str]:
+        return [self._statuses[i] for i in self._column("status")]
+
+    def iter_points(self, chunk_size: int = 1000, first: int = 0, stop: Optional[int] = None) -> Iterator[tuple]:
+        """Streams (recorded_at, lat, lng, status) for points [first, stop), one chunk at a time"""
+        t, lat, lon, codes = self._column("t"), self._column("lat"), self._column("lon"), self._column("status")
+        stop = self.count if stop is None else stop
+        for start in range(first, stop, chunk_size):
+            end = min(start + chunk_size, stop)
+            stamps = (EPOCH + t[start:end].astype("timedelta64[ms]")).astype("datetime64[us]").tolist()
+            yield from zip(
+                stamps,
+                (lat[start:end] / COORD_SCALE).tolist(),
+                (lon[start:end] / COORD_SCALE).tolist(),
+                (self._statuses[c] for c in codes[start:end])
+            )
+
+
+# --- TRANSPARENT READS ---
+def load_session_points(db: Session, session_id: int) -> Tuple[list, list, list, list]:
+    """(times, lats, lons, statuses) for a session, from the archive and/or raw rows"""
+    archive = db.query(LocationArchive).filter(LocationArchive.session_id == session_id).first()
+    raw = raw_points_query(db, session_id, archive).all()
+
+    times, lats, lons, statuses = [], [], [], []
+    if archive:
+        for ts, lat, lon, status in ArchiveReader(archive.data, archive.statuses or []).iter_points():
+            times.append(ts)
+            lats.append(lat)
+            lons.append(lon)
+            statuses.append(status)
+    for ts, lat, lon, status in raw:
+        times.append(ts)
+        lats.append(lat)
+        lons.append(lon)
+        statuses.append(status)
+
+    if archive and raw:
+        order = sorted(range(len(times)), key=times.__getitem__)  # Late rows interleave by time
+        times, lats, lons, statuses = ([col[i] for i in order] for col in (times, lats, lons, statuses))
+    return times, lats, lons, statuses
+
+
+def raw_points_query(db: Session, session_id: int, archive: Optional[LocationArchive],
+                     start: Optional[datetime] = None, end: Optional[datetime] = None):
+    """The session's raw (recorded_at, lat, lng, status) rows not in its archive, in time order"""
+    query = db.query(LocationLog.recorded_at, LocationLog.latitude, LocationLog.longitude, LocationLog.status).filter(
+        LocationLog.session_id == session_id,
+        LocationLog.latitude.isnot(None),
+        LocationLog.longitude.isnot(None)
+    )
+    if archive and not archive.raw_purged:
+        # Once purged, every raw row left is a late arrival (SQLite may even reuse ids)
+        query = query.filter(LocationLog.id > archive.last_log_id)
+    if start is not None:
+        query = query.filter(LocationLog.recorded_at >= start)
+    if end is not None:
+        query = query.filter(LocationLog.recorded_at <= end)
+    return query.order_by(LocationLog.recorded_at)
+
+
+def _archive_window(reader: ArchiveReader, start: Optional[datetime], end: Optional[datetime]) -> Tuple[int, int]:
+    """[lo, hi) indices of the archived points inside the window"""
+    t = reader.times_ms()
+    lo = int(np.searchsorted(t, (np.datetime64(start, "ms") - EPOCH).astype(np.int64))) if start else 0
+    hi = int(np.searchsorted(t, (np.datetime64(end, "ms") - EPOCH).astype(np.int64), side="right")) if end else len(t)
+    return lo, hi
+
+
+def count_session_points(db: Session, session_id: int, start: Optional[datetime] = None,
+                         end: Optional[datetime] = None) -> int:
+    archive = db.query(LocationArchive).filter(LocationArchive.session_id == session_id).first()
+    total = raw_points_query(db, session_id, archive, start, end).order_by(None).count()
+    if archive and archive.point_count:
+        lo, hi = _archive_window(ArchiveReader(archive.data, archive.statuses or []), start, end)
+        total += hi - lo
+    return total
+
+
+def iter_session_points(db: Session, session_id: int, start: Optional[datetime] = None,
+                        end: Optional[datetime] = None, chunk_size: int = 1000) -> Iterator[tuple]:
+    """Streams (recorded_at, lat, lng, status) in time order from the archive and raw rows"""
+    archive = db.query(LocationArchive).filter(LocationArchive.session_id == session_id).first()
+    raw = raw_points_query(db, session_id, archive, start, end).yield_per(chunk_size)
+    if not archive or not archive.point_count:
+        yield from (tuple(row) for row in raw)
+        return
+
+    reader = ArchiveReader(archive.data, archive.statuses or [])
+    lo, hi = _archive_window(reader, start, end)
+    archived = reader.iter_points(chunk_size, lo, hi)
+    yield from heapq.merge(archived, (tuple(row) for row in raw), key=lambda point: point[0])
+
+
+# --- COMPACTION ---
+def compact_session(db: Session, session: DepartmentSession) -> LocationArchive:
+    """Archives a closed session's raw rows (raw rows are kept); caller commits"""
+    rows = db.query(
+        LocationLog.id, LocationLog.recorded_at, LocationLog.latitude, LocationLog.longitude, LocationLog.status
+    ).filter(
+        LocationLog.session_id == session.id,
+        LocationLog.latitude.isnot(None),
+        LocationLog.longitude.isnot(None)
+    ).order_by(LocationLog.recorded_at, LocationLog.id).all()
+
+    # Empty sessions get an empty archive too, so the job doesn't revisit them
+    ids, times, lats, lons, statuses = zip(*rows) if rows else ((), (), (), (), ())
+    blob, dictionary = encode_points(list(times), list(lats), list(lons), list(statuses))
+    archive = LocationArchive(
+        session_id=session.id,
+        company_id=session.company_id,
+        point_count=len(rows),
+        start_at=times[0] if rows else None,
+        end_at=times[-1] if rows else None,
+        last_log_id=max(ids) if rows else 0,
+        statuses=dictionary,
+        data=blob
+    )
+    db.add(archive)
+    return archive
+
+
+def purge_raw_rows(db: Session, archive: LocationArchive, chunk_size: int) -> int:
+    """Deletes the raw rows covered by the archive, one short transaction per chunk"""
+    purged = 0
+    while True:
+        ids = [i for (i,) in db.query(LocationLog.id).filter(
+            LocationLog.session_id == archive.session_id,
+            LocationLog.id <= archive.last_log_id
+        ).limit(chunk_size)]
+        if not ids:
+            break
+        db.query(LocationLog).filter(LocationLog.id.in_(ids)).delete(synchronize_session=False)
+        db.commit()
+        purged += len(ids)
+    archive.raw_purged = True
+    db.commit()
+    return purged
+
+
+def run_compaction(db: Session) -> dict:
+    now = datetime.utcnow()
+    compact_before = now - timedelta(hours=settings.LOCATION_COMPACT_AFTER_HOURS)
+    purge_before = now - timedelta(days=settings.LOCATION_RAW_RETENTION_DAYS)
+    batch = settings.LOCATION_COMPACTION_BATCH
+
+    # 1. Archive closed sessions that no longer take offline uploads
+    sessions = db.query(DepartmentSession).outerjoin(
+        LocationArchive, LocationArchive.session_id == DepartmentSession.id
+    ).filter(
+        DepartmentSession.active == False,
+        DepartmentSession.end_time < compact_before,
+        LocationArchive.session_id.is_(None)
+    ).order_by(DepartmentSession.end_time).limit(batch).all()
+
+    archived = points = 0
+    for session in sessions:
+        archive = compact_session(db, session)
+        db.commit()
+        archived += 1
+        points += archive.point_count
+
+    # 2. Drop raw rows for archives past the raw retention window
+    purgeable = db.query(LocationArchive).join(
+        DepartmentSession, DepartmentSession.id == LocationArchive.session_id
+    ).filter(
+        LocationArchive.raw_purged == False,
+        DepartmentSession.end_time < purge_before
+    )
+    if settings.LOCATION_ROLLUP_ENABLED:
+        # Keep raw rows the hourly rollup hasn't read yet
+        rolled_up = db.query(RollupWatermark.last_id).filter(RollupWatermark.name == "location_hourly").scalar() or 0
+        purgeable = purgeable.filter(LocationArchive.last_log_id <= rolled_up)
+    purged = 0
+    for archive in purgeable.limit(batch).all():
+        purged += purge_raw_rows(db, archive, settings.RETENTION_CHUNK_SIZE)
+
+    return {"sessions_archived": archived, "points_archived": points, "raw_rows_purged": purged}
+
+
+def _scheduled_run():
+    db = SessionLocal()
+    try:
+        return run_compaction(db)
+    finally:
+        db.close()
+
+
+location_compaction_task = PeriodicTask(
+    "location-compaction",
+    interval=settings.LOCATION_COMPACTION_INTERVAL_MINUTES * 60,
+    fn=_scheduled_run
+)
@@ -0,0 +1,51 @@
+"""
+Buffered LocationLog writes.
+
+/api/tracking/update validates the fix, queues it and answers immediately;
+the writer thread persists queued fixes in batches through write_fixes()
+(one executemany INSERT + one position upsert + one commit per batch).
+SQLAlchemy's insertmanyvalues turns that into multi-row INSERT statements
+on PostgreSQL.
+"""
+from datetime import datetime
+from typing import List
+
+from app.core.config import settings
+from app.core.positions import write_fixes
+from app.core.write_behind import WriteBehindQueue
+from app.db.database import SessionLocal
+
+
+def flush_location_rows(batch: List[dict]):
+    """Writer-thread flush: batch items are fix dicts as taken by write_fixes()"""
+    db = SessionLocal()
+    try:
+        write_fixes(db, batch)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def encode_fix(fix: dict) -> dict:
+    return {**fix, "recorded_at": fix["recorded_at"].isoformat()}
+
+
+def decode_fix(data: dict) -> dict:
+    return {**data, "recorded_at": datetime.fromisoformat(data["recorded_at"])}
+
+
+location_writer = WriteBehindQueue(
+    "location_logs",
+    flush_fn=flush_location_rows,
+    max_size=settings.LOCATION_BUFFER_MAX_SIZE,
+    batch_size=settings.LOCATION_FLUSH_BATCH_SIZE,
+    flush_interval=settings.LOCATION_FLUSH_INTERVAL_MS / 1000,
+    put_timeout=settings.LOCATION_BUFFER_PUT_TIMEOUT_MS / 1000,
+    linger=settings.LOCATION_FLUSH_INTERVAL_MS / 1000,
+    spill_dir=settings.WRITE_BEHIND_SPILL_DIR or None,
+    encode=encode_fix,
+    decode=decode_fix
+)
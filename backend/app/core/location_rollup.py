@@ -0,0 +1,305 @@
+"""
+Hourly tracking rollups (location_hourly_rollups) for distance / field-time
+reports.
+
+A periodic job folds LocationLog rows above a watermark into one row per
+session per hour: point count, moving distance, bounding box and time spent
+inside / outside the company's geofences. Reports read only the rollups.
+
+Distance comes from route_summary.classify_movement, as in the route
+summary (gaps longer than ROUTE_GAP_SECONDS count as neither time nor
+distance). A segment goes to the hour of the fix that ends it; its time goes
+to the geofence state of the fix that starts it, as in the session geofence
+report. A session's newest rolled-up fix and the movement anchor in force
+there are kept on its rollup row, so segments join up across runs. Offline fixes older than that rebuild the session's
+rollups from their hour on, from raw rows already below the watermark
+(offline uploads are bounded by TRACKING_BATCH_MAX_AGE_HOURS, long before
+raw rows are purged).
+
+Ids are allocated before commit, so a run only goes up to the highest id
+seen by the *previous* run: a row still in an open transaction then can't be
+skipped by the watermark.
+"""
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.geofence import geofence_cache
+from app.core.route_summary import classify_movement
+from app.core.scheduler import PeriodicTask
+from app.db.database import SessionLocal
+from app.db.models import DepartmentSession, Employee, LocationHourly, LocationLog, RollupWatermark
+
+WATERMARK = "location_hourly"
+
+
+def lock_watermark(db: Session) -> RollupWatermark:
+    """Row lock on PostgreSQL, so runs on several workers take turns"""
+    mark = db.query(RollupWatermark).filter(RollupWatermark.name == WATERMARK).with_for_update().first()
+    if mark is None:
+        mark = RollupWatermark(name=WATERMARK, last_id=0, horizon_id=0)
+        db.add(mark)
+        db.flush()
+    return mark
+
+
+def _seconds(value: datetime) -> float:
+    return np.datetime64(value, "us").astype(np.int64) / 1e6
+
+
+def _segments(lat: np.ndarray, lon: np.ndarray, t: np.ndarray, inside: np.ndarray, anchor: Optional[Tuple] = None):
+    """
+    Per-point (distance, inside seconds, outside seconds) for the segment ending
+    at each point, and the movement anchors after each point
+    """
+    n = len(t)
+    dist, inside_s, outside_s = np.zeros(n), np.zeros(n), np.zeros(n)
+    seg_dist, _, gap, anchors = classify_movement(lat, lon, t, anchor)
+    if n < 2:
+        return dist, inside_s, outside_s, anchors
+
+    dist[1:] = seg_dist
+    tracked = np.where(gap, 0.0, np.diff(t))
+    inside_s[1:] = np.where(inside[:-1], tracked, 0.0)
+    outside_s[1:] = np.where(inside[:-1], 0.0, tracked)
+    return dist, inside_s, outside_s, anchors
+
+
+def _fold_session(rollups: Dict[datetime, LocationHourly], prior: Optional[LocationHourly], points: List[tuple],
+                  fences, new_row) -> int:
+    """points: (recorded_at, lat, lng) sorted by time; updates/creates rollup rows in place"""
+    times = [p[0] for p in points]
+    lat = np.fromiter((p[1] for p in points), dtype=np.float64, count=len(points))
+    lon = np.fromiter((p[2] for p in points), dtype=np.float64, count=len(points))
+    stamps = np.asarray(times, dtype="datetime64[us]")
+    t = stamps.astype(np.int64) / 1e6
+    inside = fences.classify(lat, lon) >= 0
+
+    if prior is not None:
+        # The first segment joins on to the newest fix already rolled up, from the anchor in force there
+        anchor = None
+        if prior.anchor_at is not None:
+            anchor = (prior.anchor_lat, prior.anchor_lng, _seconds(prior.anchor_at))
+        dist, inside_s, outside_s, anchors = _segments(
+            np.append(prior.last_lat, lat), np.append(prior.last_lng, lon), np.append(_seconds(prior.last_at), t),
+            np.append(fences.locate(prior.last_lat, prior.last_lng) is not None, inside), anchor
+        )
+        dist, inside_s, outside_s = dist[1:], inside_s[1:], outside_s[1:]
+        anchors = tuple(a[1:] for a in anchors)
+    else:
+        dist, inside_s, outside_s, anchors = _segments(lat, lon, t, inside)
+
+    # Points are time-sorted, so each hour is one contiguous run
+    hours = stamps.astype("datetime64[h]")
+    keys, starts = np.unique(hours, return_index=True)
+    counts = np.diff(np.append(starts, len(t)))
+    sums = [np.add.reduceat(a, starts) for a in (dist, inside_s, outside_s)]
+    lows = [np.minimum.reduceat(a, starts) for a in (lat, lon)]
+    highs = [np.maximum.reduceat(a, starts) for a in (lat, lon)]
+    ends = np.append(starts[1:], len(t)) - 1
+
+    for k, hour in enumerate(keys.astype("datetime64[us]").tolist()):
+        row = rollups.get(hour)
+        if row is None:
+            row = rollups[hour] = new_row(hour)
+        row.point_count = (row.point_count or 0) + int(counts[k])
+        row.distance_m = round((row.distance_m or 0.0) + float(sums[0][k]), 1)
+        row.inside_seconds = (row.inside_seconds or 0) + int(round(sums[1][k]))
+        row.outside_seconds = (row.outside_seconds or 0) + int(round(sums[2][k]))
+        row.min_lat = float(lows[0][k]) if row.min_lat is None else min(row.min_lat, float(lows[0][k]))
+        row.min_lng = float(lows[1][k]) if row.min_lng is None else min(row.min_lng, float(lows[1][k]))
+        row.max_lat = float(highs[0][k]) if row.max_lat is None else max(row.max_lat, float(highs[0][k]))
+        row.max_lng = float(highs[1][k]) if row.max_lng is None else max(row.max_lng, float(highs[1][k]))
+        start, end = times[int(starts[k])], times[int(ends[k])]
+        row.first_at = start if row.first_at is None else min(row.first_at, start)
+        if row.last_at is None or end >= row.last_at:
+            row.last_at, row.last_lat, row.last_lng = end, float(lat[ends[k]]), float(lon[ends[k]])
+            a_lat, a_lng, a_t = (float(a[ends[k]]) for a in anchors)
+            row.anchor_lat, row.anchor_lng = a_lat, a_lng
+            row.anchor_at = datetime(1970, 1, 1) + timedelta(microseconds=round(a_t * 1e6))
+    return len(t)
+
+
+def _rebuild_from(db: Session, session_id: int, rollups: Dict[datetime, LocationHourly], since: datetime,
+                  upto_id: int) -> List[tuple]:
+    """Drops the session's rollups from `since` on; returns the raw points to fold back in"""
+    for hour in [h for h in rollups if h >= since]:
+        db.delete(rollups.pop(hour))
+    db.flush()  # Deletes before the re-inserts of the same (session, hour)
+    return db.query(LocationLog.recorded_at, LocationLog.latitude, LocationLog.longitude).filter(
+        LocationLog.session_id == session_id,
+        LocationLog.recorded_at >= since,
+        LocationLog.id <= upto_id,
+        LocationLog.latitude.isnot(None),
+        LocationLog.longitude.isnot(None)
+    ).order_by(LocationLog.recorded_at).all()
+
+
+def fold_rows(db: Session, rows: list, upto_id: int) -> int:
+    """
+    rows: LocationLog rows (with employee_id/company_id) in the id range ending
+    at `upto_id`; caller commits together with the watermark.
+    """
+    by_session = defaultdict(list)
+    owners = {}
+    for r in rows:
+        if r.latitude is None or r.longitude is None or r.recorded_at is None:
+            continue
+        by_session[r.session_id].append((r.recorded_at, r.latitude, r.longitude))
+        owners[r.session_id] = (r.employee_id, r.company_id)
+    if not by_session:
+        return 0
+
+    existing = defaultdict(dict)
+    for row in db.query(LocationHourly).filter(LocationHourly.session_id.in_(list(by_session))):
+        existing[row.session_id][row.hour_start] = row
+
+    folded = 0
+    for session_id, points in by_session.items():
+        employee_id, company_id = owners[session_id]
+        points.sort(key=lambda p: p[0])
+        rollups = existing[session_id]
+        prior = max((r for r in rollups.values() if r.last_at), key=lambda r: r.last_at, default=None)
+        if prior is not None and points[0][0] < prior.last_at:
+            # Late offline fixes: segments around them changed, rebuild from their hour
+            points = _rebuild_from(db, session_id, rollups, points[0][0].replace(minute=0, second=0, microsecond=0), upto_id)
+            prior = max((r for r in rollups.values() if r.last_at), key=lambda r: r.last_at, default=None)
+            if not points:
+                continue
+
+        def new_row(hour, session_id=session_id, employee_id=employee_id, company_id=company_id):
+            row = LocationHourly(
+                company_id=company_id, employee_id=employee_id, session_id=session_id, hour_start=hour,
+                point_count=0, distance_m=0.0, inside_seconds=0, outside_seconds=0
+            )
+            db.add(row)
+            return row
+
+        folded += _fold_session(rollups, prior, points, geofence_cache.get(db, company_id), new_row)
+    return folded
+
+
+def run_rollup(db: Session) -> dict:
+    horizon = db.query(func.max(LocationLog.id)).scalar() or 0
+    chunk_size = settings.LOCATION_ROLLUP_CHUNK_SIZE
+    rows_read = points = chunks = 0
+
+    while True:
+        mark = lock_watermark(db)
+        target = mark.horizon_id or 0
+        if mark.last_id >= target:
+            break
+        rows = db.query(
+            LocationLog.id, LocationLog.session_id, LocationLog.recorded_at, LocationLog.latitude, LocationLog.longitude,
+            DepartmentSession.employee_id, DepartmentSession.company_id
+        ).join(
+            DepartmentSession, DepartmentSession.id == LocationLog.session_id
+        ).filter(
+            LocationLog.id > mark.last_id,
+            LocationLog.id <= target
+        ).order_by(LocationLog.id).limit(chunk_size).all()
+
+        mark.last_id = rows[-1].id if len(rows) == chunk_size else target
+        points += fold_rows(db, rows, mark.last_id)
+        mark.updated_at = datetime.utcnow()
+        db.commit()  # Rollups and watermark move together
+        rows_read += len(rows)
+        chunks += 1
+
+    # Next run may go up to what exists now
+    mark = lock_watermark(db)
+    mark.horizon_id = max(mark.horizon_id or 0, horizon)
+    last_id = mark.last_id
+    db.commit()
+    return {"rows_read": rows_read, "points_folded": points, "chunks": chunks, "watermark": last_id, "horizon": horizon}
+
+
+def _scheduled_run():
+    db = SessionLocal()
+    try:
+        return run_rollup(db)
+    finally:
+        db.close()
+
+
+location_rollup_task = PeriodicTask(
+    "location-rollup",
+    interval=settings.LOCATION_ROLLUP_INTERVAL_MINUTES * 60,
+    fn=_scheduled_run
+)
+
+
+# --- REPORTS (rollup table only) ---
+def _window(start: date, end: date):
+    return datetime.combine(start, datetime.min.time()), datetime.combine(end + timedelta(days=1), datetime.min.time())
+
+
+def daily_report(db: Session, company_id: int, start: date, end: date, employee_code: Optional[str] = None) -> list:
+    """Distance and field time per employee per day"""
+    day = func.date(LocationHourly.hour_start)
+    lo, hi = _window(start, end)
+    query = db.query(
+        Employee.employee_id, Employee.name, day.label("day"),
+        func.sum(LocationHourly.point_count).label("points"),
+        func.sum(LocationHourly.distance_m).label("distance_m"),
+        func.sum(LocationHourly.inside_seconds).label("inside_seconds"),
+        func.sum(LocationHourly.outside_seconds).label("outside_seconds"),
+        func.count(func.distinct(LocationHourly.session_id)).label("sessions"),
+        func.min(LocationHourly.first_at).label("first_at"),
+        func.max(LocationHourly.last_at).label("last_at")
+    ).join(
+        Employee, Employee.id == LocationHourly.employee_id
+    ).filter(
+        LocationHourly.company_id == company_id,
+        LocationHourly.hour_start >= lo,
+        LocationHourly.hour_start < hi
+    )
+    if employee_code:
+        query = query.filter(Employee.employee_id == employee_code)
+
+    return [
+        {
+            "employee_id": r.employee_id,
+            "name": r.name,
+            "date": str(r.day),
+            "points": int(r.points or 0),
+            "sessions": r.sessions,
+            "distance_km": round((r.distance_m or 0.0) / 1000, 3),
+            "field_hours": round(((r.inside_seconds or 0) + (r.outside_seconds or 0)) / 3600, 2),
+            "inside_geofence_hours": round((r.inside_seconds or 0) / 3600, 2),
+            "outside_geofence_hours": round((r.outside_seconds or 0) / 3600, 2),
+            "first_seen": r.first_at.isoformat() if r.first_at else None,
+            "last_seen": r.last_at.isoformat() if r.last_at else None
+        } for r in query.group_by(Employee.employee_id, Employee.name, day).order_by(day, Employee.employee_id)
+    ]
+
+
+def hourly_report(db: Session, company_id: int, employee_code: str, start: date, end: date) -> list:
+    lo, hi = _window(start, end)
+    rows = db.query(LocationHourly).join(
+        Employee, Employee.id == LocationHourly.employee_id
+    ).filter(
+        LocationHourly.company_id == company_id,
+        Employee.employee_id == employee_code,
+        LocationHourly.hour_start >= lo,
+        LocationHourly.hour_start < hi
+    ).order_by(LocationHourly.hour_start, LocationHourly.session_id)
+
+    return [
+        {
+            "hour": r.hour_start.isoformat(),
+            "session_id": r.session_id,
+            "points": r.point_count,
+            "distance_m": r.distance_m,
+            "inside_geofence_seconds": r.inside_seconds,
+            "outside_geofence_seconds": r.outside_seconds,
+            "bbox": [r.min_lat, r.min_lng, r.max_lat, r.max_lng],
+            "first_seen": r.first_at.isoformat() if r.first_at else None,
+            "last_seen": r.last_at.isoformat() if r.last_at else None
+        } for r in rows
+    ]
@@ -0,0 +1,114 @@
+"""
+Cross-worker change notifications over PostgreSQL LISTEN / NOTIFY.
+
+`notify(db, channel, payload)` queues a NOTIFY in the caller's transaction:
+PostgreSQL delivers it at commit and drops it on rollback, so listeners
+never hear about a change they can't read yet. `notify_listener` holds one
+LISTEN connection per worker and calls the handlers subscribed to each
+channel. Notifications sent while it is disconnected are lost, so every
+(re)connect also calls the subscribers' `on_connect` hooks: in-memory state
+that relies on notifications must be dropped there.
+
+Other dialects have no cross-worker channel: notify() is a no-op and the
+listener never connects (`connected` stays False), so callers fall back to
+whatever bound they use without it.
+"""
+import logging
+import select
+import threading
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.db.database import engine
+
+logger = logging.getLogger("saas_core")
+
+
+def notify(db: Session, channel: str, payload: str):
+    """NOTIFY `channel` when the caller's transaction commits (PostgreSQL only)"""
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": channel, "payload": payload})
+
+
+class NotifyListener:
+    """LISTEN on every subscribed channel from a dedicated connection (PostgreSQL only)"""
+
+    def __init__(self, reconnect_seconds: float = 5.0):
+        self.reconnect_seconds = reconnect_seconds
+        self._handlers: Dict[str, Callable[[str], None]] = {}
+        self._on_connect: List[Callable[[], None]] = []
+        self._stop = threading.Event()
+        self._thread = None
+
+        # Metrics
+        self.connected = False
+        self.notifications = 0
+        self.reconnects = 0
+
+    def subscribe(self, channel: str, handler: Callable[[str], None], on_connect: Optional[Callable[[], None]] = None):
+        """Call before start(): channels are LISTENed on connect"""
+        self._handlers[channel] = handler
+        if on_connect:
+            self._on_connect.append(on_connect)
+
+    def start(self):
+        if engine.dialect.name != "postgresql" or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="notify-listener", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self._listen()
+            except Exception:
+                logger.exception("notify listener: connection lost")
+            self.connected = False
+            if self._stop.wait(self.reconnect_seconds):
+                return
+            self.reconnects += 1
+
+    def _listen(self):
+        conn = engine.raw_connection()
+        conn.detach()  # Held for the worker's lifetime, not a pool slot
+        try:
+            dbapi = conn.dbapi_connection
+            dbapi.autocommit = True
+            with dbapi.cursor() as cursor:
+                for channel in self._handlers:
+                    cursor.execute(f"LISTEN {channel}")
+            # Listening from here on: anything sent before is what on_connect discards
+            for hook in self._on_connect:
+                hook()
+            self.connected = True
+            while not self._stop.is_set():
+                if select.select([dbapi], [], [], 1.0)[0]:
+                    dbapi.poll()
+                    while dbapi.notifies:
+                        note = dbapi.notifies.pop(0)
+                        self.notifications += 1
+                        handler = self._handlers.get(note.channel)
+                        if handler:
+                            handler(note.payload)
+        finally:
+            conn.close()
+
+    def stats(self) -> dict:
+        return {
+            "enabled": engine.dialect.name == "postgresql",
+            "connected": self.connected,
+            "channels": sorted(self._handlers),
+            "notifications": self.notifications,
+            "reconnects": self.reconnects,
+        }
+
+
+notify_listener = NotifyListener()
@@ -0,0 +1,67 @@
+"""
+Keyset (seek) pagination for the newest-first audit and history lists.
+
+A page is `WHERE (k1, k2, ..., id) < (cursor values) ORDER BY k1 DESC, ...,
+id DESC LIMIT n`, so with an index on (company_id, k1, ..., id) every page
+is an index seek plus n rows, however deep it is (no OFFSET scan).
+
+Cursors are opaque to clients: base64url JSON of the last row's key values.
+A cursor that doesn't decode for the requested list raises ValueError.
+"""
+import base64
+import json
+from datetime import date, datetime
+from typing import Optional, Sequence, Tuple
+
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Query
+
+
+def _encode_value(value):
+    return value.isoformat() if isinstance(value, (date, datetime)) else value
+
+
+def _decode_value(value, python_type):
+    if value is None:
+        return None
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    if python_type is date:
+        return date.fromisoformat(value)
+    return python_type(value)
+
+
+def encode_cursor(values: Sequence) -> str:
+    raw = json.dumps([_encode_value(v) for v in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, keys: Sequence) -> tuple:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(values, list) or len(values) != len(keys):
+            raise ValueError
+        return tuple(_decode_value(v, key.type.python_type) for v, key in zip(values, keys))
+    except (ValueError, TypeError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+
+
+def page_query(query: Query, keys: Sequence, cursor: Optional[str], limit: int) -> Query:
+    """The seek query for one page: up to limit + 1 rows, so a further page can be detected"""
+    if cursor:
+        query = query.filter(tuple_(*keys) < tuple_(*decode_cursor(cursor, keys)))
+    return query.order_by(*[key.desc() for key in keys]).limit(limit + 1)
+
+
+def keyset_page(query: Query, keys: Sequence, cursor: Optional[str], limit: int) -> Tuple[list, Optional[str]]:
+    """
+    One page of `query` (ORM entity rows) ordered by `keys` descending.
+    The last key must be unique (the primary key) and every key NOT NULL: a
+    row-value comparison with a NULL is never true, so such rows would be
+    skipped. Returns (rows, next_cursor).
+    """
+    rows = page_query(query, keys, cursor, limit).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor([getattr(rows[-1], key.key) for key in keys])
@@ -0,0 +1,103 @@
+"""
+Current position per tracked employee (employee_current_positions).
+
+Every location write path hands its fixes to `write_fixes()`, which inserts
+the LocationLog history rows and upserts the newest fix per employee, so the
+live map is a single indexed read instead of a sort over the log table.
+"""
+from typing import List
+
+from sqlalchemy import func, insert
+from sqlalchemy.orm import Session
+
+from app.db.models import DepartmentSession, EmployeePosition, LocationLog
+
+FIX_COLUMNS = ("session_id", "latitude", "longitude", "status", "recorded_at")
+
+
+def latest_per_employee(fixes: List[dict]) -> List[dict]:
+    newest = {}
+    for fix in fixes:
+        current = newest.get(fix["employee_id"])
+        if current is None or fix["recorded_at"] >= current["recorded_at"]:
+            newest[fix["employee_id"]] = fix
+    return [
+        {"employee_id": f["employee_id"], "company_id": f["company_id"], **{c: f[c] for c in FIX_COLUMNS}}
+        for f in newest.values()
+    ]
+
+
+def upsert_positions(db: Session, rows: List[dict]):
+    """Only moves a position forward in time (offline replays can't rewind the map)"""
+    if not rows:
+        return
+    dialect = db.get_bind().dialect.name
+
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as upsert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as upsert
+        stmt = upsert(EmployeePosition)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[EmployeePosition.employee_id],
+            set_={c: stmt.excluded[c] for c in ("company_id",) + FIX_COLUMNS},
+            where=EmployeePosition.recorded_at < stmt.excluded.recorded_at
+        )
+        db.execute(stmt, rows)
+        return
+
+    # Portable fallback: read, then update/insert
+    existing = {
+        p.employee_id: p for p in db.query(EmployeePosition).filter(
+            EmployeePosition.employee_id.in_([r["employee_id"] for r in rows])
+        )
+    }
+    for row in rows:
+        position = existing.get(row["employee_id"])
+        if position is None:
+            db.add(EmployeePosition(**row))
+        elif position.recorded_at < row["recorded_at"]:
+            for column in ("company_id",) + FIX_COLUMNS:
+                setattr(position, column, row[column])
+
+
+def write_fixes(db: Session, fixes: List[dict]):
+    """
+    fixes: dicts with employee_id (Employee.id), company_id and the LocationLog
+    columns. Inserts the history rows and upserts positions; caller commits.
+    """
+    if not fixes:
+        return
+    db.execute(insert(LocationLog), [{c: f[c] for c in FIX_COLUMNS} for f in fixes])
+    upsert_positions(db, latest_per_employee(fixes))
+
+
+def backfill_positions(db: Session) -> int:
+    """Seeds the table from LocationLog history (first start after upgrading)"""
+    if db.query(EmployeePosition.employee_id).first() is not None:
+        return 0
+
+    latest = db.query(
+        DepartmentSession.employee_id.label("employee_id"),
+        func.max(LocationLog.recorded_at).label("recorded_at")
+    ).join(LocationLog, LocationLog.session_id == DepartmentSession.id).group_by(
+        DepartmentSession.employee_id
+    ).subquery()
+
+    rows = db.query(DepartmentSession.employee_id, DepartmentSession.company_id, LocationLog).join(
+        LocationLog, LocationLog.session_id == DepartmentSession.id
+    ).join(
+        latest,
+        (latest.c.employee_id == DepartmentSession.employee_id) & (latest.c.recorded_at == LocationLog.recorded_at)
+    ).all()
+
+    positions = {}
+    for employee_id, company_id, log in rows:
+        positions[employee_id] = {
+            "employee_id": employee_id, "company_id": company_id,
+            **{c: getattr(log, c) for c in FIX_COLUMNS}
+        }
+    upsert_positions(db, list(positions.values()))
+    db.commit()
+    return len(positions)
@@ -0,0 +1,90 @@
+"""
+Query builders for the hot lookups and lists.
+
+The routers build these queries through the functions here, and so does
+benchmarks/query_plans. Its EXPLAIN then checks the SQL the endpoints
+actually send. If you change a filter or an ordering here, that benchmark
+will report the plan that goes with it.
+
+Each builder returns an unexecuted ORM Query. Callers add .first(), .all()
+or keyset_page() with the matching *_PAGE_KEYS.
+"""
+from datetime import date, datetime
+from typing import Optional
+
+from sqlalchemy.orm import Query, Session
+
+from app.db.models import Attendance, DepartmentSession, DoorEvent, DoorEventHourly, ShortLeave
+
+# Keyset order of each paged list (newest first); see app.core.pagination
+ATTENDANCE_PAGE_KEYS = (Attendance.date_only, Attendance.timestamp, Attendance.id)
+SHORT_LEAVE_PAGE_KEYS = (ShortLeave.exit_time, ShortLeave.id)
+DOOR_EVENT_PAGE_KEYS = (DoorEvent.created_at, DoorEvent.id)
+
+
+# --- ATTENDANCE ---
+def attendance_day(db: Session, company_id: int, employee_code: str, day: date) -> Query:
+    """The employee's row for the day (at most one: uq_attendance_company_employee_day)"""
+    return db.query(Attendance).filter(
+        Attendance.company_id == company_id,
+        Attendance.employee_id == employee_code,
+        Attendance.date_only == day
+    )
+
+
+def attendance_history(db: Session, company_id: int, employee_code: str) -> Query:
+    return db.query(Attendance).filter(
+        Attendance.company_id == company_id,
+        Attendance.employee_id == employee_code
+    )
+
+
+def audit_attendance(db: Session, company_id: int) -> Query:
+    return db.query(Attendance).filter(Attendance.company_id == company_id)
+
+
+# --- SHORT LEAVES ---
+def short_leaves_on(db: Session, company_id: int, employee_code: str, day: date) -> Query:
+    return db.query(ShortLeave).filter(
+        ShortLeave.company_id == company_id,
+        ShortLeave.employee_id == employee_code,
+        ShortLeave.date_only == day
+    ).order_by(ShortLeave.exit_time.asc())
+
+
+def active_short_leave(db: Session, company_id: int, employee_code: str, day: date) -> Query:
+    return db.query(ShortLeave).filter(
+        ShortLeave.company_id == company_id,
+        ShortLeave.employee_id == employee_code,
+        ShortLeave.date_only == day,
+        ShortLeave.return_time == None
+    )
+
+
+def audit_short_leaves(db: Session, company_id: int) -> Query:
+    return db.query(ShortLeave).filter(ShortLeave.company_id == company_id)
+
+
+# --- DOOR EVENTS ---
+def audit_door_events(db: Session, company_id: int) -> Query:
+    return db.query(DoorEvent).filter(DoorEvent.company_id == company_id)
+
+
+def door_activity(db: Session, company_id: int, start: date, end: date, device_id: Optional[str] = None) -> Query:
+    """Hourly door counts from start through end (inclusive days)"""
+    query = db.query(DoorEventHourly).filter(
+        DoorEventHourly.company_id == company_id,
+        DoorEventHourly.hour_start >= datetime.combine(start, datetime.min.time()),
+        DoorEventHourly.hour_start < datetime.combine(end, datetime.max.time())
+    )
+    if device_id:
+        query = query.filter(DoorEventHourly.device_id == device_id)
+    return query.order_by(DoorEventHourly.hour_start, DoorEventHourly.device_id)
+
+
+# --- TRACKING ---
+def active_sessions(db: Session, employee_id: int) -> Query:
+    return db.query(DepartmentSession).filter(
+        DepartmentSession.employee_id == employee_id,
+        DepartmentSession.active == True
+    )
@@ -0,0 +1,127 @@
+"""
+Door event retention.
+
+Raw DoorEvent rows older than a company's retention window are folded into
+DoorEventHourly (events per device per hour per type) and then deleted.
+Work is done in chunks of RETENTION_CHUNK_SIZE rows, each in its own short
+transaction, so the job never holds long locks on door_events.
+
+The job runs in every worker. On PostgreSQL each chunk transaction takes a
+per-company advisory lock first, and a worker that can't get it leaves the
+company to the one that has it. A chunk whose rows were deleted by someone
+else in the meantime is rolled back before it reaches the rollup, so events
+are never counted twice.
+"""
+from collections import Counter
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.scheduler import PeriodicTask
+from app.db.database import SessionLocal
+from app.db.models import Company, DoorEvent, DoorEventHourly, DoorEventRetention
+
+ADVISORY_LOCK_KEY = 7_290_002  # (key, company_id) pairs; migrations use 7_290_001
+
+
+def retention_days_for(db: Session, company_id: int) -> int:
+    policy = db.query(DoorEventRetention).filter(DoorEventRetention.company_id == company_id).first()
+    return policy.retention_days if policy else settings.DOOR_EVENT_RETENTION_DAYS
+
+
+def hour_bucket(ts: datetime) -> datetime:
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+
+def add_to_rollup(db: Session, company_id: int, counts: Counter):
+    """counts: (device_id, hour_start, event_type) -> n, added onto existing rollup rows"""
+    hours = {hour for _, hour, _ in counts}
+    existing = {
+        (r.device_id, r.hour_start, r.event_type): r
+        for r in db.query(DoorEventHourly).filter(
+            DoorEventHourly.company_id == company_id,
+            DoorEventHourly.hour_start.in_(hours)
+        )
+    }
+    for (device_id, hour, event_type), n in counts.items():
+        row = existing.get((device_id, hour, event_type))
+        if row:
+            row.event_count += n
+        else:
+            db.add(DoorEventHourly(
+                company_id=company_id, device_id=device_id, hour_start=hour,
+                event_type=event_type, event_count=n
+            ))
+
+
+def try_lock_company(db: Session, company_id: int) -> bool:
+    """Advisory lock held until the transaction ends (PostgreSQL); other dialects run one writer anyway"""
+    if db.get_bind().dialect.name != "postgresql":
+        return True
+    return bool(db.execute(
+        text("SELECT pg_try_advisory_xact_lock(:key, :company_id)"),
+        {"key": ADVISORY_LOCK_KEY, "company_id": company_id}
+    ).scalar())
+
+
+def purge_company(db: Session, company_id: int, cutoff: datetime, chunk_size: int) -> int:
+    purged = 0
+    while True:
+        if not try_lock_company(db, company_id):
+            db.rollback()
+            return purged  # Another worker is purging this company
+
+        rows = db.query(DoorEvent.id, DoorEvent.device_id, DoorEvent.event_type, DoorEvent.created_at).filter(
+            DoorEvent.company_id == company_id,
+            DoorEvent.created_at < cutoff
+        ).order_by(DoorEvent.created_at).limit(chunk_size).all()
+        if not rows:
+            db.rollback()
+            return purged
+
+        # Delete first: only the transaction that actually removed the rows counts them
+        deleted = db.query(DoorEvent).filter(
+            DoorEvent.id.in_([r.id for r in rows])
+        ).delete(synchronize_session=False)
+        if deleted != len(rows):
+            db.rollback()
+            continue
+
+        add_to_rollup(db, company_id, Counter(
+            (r.device_id, hour_bucket(r.created_at), r.event_type) for r in rows
+        ))
+        db.commit()
+        purged += len(rows)
+
+
+def run_retention(db: Session) -> dict:
+    now = datetime.utcnow()
+    policies = dict(db.query(DoorEventRetention.company_id, DoorEventRetention.retention_days))
+    purged = {}
+
+    for (company_id,) in db.query(Company.id):
+        days = policies.get(company_id, settings.DOOR_EVENT_RETENTION_DAYS)
+        if not days or days <= 0:
+            continue  # 0 = keep forever
+        count = purge_company(db, company_id, now - timedelta(days=days), settings.RETENTION_CHUNK_SIZE)
+        if count:
+            purged[company_id] = count
+
+    return {"companies_purged": len(purged), "events_purged": sum(purged.values())}
+
+
+def _scheduled_run():
+    db = SessionLocal()
+    try:
+        return run_retention(db)
+    finally:
+        db.close()
+
+
+retention_task = PeriodicTask(
+    "door-event-retention",
+    interval=settings.RETENTION_JOB_INTERVAL_MINUTES * 60,
+    fn=_scheduled_run
+)
@@ -0,0 +1,174 @@
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.notify import notify, notify_listener
+from app.db.models import Company, Employee
+
+NOTIFY_CHANNEL = "roster_changes"
+
+
+@dataclass(frozen=True)
+class RosterEntry:
+    id: int
+    name: str
+    active: bool
+
+
+@dataclass
+class CompanyRoster:
+    status: str
+    employees: Dict[str, RosterEntry] = field(default_factory=dict)
+    loaded_at: float = 0.0
+
+
+def is_active_employee(status: Optional[str]) -> bool:
+    return (status or "active") == "active"
+
+
+class RosterIndex:
+    """
+    Per-company employee_code -> RosterEntry index plus company status,
+    so door decisions can be made without ORM loads.
+
+    Warmed at startup and kept current by the employee/company endpoints.
+    This is an access-control cache. It bounds how long a deleted or
+    deactivated employee, or a suspended company, can still open a door on
+    any worker:
+
+    - PostgreSQL: endpoints call publish() in the transaction making the
+      change. Every worker's notify_listener drops that company's roster when
+      the change commits, so the bound is the NOTIFY delivery delay. A
+      listener that (re)connects drops every roster, because it can't know
+      what it missed.
+    - No live listener (other dialects, or while it reconnects): rosters are
+      reloaded after `fallback_ttl_seconds` (a few seconds), which bounds the
+      staleness instead.
+
+    `ttl_seconds` is only a backstop for the notified case.
+    """
+
+    def __init__(self, ttl_seconds: int, fallback_ttl_seconds: int):
+        self.ttl_seconds = ttl_seconds
+        self.fallback_ttl_seconds = fallback_ttl_seconds
+        self._rosters: Dict[int, CompanyRoster] = {}
+        self._lock = threading.Lock()
+        self._epoch = 0  # Bumped by invalidations; a load that raced one isn't cached
+        self.loads = 0
+        self.invalidations = 0
+
+    # --- Reads ---
+    def get(self, db: Session, company_id: int) -> Optional[CompanyRoster]:
+        roster = self._rosters.get(company_id)
+        ttl = self.ttl_seconds if notify_listener.connected else self.fallback_ttl_seconds
+        if roster is None or time.monotonic() - roster.loaded_at > ttl:
+            roster = self.load(db, company_id)
+        return roster
+
+    # --- Loading ---
+    def warm(self, db: Session):
+        """Loads every company in two queries"""
+        epoch = self._epoch
+        now = time.monotonic()
+        rosters = {
+            c.id: CompanyRoster(status=c.status, loaded_at=now)
+            for c in db.query(Company.id, Company.status)
+        }
+        rows = db.query(Employee.id, Employee.company_id, Employee.employee_id, Employee.name, Employee.status).filter(
+            Employee.deleted_at == None
+        )
+        for r in rows:
+            roster = rosters.get(r.company_id)
+            if roster is not None:
+                roster.employees[r.employee_id] = RosterEntry(id=r.id, name=r.name, active=is_active_employee(r.status))
+
+        with self._lock:
+            if self._epoch == epoch:
+                self._rosters = rosters
+            self.loads += 1
+
+    def load(self, db: Session, company_id: int) -> Optional[CompanyRoster]:
+        epoch = self._epoch
+        status = db.query(Company.status).filter(Company.id == company_id).scalar()
+        if status is None:
+            self.invalidate(company_id)
+            return None
+
+        rows = db.query(Employee.id, Employee.employee_id, Employee.name, Employee.status).filter(
+            Employee.company_id == company_id,
+            Employee.deleted_at == None
+        )
+        roster = CompanyRoster(
+            status=status,
+            employees={
+                r.employee_id: RosterEntry(id=r.id, name=r.name, active=is_active_employee(r.status))
+                for r in rows
+            },
+            loaded_at=time.monotonic()
+        )
+        with self._lock:
+            # An invalidation during the queries may be for a change they didn't see
+            if self._epoch == epoch:
+                self._rosters[company_id] = roster
+            self.loads += 1
+        return roster
+
+    # --- Cross-worker invalidation ---
+    def publish(self, db: Session, company_id: int):
+        """Call before committing a change to the company's status or employees: other workers drop the roster"""
+        notify(db, NOTIFY_CHANNEL, str(company_id))
+
+    def _on_notify(self, payload: str):
+        self.invalidate(int(payload))
+
+    def invalidate_all(self):
+        with self._lock:
+            self._rosters = {}
+            self._epoch += 1
+            self.invalidations += 1
+
+    # --- Incremental updates (call after the DB commit) ---
+    def upsert_employee(self, company_id: int, employee_code: str, id: int, name: str, status: Optional[str]):
+        with self._lock:
+            roster = self._rosters.get(company_id)
+            if roster is not None:
+                roster.employees[employee_code] = RosterEntry(id=id, name=name, active=is_active_employee(status))
+
+    def remove_employee(self, company_id: int, employee_code: str):
+        with self._lock:
+            roster = self._rosters.get(company_id)
+            if roster is not None:
+                roster.employees.pop(employee_code, None)
+
+    def set_company_status(self, company_id: int, status: str):
+        with self._lock:
+            roster = self._rosters.get(company_id)
+            if roster is not None:
+                roster.status = status
+
+    def invalidate(self, company_id: int):
+        with self._lock:
+            self._rosters.pop(company_id, None)
+            self._epoch += 1
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        rosters = list(self._rosters.values())
+        return {
+            "companies": len(rosters),
+            "employees": sum(len(r.employees) for r in rosters),
+            "loads": self.loads,
+            "invalidations": self.invalidations,
+            "notified": notify_listener.connected,
+        }
+
+
+roster_index = RosterIndex(
+    ttl_seconds=settings.ROSTER_TTL_SECONDS,
+    fallback_ttl_seconds=settings.ROSTER_FALLBACK_TTL_SECONDS
+)
+notify_listener.subscribe(NOTIFY_CHANNEL, roster_index._on_notify, on_connect=roster_index.invalidate_all)
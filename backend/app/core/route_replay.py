@@ -0,0 +1,114 @@
+"""
+Route replay: a session's track for a time window, downsampled on the server.
+
+Points are streamed in time order (`iter_session_points`) through
+`StreamingDownsampler`, which keeps O(1) state: the previous, current and
+next point plus the best candidate of the current bucket. Within each of the
+`target - 2` equal buckets it keeps the point with the largest triangle
+formed with its neighbours (Largest-Triangle-One-Bucket), so turns and stops
+survive while straight stretches collapse. First and last points are always
+kept.
+
+The result goes out as a Google encoded polyline plus second offsets from
+the first point, which is all the map needs to animate a replay.
+"""
+import math
+from datetime import datetime
+from typing import Iterable, List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.core.location_archive import count_session_points, iter_session_points
+
+
+class StreamingDownsampler:
+    def __init__(self, total: int, target: int):
+        self.target = max(target, 3)
+        self.passthrough = total <= self.target
+        self.bucket_size = (total - 2) / (self.target - 2) if not self.passthrough else 1.0
+        self.kept: List[tuple] = []
+        self._index = 0
+        self._prev = self._cur = None
+        self._bucket = 0
+        self._best = None
+        self._best_area = -1.0
+        self._x_scale = 1.0
+
+    def _xy(self, point: tuple):
+        return point[2] * self._x_scale, point[1]
+
+    def _close_bucket(self):
+        if self._best is not None:
+            self.kept.append(self._best)
+        self._best, self._best_area = None, -1.0
+
+    def add(self, point: tuple):
+        """point: (recorded_at, lat, lng, ...) in time order"""
+        index, self._index = self._index, self._index + 1
+        if self.passthrough:
+            self.kept.append(point)
+            return
+        if index == 0:
+            self._x_scale = math.cos(math.radians(point[1]))
+            self.kept.append(point)
+            self._prev = point
+            return
+        if self._cur is not None:
+            # The current point's neighbours are now known: score it
+            bucket = min(int((index - 2) / self.bucket_size), self.target - 3)
+            if bucket != self._bucket:
+                self._close_bucket()
+                self._bucket = bucket
+            (ax, ay), (bx, by), (cx, cy) = self._xy(self._prev), self._xy(self._cur), self._xy(point)
+            area = abs((ax - cx) * (by - ay) - (ax - bx) * (cy - ay))
+            if area > self._best_area:
+                self._best, self._best_area = self._cur, area
+            self._prev = self._cur
+        self._cur = point
+
+    def finish(self) -> List[tuple]:
+        if not self.passthrough:
+            self._close_bucket()
+            if self._cur is not None:
+                self.kept.append(self._cur)
+        return self.kept
+
+
+def _encode_value(value: int, out: List[str]):
+    value = ~(value << 1) if value < 0 else value << 1
+    while value >= 0x20:
+        out.append(chr((0x20 | (value & 0x1F)) + 63))
+        value >>= 5
+    out.append(chr(value + 63))
+
+
+def encode_polyline(points: Iterable[tuple], precision: int = 5) -> str:
+    """Google encoded polyline of (lat, lng) pairs"""
+    factor = 10 ** precision
+    out: List[str] = []
+    last_lat = last_lng = 0
+    for lat, lng in points:
+        lat_i, lng_i = int(round(lat * factor)), int(round(lng * factor))
+        _encode_value(lat_i - last_lat, out)
+        _encode_value(lng_i - last_lng, out)
+        last_lat, last_lng = lat_i, lng_i
+    return "".join(out)
+
+
+def replay_route(db: Session, session_id: int, start: Optional[datetime], end: Optional[datetime], target: int) -> dict:
+    total = count_session_points(db, session_id, start, end)
+    sampler = StreamingDownsampler(total, target)
+    for point in iter_session_points(db, session_id, start, end):
+        sampler.add(point)
+    kept = sampler.finish()
+
+    t0 = kept[0][0] if kept else None
+    return {
+        "total_points": total,
+        "returned_points": len(kept),
+        "start": t0.isoformat() if kept else None,
+        "end": kept[-1][0].isoformat() if kept else None,
+        "polyline": encode_polyline((p[1], p[2]) for p in kept),
+        "offsets_s": [int((p[0] - t0).total_seconds()) for p in kept],
+        "statuses": [p[3] for p in kept],
+    }
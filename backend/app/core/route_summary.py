@@ -0,0 +1,267 @@
+"""
+Route summaries for closed tracking sessions (DepartmentSession.route_summary).
+
+All geometry is vectorised with NumPy over the session's points:
+- distance, moving / idle / gap time (classify_movement, shared with the
+  hourly rollups)
+- dwell points: stretches that stay within DWELL_RADIUS_M for DWELL_MIN_SECONDS
+- Douglas-Peucker simplification on a local equirectangular projection, so the
+  admin map draws a day's route from a few hundred points instead of every fix.
+"""
+import logging
+from datetime import datetime
+from typing import Iterable, List, Optional
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.location_archive import load_session_points
+from app.core.location_buffer import location_writer
+from app.db.database import SessionLocal
+from app.db.models import DepartmentSession
+
+logger = logging.getLogger("saas_core")
+
+EARTH_RADIUS_M = 6371000.0
+SUMMARY_VERSION = 2
+
+
+def haversine_m(lat1, lon1, lat2, lon2) -> np.ndarray:
+    lat1, lon1, lat2, lon2 = (np.radians(a) for a in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def project_m(lat: np.ndarray, lon: np.ndarray):
+    """Equirectangular x/y in metres around the route's mean latitude (fine at city scale)"""
+    k = np.cos(np.radians(lat.mean()))
+    return np.radians(lon) * EARTH_RADIUS_M * k, np.radians(lat) * EARTH_RADIUS_M
+
+
+def douglas_peucker(x: np.ndarray, y: np.ndarray, tolerance: float) -> np.ndarray:
+    """Indices of the points kept (iterative, each split vectorised)"""
+    n = len(x)
+    if n < 3:
+        return np.arange(n)
+
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        dx, dy = x[end] - x[start], y[end] - y[start]
+        px, py = x[start + 1:end] - x[start], y[start + 1:end] - y[start]
+        length = np.hypot(dx, dy)
+        if length == 0:
+            dist = np.hypot(px, py)
+        else:
+            dist = np.abs(dx * py - dy * px) / length
+        i = int(np.argmax(dist))
+        if dist[i] > tolerance:
+            split = start + 1 + i
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+    return np.flatnonzero(keep)
+
+
+def find_dwells(lat: np.ndarray, lon: np.ndarray, t: np.ndarray, radius_m: float, min_seconds: float) -> List[tuple]:
+    """(start index, end index) of stretches staying within radius_m of their first point"""
+    dwells = []
+    n, i = len(lat), 0
+    window = 256
+    while i < n - 1:
+        # Grow the look-ahead window until a point leaves the radius (or the route ends)
+        j = None
+        lo = i + 1
+        while lo < n:
+            hi = min(n, lo + window)
+            outside = np.flatnonzero(haversine_m(lat[i], lon[i], lat[lo:hi], lon[lo:hi]) > radius_m)
+            if len(outside):
+                j = lo + int(outside[0])
+                break
+            lo = hi
+        last = (j if j is not None else n) - 1
+        if t[last] - t[i] >= min_seconds:
+            dwells.append((i, last))
+            i = last + 1
+        else:
+            i += 1
+    return dwells
+
+
+def smooth_track(lat: np.ndarray, lon: np.ndarray, t: np.ndarray, gap: np.ndarray, seconds: float):
+    """Centred moving average of the fixes within +/- seconds/2 of each one, never across a gap"""
+    n = len(t)
+    if n < 3 or seconds <= 0:
+        return lat, lon
+    run = np.concatenate(([0], np.cumsum(gap)))
+    lo = np.maximum(np.searchsorted(t, t - seconds / 2, "left"), np.searchsorted(run, run, "left"))
+    hi = np.minimum(np.searchsorted(t, t + seconds / 2, "right"), np.searchsorted(run, run, "right"))
+    smoothed = []
+    for a in (lat, lon):
+        total = np.concatenate(([0.0], np.cumsum(a - a[0])))
+        smoothed.append(a[0] + (total[hi] - total[lo]) / (hi - lo))
+    return smoothed[0], smoothed[1]
+
+
+def classify_movement(lat: np.ndarray, lon: np.ndarray, t: np.ndarray, anchor: Optional[tuple] = None):
+    """
+    Per-segment (distance, moving, gap) arrays for the segments between
+    consecutive fixes.
+
+    Jitter is judged on displacement from an anchor, not per segment (at 1-5 s
+    fix rates a walking segment is a few metres, well inside ROUTE_JITTER_M).
+    The anchor stays put until the track is more than ROUTE_JITTER_M away from
+    it for two fixes in a row; the straight-line distance since the anchor then
+    goes to the segment that left the radius and the anchor moves there. The
+    segments in between are moving if that excursion averaged
+    ROUTE_MOVING_SPEED_MPS; slower drift is idle and adds no distance. A gap restarts the anchor after it. Fixes
+    are averaged over ROUTE_SMOOTH_SECONDS first, so at high fix rates single
+    noisy fixes don't leave the radius.
+
+    anchor: (lat, lon, t) of an earlier fix the first excursion starts from.
+    Returns (dist, moving, gap, anchors); anchors holds (lat, lon, t) arrays
+    of the anchor in force after each fix, to carry on to later fixes.
+    """
+    n = len(t)
+    dist = np.zeros(max(n - 1, 0))
+    moving = np.zeros(max(n - 1, 0), dtype=bool)
+    gap = np.diff(t) > settings.ROUTE_GAP_SECONDS  # Phone offline / app killed: neither moving nor idle
+    if n == 0:
+        return dist, moving, gap, (np.zeros(0), np.zeros(0), np.zeros(0))
+
+    radius, min_speed = settings.ROUTE_JITTER_M, settings.ROUTE_MOVING_SPEED_MPS
+    lat, lon = smooth_track(lat, lon, t, gap, settings.ROUTE_SMOOTH_SECONDS)
+    gap_at = np.flatnonzero(gap)
+    a_lat, a_lon, a_t = start = anchor if anchor is not None else (lat[0], lon[0], t[0])
+    moved = np.full(n, -1)  # Index of each fix the anchor moved to
+    if anchor is None:
+        moved[0] = 0
+    i = 0
+    while i < n - 1:
+        # First fix that leaves the radius before the next gap, searched in growing windows
+        g = np.searchsorted(gap_at, i)
+        last = int(gap_at[g]) if g < len(gap_at) else n - 1
+        j, lo, window = None, i + 1, 16
+        while lo < last:
+            hi = min(last + 1, lo + window)
+            end = min(hi + 1, last + 1)
+            far = haversine_m(a_lat, a_lon, lat[lo:end], lon[lo:end]) > radius
+            left = np.flatnonzero(far[:-1] & far[1:])  # Confirmed by the next fix too, not a lone outlier
+            if len(left):
+                j = lo + int(left[0])
+                break
+            lo, window = hi, min(window * 2, 1024)
+
+        if j is None:
+            if last == n - 1:
+                break  # Track ends inside the radius
+            i = moved[last + 1] = last + 1
+            a_lat, a_lon, a_t = lat[i], lon[i], t[i]
+            continue
+
+        d = float(haversine_m(a_lat, a_lon, lat[j], lon[j]))
+        if t[j] > a_t and d / (t[j] - a_t) >= min_speed:
+            moving[i:j] = True
+            dist[j - 1] = d
+        a_lat, a_lon, a_t = lat[j], lon[j], t[j]
+        i = moved[j] = j
+
+    current = np.maximum.accumulate(moved)
+    anchors = tuple(
+        np.where(current < 0, first, values[np.maximum(current, 0)])
+        for values, first in zip((lat, lon, t), start)
+    )
+    return dist, moving, gap, anchors
+
+
+def summarize_points(times: List[datetime], lats: List[float], lons: List[float]) -> dict:
+    n = len(times)
+    summary = {
+        "version": SUMMARY_VERSION,
+        "computed_at": datetime.utcnow().isoformat(),
+        "point_count": n,
+        "distance_m": 0.0,
+        "moving_seconds": 0,
+        "idle_seconds": 0,
+        "gap_seconds": 0,
+        "start": times[0].isoformat() if n else None,
+        "end": times[-1].isoformat() if n else None,
+        "dwells": [],
+        "polyline": [],
+    }
+    if n == 0:
+        return summary
+
+    lat = np.asarray(lats, dtype=np.float64)
+    lon = np.asarray(lons, dtype=np.float64)
+    t = np.asarray(times, dtype="datetime64[us]").astype(np.int64) / 1e6  # Naive local seconds
+
+    if n > 1:
+        dist, moving, gap, _ = classify_movement(lat, lon, t)
+        dt = np.diff(t)
+        idle = ~gap & ~moving
+
+        summary["distance_m"] = round(float(dist.sum()), 1)
+        summary["moving_seconds"] = int(dt[moving].sum())
+        summary["idle_seconds"] = int(dt[idle].sum())
+        summary["gap_seconds"] = int(dt[gap].sum())
+
+    for start, end in find_dwells(lat, lon, t, settings.ROUTE_DWELL_RADIUS_M, settings.ROUTE_DWELL_MIN_SECONDS):
+        summary["dwells"].append({
+            "lat": round(float(lat[start:end + 1].mean()), 6),
+            "lng": round(float(lon[start:end + 1].mean()), 6),
+            "start": times[start].isoformat(),
+            "end": times[end].isoformat(),
+            "duration_seconds": int(t[end] - t[start]),
+        })
+
+    # Simplify; double the tolerance until the polyline fits the point budget
+    x, y = project_m(lat, lon)
+    tolerance = settings.ROUTE_SIMPLIFY_TOLERANCE_M
+    kept = douglas_peucker(x, y, tolerance)
+    while len(kept) > settings.ROUTE_MAX_POINTS:
+        tolerance *= 2
+        kept = douglas_peucker(x, y, tolerance)
+    summary["polyline"] = [[round(float(lat[i]), 6), round(float(lon[i]), 6)] for i in kept]
+    summary["simplify_tolerance_m"] = tolerance
+    return summary
+
+
+def session_points(db: Session, session_id: int):
+    """(times, lats, lons) from raw rows and/or the session's archive"""
+    times, lats, lons, _ = load_session_points(db, session_id)
+    return times, lats, lons
+
+
+def summarize_session(db: Session, session: DepartmentSession) -> dict:
+    """Computes and stores the summary; caller commits"""
+    session.route_summary = summarize_points(*session_points(db, session.id))
+    return session.route_summary
+
+
+def summarize_sessions(session_ids: Iterable[int]):
+    """BackgroundTasks entry point (own DB session; runs after the response is sent)"""
+    # The session's last fixes may still be sitting in the location buffer
+    if settings.LOCATION_BUFFER_ENABLED:
+        location_writer.wait_drained(timeout=settings.LOCATION_FLUSH_INTERVAL_MS / 1000 + 5)
+
+    db = SessionLocal()
+    try:
+        for session in db.query(DepartmentSession).filter(DepartmentSession.id.in_(list(session_ids))).all():
+            try:
+                summarize_session(db, session)
+                db.commit()
+            except Exception:
+                db.rollback()
+                logger.exception("route summary failed for session %s", session.id)
+    finally:
+        db.close()
+
+
+def needs_summary(session: DepartmentSession, refresh: bool = False) -> bool:
+    return refresh or not session.route_summary or session.route_summary.get("version") != SUMMARY_VERSION
@@ -0,0 +1,103 @@
+"""
+Short-lived duplicate-scan suppression for the live door endpoint.
+
+Fingerprint readers often fire the same employee two or three times within a
+second. Each (device_uid, employee_code) keeps the last accepted scan time
+and the few most recent time_iso strings it sent, so repeats inside the
+window, and exact replays of a time_iso, are answered without touching the DB.
+
+Entries live as long as a live scan stays valid (older scans are already
+rejected by parse_scan_time), and the map is LRU-bounded.
+"""
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Optional, Tuple
+
+from app.core.config import settings
+from app.core.scans import LIVE_SCAN_MAX_AGE_SECONDS
+
+RECENT_TIMES_PER_KEY = 8
+
+
+class ScanDedupe:
+    def __init__(self, window_seconds: float, ttl_seconds: float, max_entries: int):
+        self.window_seconds = window_seconds
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        # (device_uid, employee_code) -> [last accepted log_time, recent time_iso deque, touched_at]
+        self._entries: "OrderedDict[Tuple[str, str], list]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Metrics
+        self.checked = 0
+        self.absorbed_window = 0
+        self.absorbed_replay = 0
+        self.evictions = 0
+
+    def claim(self, device_uid: str, employee_code: str, time_iso: str, log_time: datetime) -> Optional[str]:
+        """
+        Returns None (and records the scan) when it should be processed,
+        "REPLAY" for an exact time_iso seen before, or "DUPLICATE_SCAN" for a
+        repeat within the window of the last accepted scan.
+        """
+        key = (device_uid, employee_code)
+        now = time.monotonic()
+        with self._lock:
+            self.checked += 1
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[2] > self.ttl_seconds:
+                entry = None
+
+            if entry is not None:
+                last_time, recent, _ = entry
+                if time_iso in recent:
+                    self.absorbed_replay += 1
+                    return "REPLAY"
+                if abs((log_time - last_time).total_seconds()) < self.window_seconds:
+                    recent.append(time_iso)
+                    self.absorbed_window += 1
+                    return "DUPLICATE_SCAN"
+                if log_time > last_time:
+                    entry[0] = log_time
+                recent.append(time_iso)
+                entry[2] = now
+            else:
+                self._entries[key] = [log_time, deque([time_iso], maxlen=RECENT_TIMES_PER_KEY), now]
+
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            return None
+
+    def forget(self, device_uid: str, employee_code: str):
+        """Drops a key whose claimed scan failed to persist, so the device can retry"""
+        with self._lock:
+            self._entries.pop((device_uid, employee_code), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            absorbed = self.absorbed_window + self.absorbed_replay
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "window_seconds": self.window_seconds,
+                "checked": self.checked,
+                "absorbed_window": self.absorbed_window,
+                "absorbed_replay": self.absorbed_replay,
+                "evictions": self.evictions,
+                "absorbed_ratio": round(absorbed / self.checked, 4) if self.checked else 0.0,
+            }
+
+
+scan_dedupe = ScanDedupe(
+    window_seconds=settings.SCAN_DEDUPE_WINDOW_SECONDS,
+    ttl_seconds=LIVE_SCAN_MAX_AGE_SECONDS,
+    max_entries=settings.SCAN_DEDUPE_MAX_ENTRIES,
+)
@@ -0,0 +1,186 @@
+"""
+Hardware scan rules shared by the live door endpoint, batched offline
+replay, the write-behind writer and the ZKTeco cloud sync.
+"""
+from datetime import datetime
+
+import pytz
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from app.core.device_cache import CachedDevice
+from app.core.attendance_summary import snapshot, record_changes
+from app.db.models import Employee, Attendance, DoorEvent
+
+dhaka_zone = pytz.timezone('Asia/Dhaka')
+SUPPORTED_HARDWARE = ["RASPBERRY_PI", "ESP32", "ZK_CONTROLLER"]
+LIVE_SCAN_MAX_AGE_SECONDS = 300
+
+
+def parse_scan_time(time_iso: str, max_age_seconds: int):
+    """Returns (naive Dhaka time, None) or (None, error message)"""
+    try:
+        log_time = datetime.fromisoformat(time_iso).astimezone(dhaka_zone)
+    except ValueError:
+        return None, "Bad Time Format"
+
+    # Replay Attack Check (future scans only get the 5 min clock-skew tolerance)
+    age = (datetime.now(dhaka_zone) - log_time).total_seconds()
+    if age > max_age_seconds or age < -300:
+        return None, "Invalid Timestamp (Replay Detected)"
+
+    # Strip tzinfo so it compares/saves like the naive values already in the DB
+    return log_time.replace(tzinfo=None), None
+
+
+def resolve_trigger(check_in_time: datetime, check_out_time, log_time: datetime) -> str:
+    """Check-in/out rule for a scan on a day that already has an attendance row"""
+    if log_time > check_in_time:
+        if check_out_time is None or log_time > check_out_time:
+            return "CHECK_OUT"
+        return "DUPLICATE_SCAN"
+    return "IGNORED"
+
+
+def new_hardware_attendance(device: CachedDevice, company_id: int, employee_code: str, log_time: datetime) -> dict:
+    return {
+        "company_id": company_id,
+        "employee_id": employee_code,
+        "timestamp": log_time,
+        "date_only": log_time.date(),
+        "status": "Present",
+        "location": f"{device.location} ({device.device_type})",
+        "source": "HARDWARE",
+        "device_id": device.device_uid,
+        "check_in_time": log_time,
+        "check_out_time": None
+    }
+
+
+def insert_attendance_days(db: Session, rows: list) -> list:
+    """Bulk insert of new day rows; a row created concurrently for the same day wins. Returns the rows inserted."""
+    dialect = db.get_bind().dialect.name
+    if dialect not in ("postgresql", "sqlite"):
+        db.execute(insert(Attendance), rows)
+        return rows
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as upsert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as upsert
+    stmt = upsert(Attendance).on_conflict_do_nothing(
+        index_elements=["company_id", "employee_id", "date_only"]
+    ).returning(Attendance.employee_id, Attendance.date_only)
+    by_key = {(r["employee_id"], r["date_only"]): r for r in rows}
+    return [by_key[(r.employee_id, r.date_only)] for r in db.execute(stmt, rows)]
+
+
+def ingest_scans(db: Session, device: CachedDevice, scans: list, event_type: str = "AUTO_OPEN") -> dict:
+    """
+    Set-based ingestion of (index, employee_code, log_time) scans from one device.
+    Employees and the affected days' Attendance rows are loaded up front, the
+    check-in/check-out rules run in order against that in-memory state, and
+    new Attendance/DoorEvent rows are bulk inserted. A day row another request
+    created in the meantime wins the insert: that day's scans are then re-run
+    against it, so results and door events report what was applied. Caller commits.
+    """
+    results = {}
+    codes = {code for _, code, _ in scans}
+    days = {log_time.date() for _, _, log_time in scans}
+
+    # Query 1: Employees (Scoped to Company)
+    employees = {}
+    if codes:
+        employees = {
+            e.employee_id: e for e in db.query(Employee.id, Employee.employee_id).filter(
+                Employee.employee_id.in_(codes),
+                Employee.company_id == device.company_id,
+                Employee.deleted_at == None
+            )
+        }
+
+    # Query 2: Existing attendance for every (employee, day) in the batch
+    day_state = {}
+    counted_before = {}
+    if employees and days:
+        for att in db.query(Attendance).filter(
+            Attendance.company_id == device.company_id,
+            Attendance.employee_id.in_(employees.keys()),
+            Attendance.date_only.in_(days)
+        ):
+            day_state.setdefault((att.employee_id, att.date_only), att)
+            counted_before[att.id] = snapshot(att)
+
+    new_attendance = {}
+    new_day_scans = {}  # key -> [(index, log_time, door event)] of scans ruled against a new (dict) row
+    door_events = []
+    for i, code, log_time in scans:
+        emp = employees.get(code)
+        if not emp:
+            results[i] = {"index": i, "employee_code": code, "status": "error", "message": "Access Denied"}
+            continue
+
+        key = (code, log_time.date())
+        state = day_state.get(key)
+        trigger_type = "CHECK_IN"
+
+        if state is None:
+            state = new_hardware_attendance(device, device.company_id, code, log_time)
+            new_attendance[key] = state
+            day_state[key] = state
+        elif isinstance(state, dict):
+            trigger_type = resolve_trigger(state["check_in_time"], state["check_out_time"], log_time)
+            if trigger_type == "CHECK_OUT":
+                state["check_out_time"] = log_time
+        else:
+            trigger_type = resolve_trigger(state.check_in_time, state.check_out_time, log_time)
+            if trigger_type == "CHECK_OUT":
+                state.check_out_time = log_time
+
+        event = {
+            "company_id": device.company_id,
+            "employee_id": emp.id,
+            "event_type": event_type,
+            "trigger_reason": trigger_type,
+            "device_id": device.device_uid,
+            "created_at": log_time
+        }
+        door_events.append(event)
+        if isinstance(state, dict):
+            new_day_scans.setdefault(key, []).append((i, log_time, event))
+        results[i] = {"index": i, "employee_code": code, "status": "success", "trigger": trigger_type}
+
+    # Bulk inserts (executemany); updated check-outs flush with the commit
+    inserted = insert_attendance_days(db, list(new_attendance.values())) if new_attendance else []
+    changes = [(None, snapshot(row)) for row in inserted]
+
+    # Days whose row was created concurrently: the batch's scans apply to the winning row instead
+    lost = set(new_attendance) - {(r["employee_id"], r["date_only"]) for r in inserted}
+    if lost:
+        for att in db.query(Attendance).filter(
+            Attendance.company_id == device.company_id,
+            Attendance.employee_id.in_({code for code, _ in lost}),
+            Attendance.date_only.in_({day for _, day in lost})
+        ):
+            key = (att.employee_id, att.date_only)
+            if key not in lost:
+                continue
+            before = snapshot(att)
+            for i, log_time, event in new_day_scans[key]:
+                trigger_type = resolve_trigger(att.check_in_time, att.check_out_time, log_time)
+                if trigger_type == "CHECK_OUT":
+                    att.check_out_time = log_time
+                event["trigger_reason"] = trigger_type
+                results[i]["trigger"] = trigger_type
+            day_state[key] = att
+            changes.append((before, snapshot(att)))
+
+    if door_events:
+        db.execute(insert(DoorEvent), door_events)
+
+    # Daily summary: check-outs applied to existing rows plus the day rows actually inserted
+    for state in day_state.values():
+        if not isinstance(state, dict) and state.id in counted_before:
+            changes.append((counted_before[state.id], snapshot(state)))
+    record_changes(db, changes)
+
+    return results
@@ -0,0 +1,75 @@
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Optional
+
+logger = logging.getLogger("saas_core")
+
+
+class PeriodicTask:
+    """
+    Runs `fn()` every `interval` seconds on a daemon thread.
+    Each worker process runs its own copy, so jobs must be safe to run concurrently
+    (or be enabled on one worker only through their settings flag).
+    """
+
+    def __init__(self, name: str, interval: float, fn: Callable[[], Optional[dict]], run_on_stop: bool = False):
+        self.name = name
+        self.interval = interval
+        self.fn = fn
+        self.run_on_stop = run_on_stop
+        self._stop = threading.Event()
+        self._thread = None
+        self._run_lock = threading.Lock()
+
+        # Metrics
+        self.runs = 0
+        self.failures = 0
+        self.last_run_at = None
+        self.last_duration_ms = 0.0
+        self.last_result = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 30.0):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+        if self.run_on_stop:
+            self.run_once()
+
+    def run_once(self) -> Optional[dict]:
+        """Also used by the manual 'run now' endpoints; never overlaps with itself"""
+        with self._run_lock:
+            started = time.perf_counter()
+            try:
+                self.last_result = self.fn()
+            except Exception:
+                self.failures += 1
+                logger.exception("%s: run failed", self.name)
+                self.last_result = None
+            self.runs += 1
+            self.last_run_at = datetime.utcnow()
+            self.last_duration_ms = (time.perf_counter() - started) * 1000
+            return self.last_result
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self.run_once()
+
+    def stats(self) -> dict:
+        return {
+            "running": bool(self._thread and self._thread.is_alive()),
+            "interval_seconds": self.interval,
+            "runs": self.runs,
+            "failures": self.failures,
+            "last_run_at": self.last_run_at.isoformat() if self.last_run_at else None,
+            "last_duration_ms": round(self.last_duration_ms, 2),
+            "last_result": self.last_result,
+        }
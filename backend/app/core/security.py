@@ -7,6 +7,8 @@ from app.core.config import settings
 # Setup Password Hashing (Bcrypt)
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+STREAM_TICKET_ROLE = "tracking_stream"
+
 def create_access_token(subject: Union[str, Any], role: str, company_id: int = None) -> str:
     """Generates the JWT String"""
     expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -23,6 +25,21 @@ def create_access_token(subject: Union[str, Any], role: str, company_id: int = N
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
+def create_stream_ticket(subject: str, company_id: int, session_exp: int) -> str:
+    """
+    Single-purpose JWT for ?ticket= on the live tracking stream. It only opens
+    the stream (its role is no admin's) and expires quickly, so a copy left in
+    a proxy log is useless; the stream itself ends with the admin's session.
+    """
+    to_encode = {
+        "exp": datetime.utcnow() + timedelta(seconds=settings.TRACKING_STREAM_TICKET_SECONDS),
+        "sub": str(subject),
+        "role": STREAM_TICKET_ROLE,
+        "company_id": company_id,
+        "session_exp": session_exp  # Epoch seconds, copied from the admin JWT's exp
+    }
+    return jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
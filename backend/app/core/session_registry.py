@@ -0,0 +1,154 @@
+"""
+In-memory registry of tracking sessions for the location-update hot path.
+
+`/api/tracking/update` used to join DepartmentSession/Employee/Company on
+every ping just to find the company clock. The registry keeps
+session_id -> SessionEntry (owner, company, tz object, active flag), so a
+ping costs a dict lookup plus the fix insert.
+
+Entries are added by `start_tracking` and marked ended when a session is
+closed there. A miss (restart, another worker started the session, evicted)
+loads the session once from the DB. Entries expire after `ttl_seconds`,
+which bounds staleness when another worker process ended the session or
+changed the company timezone.
+"""
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from datetime import datetime, tzinfo
+from typing import Iterable, Optional
+
+from sqlalchemy.orm import Session
+
+from app.core.company_config import resolve_tz
+from app.core.config import settings
+from app.db.models import Company, DepartmentSession, Employee
+
+
+@dataclass(frozen=True)
+class SessionEntry:
+    session_id: int
+    employee_id: int        # Employee.id (DB key)
+    employee_code: str      # Employee.employee_id (JWT "sub")
+    name: str
+    role: Optional[str]
+    company_id: int
+    tz: tzinfo
+    active: bool
+
+    def owned_by(self, user: dict) -> bool:
+        return self.employee_code == user.get("sub") and self.company_id == user.get("company_id")
+
+    def local_now(self) -> datetime:
+        # Naive company-local time, same as get_local_now()
+        return datetime.now(self.tz).replace(tzinfo=None)
+
+
+class SessionRegistry:
+    def __init__(self, ttl_seconds: int, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.evictions = 0
+
+    # --- Reads ---
+    def get(self, db: Session, session_id: int) -> Optional[SessionEntry]:
+        now = time.monotonic()
+        with self._lock:
+            item = self._entries.get(session_id)
+            if item is not None and item[1] > now:
+                self._entries.move_to_end(session_id)
+                self.hits += 1
+                return item[0]
+            self.misses += 1
+        return self.load(db, session_id)
+
+    def load(self, db: Session, session_id: int) -> Optional[SessionEntry]:
+        row = db.query(
+            DepartmentSession.employee_id, DepartmentSession.company_id, DepartmentSession.active,
+            Employee.employee_id.label("employee_code"), Employee.name, Employee.role, Company.timezone
+        ).join(
+            Employee, Employee.id == DepartmentSession.employee_id
+        ).join(
+            Company, Company.id == DepartmentSession.company_id
+        ).filter(DepartmentSession.id == session_id).first()
+        with self._lock:
+            self.loads += 1
+        if not row:
+            self.invalidate(session_id)
+            return None
+        entry = SessionEntry(
+            session_id=session_id,
+            employee_id=row.employee_id,
+            employee_code=row.employee_code,
+            name=row.name,
+            role=row.role,
+            company_id=row.company_id,
+            tz=resolve_tz(row.timezone),
+            active=bool(row.active),
+        )
+        self.put(entry)
+        return entry
+
+    # --- Writes ---
+    def put(self, entry: SessionEntry):
+        with self._lock:
+            self._entries[entry.session_id] = (entry, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(entry.session_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def end(self, session_ids: Iterable[int]):
+        """Marks sessions ended (kept, so late pings get a clear rejection)"""
+        with self._lock:
+            for session_id in session_ids:
+                item = self._entries.get(session_id)
+                if item is not None:
+                    self._entries[session_id] = (replace(item[0], active=False), item[1])
+
+    def end_employee(self, employee_id: int):
+        with self._lock:
+            for session_id, (entry, expires_at) in self._entries.items():
+                if entry.employee_id == employee_id:
+                    self._entries[session_id] = (replace(entry, active=False), expires_at)
+
+    def invalidate(self, session_id: int):
+        with self._lock:
+            self._entries.pop(session_id, None)
+
+    def invalidate_company(self, company_id: int):
+        """Drops a company's sessions (timezone change, company deleted); next ping reloads"""
+        with self._lock:
+            for session_id in [sid for sid, (entry, _) in self._entries.items() if entry.company_id == company_id]:
+                del self._entries[session_id]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "active": sum(1 for entry, _ in self._entries.values() if entry.active),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "loads": self.loads,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+session_registry = SessionRegistry(
+    ttl_seconds=settings.SESSION_REGISTRY_TTL_SECONDS,
+    max_entries=settings.SESSION_REGISTRY_MAX_ENTRIES,
+)
@@ -0,0 +1,120 @@
+"""
+In-process fan-out of live positions to dashboard streams (SSE).
+
+Location endpoints run in the threadpool and call `tracking_hub.publish()`
+with the position deltas they just accepted. Each subscriber keeps a
+"pending" dict keyed by employee, so a slow browser only ever receives the
+latest fix per employee (older ones are coalesced away), and publishing costs
+O(subscribers) with no DB access. Subscribers are woken on their event loop
+with `loop.call_soon_threadsafe`, at most once per delivered batch. A fix
+older than the last one published for that employee (late offline replay)
+is not pushed.
+"""
+import asyncio
+import threading
+from typing import Dict, List, Set
+
+
+class TrackingSubscriber:
+    def __init__(self, company_id: int, loop: asyncio.AbstractEventLoop, lock: threading.Lock):
+        self.company_id = company_id
+        self.loop = loop
+        self._lock = lock  # The hub's lock (pending/signalled are written by publishers)
+        self.event = asyncio.Event()
+        self.pending: Dict[str, dict] = {}
+        self.signalled = False  # Guarded by the hub lock
+        self.delivered = 0
+        self.coalesced = 0
+
+    async def next_batch(self, timeout: float) -> List[dict]:
+        """Latest position per employee since the last call ([] on timeout)"""
+        try:
+            await asyncio.wait_for(self.event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self.event.clear()
+        with self._lock:
+            batch, self.pending = self.pending, {}
+            self.signalled = False
+        self.delivered += len(batch)
+        return list(batch.values())
+
+
+class TrackingHub:
+    def __init__(self):
+        self._subscribers: Dict[int, Set[TrackingSubscriber]] = {}
+        self._last_seen: Dict[int, Dict[str, str]] = {}  # Only for companies being watched
+        self._lock = threading.Lock()
+
+        # Metrics
+        self.published = 0
+        self.fanned_out = 0
+        self.coalesced = 0
+
+    def subscribe(self, company_id: int) -> TrackingSubscriber:
+        subscriber = TrackingSubscriber(company_id, asyncio.get_running_loop(), self._lock)
+        with self._lock:
+            self._subscribers.setdefault(company_id, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: TrackingSubscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(subscriber.company_id)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[subscriber.company_id]
+                    self._last_seen.pop(subscriber.company_id, None)
+
+    def has_subscribers(self, company_id: int) -> bool:
+        return company_id in self._subscribers
+
+    def publish(self, company_id: int, positions: List[dict]):
+        """positions: live-view dicts ("id" = employee code); safe from any thread"""
+        if not positions or company_id not in self._subscribers:
+            return
+
+        wake = []
+        with self._lock:
+            last_seen = self._last_seen.setdefault(company_id, {})
+            fresh = []
+            for position in positions:
+                # ISO strings in one format sort chronologically
+                if position["last_seen"] >= last_seen.get(position["id"], ""):
+                    last_seen[position["id"]] = position["last_seen"]
+                    fresh.append(position)
+            positions = fresh
+
+            self.published += len(positions)
+            for subscriber in self._subscribers.get(company_id, ()):
+                for position in positions:
+                    if position["id"] in subscriber.pending:
+                        subscriber.coalesced += 1
+                        self.coalesced += 1
+                    subscriber.pending[position["id"]] = position
+                self.fanned_out += len(positions)
+                if positions and not subscriber.signalled:
+                    subscriber.signalled = True
+                    wake.append(subscriber)
+
+        for subscriber in wake:
+            try:
+                subscriber.loop.call_soon_threadsafe(subscriber.event.set)
+            except RuntimeError:
+                pass  # Loop already closed; the stream is going away
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = {cid: len(subs) for cid, subs in self._subscribers.items()}
+            backlog = sum(len(s.pending) for subs in self._subscribers.values() for s in subs)
+        return {
+            "subscribers": sum(counts.values()),
+            "companies": len(counts),
+            "pending_positions": backlog,
+            "published": self.published,
+            "fanned_out": self.fanned_out,
+            "coalesced": self.coalesced,
+        }
+
+
+tracking_hub = TrackingHub()
@@ -0,0 +1,318 @@
+import glob
+import json
+import logging
+import os
+import queue
+import stat
+import threading
+import time
+import uuid
+from typing import Callable, List, Optional
+
+from sqlalchemy.exc import DBAPIError, OperationalError
+
+logger = logging.getLogger("saas_core")
+
+
+def is_transient(exc: Exception) -> bool:
+    """Errors worth retrying indefinitely: the database is unreachable, not rejecting the batch"""
+    return isinstance(exc, OperationalError) or (isinstance(exc, DBAPIError) and exc.connection_invalidated)
+
+
+def _identity(item):
+    return item
+
+
+class WriteBehindQueue:
+    """
+    Bounded in-memory queue drained by a background thread in batches.
+
+    - submit() blocks for at most `put_timeout` seconds when the queue is full and
+      then returns False, so callers can fall back to a synchronous write.
+    - stop() drains and flushes everything still queued (call it on shutdown).
+    - A batch failing with a transient error (see is_transient) is retried with
+      capped exponential backoff for as long as the writer runs (a DB outage
+      never drops items). Meanwhile the queue fills up and submit() starts
+      returning False: that's the backpressure.
+    - Batches still failing at shutdown (after `max_retries` more attempts) are
+      spilled as JSON to `spill_dir`; the next start() of a queue with the
+      same name, in any worker, replays them before taking new items.
+    - Any other error (a bad row, a bug) is not going to clear up: after
+      `max_retries` attempts the batch is dead-lettered to a `.dead` file in
+      `spill_dir` for an operator to inspect, and the writer moves on.
+    - Without a spill_dir, batches that would be spilled are dropped and logged.
+    - `encode` / `decode` map an item to and from JSON-safe primitives for the
+      spill files (identity by default: items are already plain dicts).
+    - spill_dir must be private to the process user: it is created 0700, and a
+      directory or file that isn't owned by that user is never read.
+    - With `linger` > 0 the writer keeps collecting for up to that many seconds
+      after the first item, trading latency for bigger batches.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        flush_fn: Callable[[List], None],
+        max_size: int,
+        batch_size: int,
+        flush_interval: float,
+        put_timeout: float,
+        max_retries: int = 3,
+        linger: float = 0.0,
+        max_backoff: float = 30.0,
+        spill_dir: Optional[str] = None,
+        encode: Callable = _identity,
+        decode: Callable = _identity,
+    ):
+        self.name = name
+        self.flush_fn = flush_fn
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.max_retries = max_retries
+        self.linger = linger
+        self.max_backoff = max_backoff
+        self.spill_dir = spill_dir
+        self.encode = encode
+        self.decode = decode
+        self._queue = queue.Queue(maxsize=max_size)
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._metrics_lock = threading.Lock()  # Producer-side counters, bumped from request threads
+
+        # Metrics
+        self.enqueued = 0
+        self.rejected = 0
+        self.flushed = 0
+        self.dropped = 0
+        self.spilled = 0
+        self.dead_lettered = 0
+        self.replayed = 0
+        self.retries = 0
+        self.failing_since = None  # time.time() of the first failure of the batch being retried
+        self.batches = 0
+        self.last_batch_size = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+
+    # --- Lifecycle ---
+    def start(self):
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name=f"{self.name}-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 30.0):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+        # Anything that raced in after the thread exited
+        self._drain_all()
+
+    def wait_drained(self, timeout: float) -> bool:
+        """Blocks until everything submitted so far is flushed (or spilled / dropped); False on timeout"""
+        target = self.enqueued
+        deadline = time.monotonic() + timeout
+        while self.flushed + self.spilled + self.dead_lettered + self.dropped < target:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    # --- Producer side ---
+    def submit(self, item) -> bool:
+        if not (self._thread and self._thread.is_alive()):
+            self.start()
+        try:
+            self._queue.put(item, timeout=self.put_timeout)
+        except queue.Full:
+            with self._metrics_lock:
+                self.rejected += 1
+            return False
+        with self._metrics_lock:
+            self.enqueued += 1
+        return True
+
+    # --- Consumer side ---
+    def _run(self):
+        self._replay_spilled()
+        while not self._stop.is_set():
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            self._flush(self._take_batch([first], self.linger))
+        self._drain_all()
+
+    def _take_batch(self, batch: List, linger: float = 0.0) -> List:
+        deadline = time.monotonic() + linger
+        while len(batch) < self.batch_size:
+            try:
+                remaining = deadline - time.monotonic()
+                if remaining > 0 and not self._stop.is_set():
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _drain_all(self):
+        while not self._queue.empty():
+            self._flush(self._take_batch([]))
+
+    def _flush(self, batch: List):
+        if not batch:
+            return
+        attempt = attempts_since_stop = 0
+        while True:
+            attempt += 1
+            started = time.perf_counter()
+            try:
+                self.flush_fn(batch)
+                break
+            except Exception as exc:
+                logger.exception("%s: flush of %d items failed (attempt %d)", self.name, len(batch), attempt)
+                self.retries += 1
+                if self.failing_since is None:
+                    self.failing_since = time.time()
+                transient = is_transient(exc)
+
+            if not transient and attempt >= self.max_retries:
+                self.failing_since = None
+                self._spill(batch, dead=True)
+                return
+            if self._stop.is_set():
+                attempts_since_stop += 1
+                if attempts_since_stop >= self.max_retries:
+                    self._spill(batch)
+                    return
+                time.sleep(0.1 * attempts_since_stop)
+            else:
+                # stop() cuts the wait short; the batch then gets its last attempts above
+                self._stop.wait(min(0.1 * 2 ** (attempt - 1), self.max_backoff))
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.failing_since = None
+        self.batches += 1
+        self.flushed += len(batch)
+        self.last_batch_size = len(batch)
+        self.last_flush_ms = elapsed_ms
+        self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+        self._total_flush_ms += elapsed_ms
+
+    # --- Spill files (shutdown during an outage) and dead letters (batches the DB rejects) ---
+    def _private_dir(self) -> bool:
+        """Creates spill_dir 0700; False (with an error logged) if it's anyone else's or group/world accessible"""
+        os.makedirs(self.spill_dir, mode=0o700, exist_ok=True)
+        info = os.lstat(self.spill_dir)
+        if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.geteuid():
+            logger.error("%s: spill dir %s is not a directory owned by this user; not using it", self.name, self.spill_dir)
+            return False
+        if info.st_mode & 0o077:
+            os.chmod(self.spill_dir, 0o700)
+        return True
+
+    def _spill(self, batch: List, dead: bool = False):
+        kind = "dead-lettered" if dead else "spilled"
+        if not self.spill_dir:
+            self.dropped += len(batch)
+            logger.error("%s: dropped %d items after %d attempts (%s)", self.name, len(batch), self.max_retries,
+                         "rejected by the database" if dead else "database unavailable at shutdown")
+            return
+        try:
+            if not self._private_dir():
+                raise PermissionError(self.spill_dir)
+            path = os.path.join(self.spill_dir, f"{self.name}-{os.getpid()}-{uuid.uuid4().hex}.{'dead' if dead else 'spill'}")
+            fd = os.open(path + ".tmp", os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            with os.fdopen(fd, "w") as f:
+                json.dump({"queue": self.name, "items": [self.encode(item) for item in batch]}, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(path + ".tmp", path)  # Replay never sees a half-written file
+        except Exception:
+            self.dropped += len(batch)
+            logger.exception("%s: could not write %d items to %s; dropped", self.name, len(batch), self.spill_dir)
+            return
+        if dead:
+            self.dead_lettered += len(batch)
+            logger.error("%s: database rejected a batch; dead-lettered %d items to %s", self.name, len(batch), path)
+        else:
+            self.spilled += len(batch)
+            logger.error("%s: database unavailable at shutdown; spilled %d items to %s", self.name, len(batch), path)
+
+    def _spill_files(self) -> List[str]:
+        """Spill files to replay: unclaimed ones, and claims left by a worker that died mid-replay"""
+        pattern = os.path.join(self.spill_dir, f"{self.name}-*.spill")
+        files = glob.glob(pattern)
+        for claimed in glob.glob(pattern + ".*.replaying"):
+            try:
+                os.kill(int(claimed.rsplit(".", 2)[-2]), 0)
+            except ProcessLookupError:
+                files.append(claimed)
+            except (ValueError, OSError):
+                pass
+        return sorted(files)
+
+    def _read_spill(self, path: str) -> Optional[List]:
+        """The file's items, or None if it isn't ours to trust (owner, type) or doesn't parse"""
+        try:
+            fd = os.open(path, os.O_RDONLY | os.O_NOFOLLOW)
+            with os.fdopen(fd) as f:
+                info = os.fstat(f.fileno())
+                if not stat.S_ISREG(info.st_mode) or info.st_uid != os.geteuid():
+                    logger.error("%s: %s is not a file owned by this user; not replaying it", self.name, path)
+                    return None
+                data = json.load(f)
+            return [self.decode(item) for item in data["items"]]
+        except Exception:
+            logger.exception("%s: unreadable spill file %s; not replaying it", self.name, path)
+            return None
+
+    def _replay_spilled(self):
+        if not self.spill_dir or not os.path.isdir(self.spill_dir) or not self._private_dir():
+            return
+        for path in self._spill_files():
+            claimed = f"{path.split('.spill')[0]}.spill.{os.getpid()}.replaying"
+            try:
+                os.rename(path, claimed)  # Atomic: one worker replays each file
+            except OSError:
+                continue
+            batch = self._read_spill(claimed)
+            if batch is None:
+                os.rename(claimed, f"{path.split('.spill')[0]}.rejected")  # Kept for inspection, never retried
+                continue
+            logger.warning("%s: replaying %d spilled items from %s", self.name, len(batch), path)
+            with self._metrics_lock:
+                self.enqueued += len(batch)
+            self.replayed += len(batch)
+            for start in range(0, len(batch), self.batch_size):
+                self._flush(batch[start:start + self.batch_size])
+            os.remove(claimed)
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self._queue.qsize(),
+            # Queued + batch being collected/written
+            "pending": self.enqueued - self.flushed - self.spilled - self.dead_lettered - self.dropped,
+            "max_size": self._queue.maxsize,
+            "enqueued": self.enqueued,
+            "rejected": self.rejected,
+            "flushed": self.flushed,
+            "retries": self.retries,
+            "failing_for_seconds": round(time.time() - self.failing_since, 1) if self.failing_since else 0.0,
+            "spilled": self.spilled,
+            "dead_lettered": self.dead_lettered,
+            "replayed": self.replayed,
+            "dropped": self.dropped,
+            "batches": self.batches,
+            "last_batch_size": self.last_batch_size,
+            "avg_batch_size": round(self.flushed / self.batches, 2) if self.batches else 0.0,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+            "avg_flush_ms": round(self._total_flush_ms / self.batches, 2) if self.batches else 0.0,
+            "max_flush_ms": round(self.max_flush_ms, 2),
+        }
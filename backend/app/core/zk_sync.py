@@ -0,0 +1,241 @@
+"""
+Incremental ZKTeco cloud (BioTime-style) punch sync.
+
+For every active ZK_CONTROLLER device the engine pages through
+GET {ZK_API_URL}/iclock/api/transactions/?terminal_sn=<device_uid>&start_time=...
+(response: {"count", "next", "data": [{"id", "emp_code", "punch_time", "terminal_sn"}]})
+and ingests only punches newer than the device's ZkSyncCursor.
+
+HTTP fetches run concurrently on a bounded pool; DB writes happen on the
+calling thread, one transaction per device (punches + cursor together).
+
+Overlapping runs (a double-clicked /sync, two workers) must not ingest the
+same punches twice: a device already syncing in this worker is skipped,
+and the write transaction takes a per-device advisory lock (PostgreSQL),
+skipping the device if another worker holds it. It then re-reads the
+cursor and drops punches a run that committed meanwhile already stored.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, asdict
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from urllib3.util.retry import Retry
+
+from app.core.config import settings
+from app.core.device_cache import CachedDevice
+from app.core.scans import dhaka_zone, ingest_scans
+from app.db.models import Company, HardwareDevice, ZkSyncCursor
+
+logger = logging.getLogger("saas_core")
+
+INGEST_CHUNK = 1000
+ADVISORY_LOCK_KEY = 7_290_003  # (key, device id) pairs; retention uses 7_290_002
+
+_syncing = set()  # device_uids with a run in progress in this worker
+_syncing_lock = threading.Lock()
+
+
+@dataclass
+class Punch:
+    id: int
+    employee_code: str
+    punch_time: datetime  # Naive Dhaka time, like every other scan
+
+
+@dataclass
+class DeviceSyncReport:
+    device_uid: str
+    company_id: int
+    rows: int = 0
+    pages: int = 0
+    seconds: float = 0.0
+    rows_per_second: float = 0.0
+    lag_seconds: Optional[float] = None
+    skipped: bool = False  # Another run is syncing the device
+    error: Optional[str] = None
+
+
+class ZkCloudClient:
+    def __init__(self, base_url: str, api_key: str, pool_size: int, timeout: int, page_size: int):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.page_size = page_size
+
+        # Bounded connection pool shared by every fetch thread
+        self.http = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+            pool_block=True,
+            max_retries=Retry(total=2, backoff_factor=0.5, status_forcelist=[502, 503, 504])
+        )
+        self.http.mount("http://", adapter)
+        self.http.mount("https://", adapter)
+        self.http.headers["Authorization"] = f"Token {api_key}"
+
+    def iter_pages(self, terminal_sn: str, start_time: Optional[datetime], max_pages: int):
+        url = f"{self.base_url}/iclock/api/transactions/"
+        params = {"terminal_sn": terminal_sn, "page_size": self.page_size, "page": 1}
+        if start_time:
+            params["start_time"] = start_time.strftime("%Y-%m-%d %H:%M:%S")
+
+        for _ in range(max_pages):
+            resp = self.http.get(url, params=params, timeout=self.timeout)
+            resp.raise_for_status()
+            body = resp.json()
+            yield body.get("data") or []
+
+            if not body.get("next"):
+                break
+            url, params = body["next"], None  # `next` already carries the query string
+
+    def close(self):
+        self.http.close()
+
+
+def parse_punch_time(value: str) -> datetime:
+    punch_time = datetime.fromisoformat(value)
+    if punch_time.tzinfo:
+        punch_time = punch_time.astimezone(dhaka_zone).replace(tzinfo=None)
+    return punch_time
+
+
+def fetch_new_punches(client: ZkCloudClient, device: CachedDevice, cursor: Optional[ZkSyncCursor], max_pages: int):
+    """Runs on a pool thread: returns (punches newer than the cursor, pages fetched)"""
+    last_id = cursor.last_punch_id if cursor else 0
+    start_time = cursor.last_punch_time if cursor else None
+
+    punches, pages = [], 0
+    for rows in client.iter_pages(device.device_uid, start_time, max_pages):
+        pages += 1
+        for row in rows:
+            if int(row["id"]) <= last_id:
+                continue  # start_time is inclusive, so the previous page tail comes back
+            punches.append(Punch(int(row["id"]), str(row["emp_code"]), parse_punch_time(row["punch_time"])))
+
+    punches.sort(key=lambda p: (p.punch_time, p.id))
+    return punches, pages
+
+
+def try_lock_device(db: Session, device: CachedDevice) -> bool:
+    """Advisory lock held until the transaction ends (PostgreSQL); other dialects run one worker"""
+    if db.get_bind().dialect.name != "postgresql":
+        return True
+    return bool(db.execute(
+        text("SELECT pg_try_advisory_xact_lock(:key, :device_id)"),
+        {"key": ADVISORY_LOCK_KEY, "device_id": device.id}
+    ).scalar())
+
+
+def store_punches(db: Session, device: CachedDevice, punches: List[Punch]) -> Tuple[Optional[ZkSyncCursor], int]:
+    """
+    Bulk ingests punches and advances the cursor in the caller's transaction.
+    Returns (cursor, punches stored), or (None, 0) having written nothing if
+    another worker holds the device.
+    """
+    if not try_lock_device(db, device):
+        return None, 0
+    # Re-read under the lock: a run that committed since the fetch may have stored some of these
+    cursor = db.query(ZkSyncCursor).filter(ZkSyncCursor.device_uid == device.device_uid).populate_existing().first()
+    if cursor is not None:
+        punches = [p for p in punches if p.id > (cursor.last_punch_id or 0)]
+
+    for start in range(0, len(punches), INGEST_CHUNK):
+        chunk = punches[start:start + INGEST_CHUNK]
+        ingest_scans(db, device, [(i, p.employee_code, p.punch_time) for i, p in enumerate(chunk)], event_type="ZK_CLOUD_SYNC")
+
+    if cursor is None:
+        cursor = ZkSyncCursor(company_id=device.company_id, device_uid=device.device_uid, last_punch_id=0, rows_synced=0)
+        db.add(cursor)
+
+    if punches:
+        cursor.last_punch_id = max(cursor.last_punch_id or 0, max(p.id for p in punches))
+        cursor.last_punch_time = max(p.punch_time for p in punches)
+        cursor.rows_synced = (cursor.rows_synced or 0) + len(punches)
+    cursor.last_synced_at = datetime.utcnow()
+    return cursor, len(punches)
+
+
+def run_sync(db: Session, company_id: Optional[int] = None) -> dict:
+    query = db.query(HardwareDevice).join(Company, Company.id == HardwareDevice.company_id).filter(
+        HardwareDevice.active == True,
+        HardwareDevice.device_type == "ZK_CONTROLLER",
+        Company.status == "active"
+    )
+    if company_id:
+        query = query.filter(HardwareDevice.company_id == company_id)
+    with _syncing_lock:
+        devices, busy = [], []
+        for device in (CachedDevice.from_model(d) for d in query.all()):
+            (busy if device.device_uid in _syncing else devices).append(device)
+        _syncing.update(d.device_uid for d in devices)
+
+    cursors = {
+        c.device_uid: c for c in db.query(ZkSyncCursor).filter(
+            ZkSyncCursor.device_uid.in_([d.device_uid for d in devices])
+        )
+    } if devices else {}
+
+    client = ZkCloudClient(
+        settings.ZK_API_URL, settings.ZK_API_KEY,
+        pool_size=settings.ZK_SYNC_CONCURRENCY,
+        timeout=settings.ZK_SYNC_TIMEOUT_SECONDS,
+        page_size=settings.ZK_SYNC_PAGE_SIZE
+    )
+    reports = [DeviceSyncReport(device_uid=d.device_uid, company_id=d.company_id, skipped=True) for d in busy]
+    started = time.perf_counter()
+
+    try:
+        with ThreadPoolExecutor(max_workers=settings.ZK_SYNC_CONCURRENCY) as pool:
+            futures = {}
+            for device in devices:
+                fut = pool.submit(fetch_new_punches, client, device, cursors.get(device.device_uid), settings.ZK_SYNC_MAX_PAGES)
+                futures[fut] = (device, time.perf_counter())
+
+            for fut in as_completed(futures):
+                device, device_started = futures[fut]
+                report = DeviceSyncReport(device_uid=device.device_uid, company_id=device.company_id)
+                try:
+                    punches, report.pages = fut.result()
+                    cursor, report.rows = store_punches(db, device, punches)
+                    if cursor is None:
+                        db.rollback()
+                        report.skipped = True
+                        logger.info("ZK sync of %s skipped: another worker is syncing it", device.device_uid)
+                    else:
+                        db.commit()
+                    if cursor is not None and cursor.last_punch_time:
+                        now = datetime.now(dhaka_zone).replace(tzinfo=None)
+                        report.lag_seconds = round((now - cursor.last_punch_time).total_seconds(), 1)
+                except Exception as e:
+                    db.rollback()
+                    logger.exception("ZK sync failed for %s", device.device_uid)
+                    report.error = str(e)
+
+                report.seconds = round(time.perf_counter() - device_started, 3)
+                report.rows_per_second = round(report.rows / report.seconds, 1) if report.seconds else 0.0
+                reports.append(report)
+    finally:
+        client.close()
+        with _syncing_lock:
+            _syncing.difference_update(d.device_uid for d in devices)
+
+    elapsed = time.perf_counter() - started
+    total_rows = sum(r.rows for r in reports)
+    return {
+        "devices": len(reports),
+        "rows": total_rows,
+        "seconds": round(elapsed, 3),
+        "rows_per_second": round(total_rows / elapsed, 1) if elapsed else 0.0,
+        "failed_devices": sum(1 for r in reports if r.error),
+        "skipped_devices": sum(1 for r in reports if r.skipped),
+        "per_device": [asdict(r) for r in reports]
+    }
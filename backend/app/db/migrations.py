@@ -0,0 +1,290 @@
+"""
+Versioned schema migrations (schema_migrations table).
+
+`migrate(engine)` runs at startup in place of the bare create_all:
+1. `create_all` creates tables that don't exist yet (new models need no
+   migration; a fresh database gets every current index and constraint).
+2. Each pending entry of MIGRATIONS runs in its own transaction and is
+   recorded with its version.
+On PostgreSQL every step holds an advisory lock for its transaction, so
+workers starting together take turns: the loser finds the tables created
+and the version applied.
+
+Migrations bring *existing* tables up to date, so they must be idempotent
+against a database that create_all already built from the current models
+(create indexes with checkfirst, DROP ... IF EXISTS, add_columns).
+"""
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, List
+
+from sqlalchemy import and_, bindparam, delete, func, insert, inspect, select, text, update
+from sqlalchemy.engine import Connection, Engine
+
+from app.db.database import Base
+from app.db import models
+from app.db.models import Attendance, SchemaMigration
+
+logger = logging.getLogger("saas_core")
+
+ADVISORY_LOCK_KEY = 7_290_001
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    upgrade: Callable[[Connection], None]
+
+
+def create_indexes(conn: Connection, *tables):
+    for table in tables:
+        for index in table.indexes:
+            index.create(bind=conn, checkfirst=True)
+
+
+def drop_indexes(conn: Connection, *names: str):
+    for name in names:
+        conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+
+
+def add_columns(conn: Connection, table, *names: str):
+    """ALTER TABLE ... ADD COLUMN for model columns the existing table doesn't have yet"""
+    existing = {column["name"] for column in inspect(conn).get_columns(table.name)}
+    for name in names:
+        if name not in existing:
+            column_type = table.c[name].type.compile(dialect=conn.dialect)
+            conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {name} {column_type}"))
+
+
+# --- 0001 ---
+def _door_and_location_indexes(conn: Connection):
+    """Indexes added to door_events / employee_location_logs before migrations existed"""
+    create_indexes(conn, models.DoorEvent.__table__, models.LocationLog.__table__)
+
+
+# --- 0002 ---
+MERGE_EARLIEST = ("check_in_time", "door_unlock_time", "check_out_enabled_time")
+MERGE_FIRST_SET = ("emergency_checkout_reason", "device_id", "location", "method", "image_url")
+
+
+def dedupe_attendance(conn: Connection) -> int:
+    """Folds same-day duplicates into the oldest row so the unique index can be built"""
+    t = Attendance.__table__
+    groups = conn.execute(
+        select(t.c.company_id, t.c.employee_id, t.c.date_only).where(
+            t.c.employee_id.isnot(None), t.c.date_only.isnot(None)
+        ).group_by(t.c.company_id, t.c.employee_id, t.c.date_only).having(func.count() > 1)
+    ).all()
+
+    removed = 0
+    for company_id, employee_id, date_only in groups:
+        rows = conn.execute(select(t).where(and_(
+            t.c.company_id == company_id, t.c.employee_id == employee_id, t.c.date_only == date_only
+        )).order_by(t.c.id)).mappings().all()
+        keep, extra = rows[0], rows[1:]
+
+        values = {}
+        for column in MERGE_EARLIEST:
+            stamps = [r[column] for r in rows if r[column] is not None]
+            if stamps:
+                values[column] = min(stamps)
+        check_outs = [r["check_out_time"] for r in rows if r["check_out_time"] is not None]
+        if check_outs:
+            values["check_out_time"] = max(check_outs)
+        for column in MERGE_FIRST_SET:
+            if keep[column] is None:
+                values[column] = next((r[column] for r in extra if r[column] is not None), None)
+        values["is_emergency_checkout"] = any(r["is_emergency_checkout"] for r in rows)
+
+        conn.execute(update(t).where(t.c.id == keep["id"]).values(**values))
+        conn.execute(delete(t).where(t.c.id.in_([r["id"] for r in extra])))
+        removed += len(extra)
+    return removed
+
+
+def _attendance_index_pack(conn: Connection):
+    removed = dedupe_attendance(conn)
+    if removed:
+        logger.warning("migration 0002: merged %s duplicate same-day attendance rows", removed)
+
+    # Single-column indexes superseded by the composites (and a duplicate of the PK)
+    drop_indexes(
+        conn,
+        "ix_attendance_employee_id", "ix_attendance_date_only",
+        "ix_short_leaves_employee_id", "ix_short_leaves_date_only", "ix_short_leaves_id",
+        "ix_employee_location_logs_id",
+    )
+    create_indexes(
+        conn,
+        Attendance.__table__, models.ShortLeave.__table__,
+        models.DepartmentSession.__table__, models.DoorEventHourly.__table__,
+    )
+
+
+# --- 0003 ---
+# Plain SQL on purpose: what a migration writes must not change when the live
+# summary code (app.core.attendance_summary) does.
+SUMMARY_DAYS_SQL = """
+    INSERT INTO daily_attendance_summary (
+        company_id, date_only, present, late, super_late, checked_out,
+        emergency_checkouts, short_leaves, on_short_leave, updated_at
+    )
+    SELECT company_id, date_only, SUM(present), SUM(late), SUM(super_late), SUM(checked_out),
+           SUM(emergency_checkouts), SUM(short_leaves), SUM(on_short_leave), :now
+    FROM (
+        SELECT company_id, date_only,
+               CASE WHEN status = 'Present' THEN 1 ELSE 0 END AS present,
+               CASE WHEN status = 'Late' THEN 1 ELSE 0 END AS late,
+               CASE WHEN status = 'Super Late' THEN 1 ELSE 0 END AS super_late,
+               CASE WHEN check_out_time IS NOT NULL THEN 1 ELSE 0 END AS checked_out,
+               CASE WHEN is_emergency_checkout THEN 1 ELSE 0 END AS emergency_checkouts,
+               0 AS short_leaves, 0 AS on_short_leave
+        FROM attendance WHERE date_only IS NOT NULL {scope}
+        UNION ALL
+        SELECT company_id, date_only, 0, 0, 0, 0, 0, 1,
+               CASE WHEN return_time IS NULL THEN 1 ELSE 0 END
+        FROM short_leaves WHERE date_only IS NOT NULL {scope}
+    ) AS day_rows
+    GROUP BY company_id, date_only
+"""
+SUMMARY_SCOPE_SQL = "AND company_id = :company_id AND date_only BETWEEN :start AND :end"
+
+
+def summarise_days(conn: Connection, company_id: int = None, start=None, end=None) -> int:
+    """Recomputes daily_attendance_summary, for one company's days or everything; returns days written"""
+    params = {"now": datetime.utcnow()}
+    scope = ""
+    if company_id is not None:
+        scope = SUMMARY_SCOPE_SQL
+        params.update(company_id=company_id, start=start, end=end)
+    conn.execute(text(f"DELETE FROM daily_attendance_summary WHERE 1 = 1 {scope}"), params)
+    return conn.execute(text(SUMMARY_DAYS_SQL.format(scope=scope)), params).rowcount
+
+
+def _daily_attendance_summary(conn: Connection):
+    """Backfills daily_attendance_summary (create_all made the table) from existing rows"""
+    written = summarise_days(conn)
+    logger.info("migration 0003: summarised %s company-days", written)
+
+
+# --- 0004 ---
+def _keyset_indexes(conn: Connection):
+    """Audit-list indexes end in id, so (..., id) < cursor seeks are index-only on PostgreSQL too"""
+    drop_indexes(
+        conn,
+        "ix_attendance_company_day_ts", "ix_short_leaves_company_exit", "ix_door_events_company_created",
+    )
+    create_indexes(conn, Attendance.__table__, models.ShortLeave.__table__, models.DoorEvent.__table__)
+
+
+# --- 0005 ---
+def _location_rollup_anchor(conn: Connection):
+    """Rows rolled up before this keep their distance; the next fold starts its anchor at their last fix"""
+    add_columns(conn, models.LocationHourly.__table__, "anchor_lat", "anchor_lng", "anchor_at")
+
+
+# --- 0006 ---
+def _attendance_keys_not_null(conn: Connection):
+    """
+    Keyset pages seek on (date_only, timestamp, id) and never match a NULL
+    key, so legacy rows get both: timestamp from check-in / check-out / the
+    day, date_only from the timestamp. Rows with neither a day nor any time
+    can't be placed in any day-based report and are deleted. A backfilled day
+    can collide with the employee's existing row for it, so the unique index
+    is rebuilt around a dedupe pass.
+    """
+    t = Attendance.__table__
+    rows = conn.execute(select(
+        t.c.id, t.c.company_id, t.c.timestamp, t.c.date_only, t.c.check_in_time, t.c.check_out_time
+    ).where((t.c.timestamp == None) | (t.c.date_only == None))).all()
+
+    updates, orphans, days = [], [], set()
+    for r in rows:
+        stamp = r.timestamp or r.check_in_time or r.check_out_time
+        if stamp is None and r.date_only is not None:
+            stamp = datetime.combine(r.date_only, datetime.min.time())
+        if stamp is None:
+            orphans.append(r.id)
+            continue
+        day = r.date_only or stamp.date()
+        updates.append({"b_id": r.id, "b_timestamp": stamp, "b_date_only": day})
+        if r.date_only is None:
+            days.add((r.company_id, day))
+
+    if orphans:
+        conn.execute(delete(t).where(t.c.id.in_(orphans)))
+        logger.warning("migration 0006: deleted %s attendance rows with no day and no time", len(orphans))
+    if updates:
+        drop_indexes(conn, "uq_attendance_company_employee_day")
+        conn.execute(update(t).where(t.c.id == bindparam("b_id")).values(
+            timestamp=bindparam("b_timestamp"), date_only=bindparam("b_date_only")
+        ), updates)
+        removed = dedupe_attendance(conn)
+        if removed:
+            logger.warning("migration 0006: merged %s attendance rows into existing days", removed)
+        create_indexes(conn, t)
+        logger.info("migration 0006: backfilled keys of %s attendance rows", len(updates))
+
+    if days:
+        # Rows without a day were never counted in daily_attendance_summary
+        for company_id in {company_id for company_id, _ in days}:
+            company_days = [day for cid, day in days if cid == company_id]
+            summarise_days(conn, company_id, min(company_days), max(company_days))
+
+    # SQLite can't add NOT NULL to an existing column; the model has it for new databases
+    if conn.dialect.name == "postgresql":
+        conn.execute(text(
+            'ALTER TABLE attendance ALTER COLUMN "timestamp" SET NOT NULL, ALTER COLUMN date_only SET NOT NULL'
+        ))
+
+
+# --- 0007 ---
+def _device_command_leases(conn: Connection):
+    """Lease-and-ack delivery: a command stays queued (claimed_at set) until the device acks it"""
+    t = models.QueuedDeviceCommand.__table__
+    add_columns(conn, t, "claimed_at", "deliveries")
+    conn.execute(update(t).where(t.c.deliveries == None).values(deliveries=0))
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "door_and_location_indexes", _door_and_location_indexes),
+    Migration(2, "attendance_index_pack", _attendance_index_pack),
+    Migration(3, "daily_attendance_summary", _daily_attendance_summary),
+    Migration(4, "keyset_indexes", _keyset_indexes),
+    Migration(5, "location_rollup_anchor", _location_rollup_anchor),
+    Migration(6, "attendance_keys_not_null", _attendance_keys_not_null),
+    Migration(7, "device_command_leases", _device_command_leases),
+]
+
+
+def applied_versions(conn: Connection) -> set:
+    return set(conn.execute(select(SchemaMigration.version)).scalars())
+
+
+def lock(conn: Connection):
+    """Serialises migrating workers until the transaction ends (PostgreSQL only)"""
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": ADVISORY_LOCK_KEY})
+
+
+def migrate(engine: Engine) -> List[int]:
+    """Creates missing tables, then applies pending migrations; returns the versions applied"""
+    with engine.begin() as conn:
+        lock(conn)
+        Base.metadata.create_all(bind=conn)
+
+    applied = []
+    for migration in sorted(MIGRATIONS, key=lambda m: m.version):
+        with engine.begin() as conn:
+            lock(conn)
+            if migration.version in applied_versions(conn):
+                continue
+            logger.info("applying migration %04d_%s", migration.version, migration.name)
+            migration.upgrade(conn)
+            conn.execute(insert(SchemaMigration).values(
+                version=migration.version, name=migration.name, applied_at=datetime.utcnow()
+            ))
+        applied.append(migration.version)
+    return applied
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Date, ForeignKey, Boolean, Float
+from sqlalchemy import Column, Integer, String, DateTime, Date, ForeignKey, Boolean, Float, Index, UniqueConstraint, LargeBinary
 from sqlalchemy.types import JSON
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -73,6 +73,7 @@ class Employee(Base):
 
 class DepartmentSession(Base):
     __tablename__ = "department_mode_sessions"
+    __table_args__ = (Index("ix_sessions_employee_active", "employee_id", "active"),)
     id = Column(Integer, primary_key=True, index=True)
     employee_id = Column(Integer, ForeignKey("employees.id"))
     company_id = Column(Integer, ForeignKey("companies.id"))
@@ -89,7 +90,8 @@ class DepartmentSession(Base):
 
 class LocationLog(Base):
     __tablename__ = "employee_location_logs"
-    id = Column(Integer, primary_key=True, index=True)
+    __table_args__ = (Index("ix_location_logs_session_recorded", "session_id", "recorded_at"),)
+    id = Column(Integer, primary_key=True)
     session_id = Column(Integer, ForeignKey("department_mode_sessions.id"))
     latitude = Column(Float)
     longitude = Column(Float)
@@ -97,17 +99,98 @@ class LocationLog(Base):
     recorded_at = Column(DateTime, default=datetime.utcnow)
     session = relationship("DepartmentSession", back_populates="logs")
 
+# LOCATION ARCHIVE (Closed sessions packed into one compressed columnar blob)
+class LocationArchive(Base):
+    __tablename__ = "location_archives"
+    session_id = Column(Integer, ForeignKey("department_mode_sessions.id"), primary_key=True)
+    company_id = Column(Integer, ForeignKey("companies.id"), nullable=False, index=True)
+    point_count = Column(Integer, nullable=False)
+    start_at = Column(DateTime)
+    end_at = Column(DateTime)
+    last_log_id = Column(Integer, nullable=False)  # Raw rows above this id arrived after compaction
+    statuses = Column(JSON, default=[])
+    data = Column(LargeBinary, nullable=False)
+    raw_purged = Column(Boolean, default=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+# GEOFENCES (Multiple sites per company; circle or polygon)
+class GeofenceSite(Base):
+    __tablename__ = "geofence_sites"
+    id = Column(Integer, primary_key=True)
+    company_id = Column(Integer, ForeignKey("companies.id"), nullable=False, index=True)
+    name = Column(String, nullable=False)
+    kind = Column(String, default="circle")  # circle | polygon
+    center_lat = Column(Float)
+    center_lng = Column(Float)
+    radius_m = Column(Float)
+    polygon = Column(JSON)  # [[lat, lng], ...] for kind=polygon
+    active = Column(Boolean, default=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+# LIVE TRACKING (Latest fix per employee, upserted with every location write)
+class EmployeePosition(Base):
+    __tablename__ = "employee_current_positions"
+    employee_id = Column(Integer, ForeignKey("employees.id"), primary_key=True)
+    company_id = Column(Integer, ForeignKey("companies.id"), nullable=False, index=True)
+    session_id = Column(Integer, ForeignKey("department_mode_sessions.id"))
+    latitude = Column(Float)
+    longitude = Column(Float)
+    status = Column(String)
+    recorded_at = Column(DateTime, nullable=False)
+
+# TRACKING ROLLUPS (Hourly aggregates per session, built incrementally from LocationLog)
+class LocationHourly(Base):
+    __tablename__ = "location_hourly_rollups"
+    __table_args__ = (
+        UniqueConstraint("session_id", "hour_start", name="uq_location_hourly"),
+        Index("ix_location_hourly_company_hour", "company_id", "hour_start"),
+    )
+    id = Column(Integer, primary_key=True)
+
+    company_id = Column(Integer, ForeignKey("companies.id"), nullable=False)
+    employee_id = Column(Integer, ForeignKey("employees.id"), nullable=False)
+    session_id = Column(Integer, ForeignKey("department_mode_sessions.id"), nullable=False)
+    hour_start = Column(DateTime, nullable=False)  # Company-local, like recorded_at
+
+    point_count = Column(Integer, default=0)
+    distance_m = Column(Float, default=0.0)
+    inside_seconds = Column(Integer, default=0)
+    outside_seconds = Column(Integer, default=0)
+    min_lat = Column(Float)
+    min_lng = Column(Float)
+    max_lat = Column(Float)
+    max_lng = Column(Float)
+    first_at = Column(DateTime)
+    last_at = Column(DateTime)
+    last_lat = Column(Float)  # Newest fix, so the next run can join its segments on
+    last_lng = Column(Float)
+    anchor_lat = Column(Float)  # Movement anchor as of last_at (route_summary.classify_movement)
+    anchor_lng = Column(Float)
+    anchor_at = Column(DateTime)
+
+class RollupWatermark(Base):
+    __tablename__ = "rollup_watermarks"
+    name = Column(String, primary_key=True)
+    last_id = Column(Integer, default=0)      # Source rows up to here are folded in
+    horizon_id = Column(Integer, default=0)   # Max source id seen by the previous run
+    updated_at = Column(DateTime, nullable=True)
+
 # --- 3. ATTENDANCE & IOT MODELS ---
 
 class Attendance(Base):
     __tablename__ = "attendance"
+    __table_args__ = (
+        # One row per employee per day (also the index for every (employee, day) lookup)
+        Index("uq_attendance_company_employee_day", "company_id", "employee_id", "date_only", unique=True),
+        Index("ix_attendance_company_day_ts_id", "company_id", "date_only", "timestamp", "id"),
+    )
     id = Column(Integer, primary_key=True)
     
     company_id = Column(Integer, ForeignKey("companies.id"), nullable=False) 
-    employee_id = Column(String, index=True)
+    employee_id = Column(String)
     
-    timestamp = Column(DateTime, default=datetime.utcnow)
-    date_only = Column(Date, index=True)
+    timestamp = Column(DateTime, nullable=False, default=datetime.utcnow)  # Keyset page key, with date_only
+    date_only = Column(Date, nullable=False)
     status = Column(String)
     location = Column(String)
     
@@ -132,16 +215,38 @@ class Attendance(Base):
 # SHORT LEAVE MODEL (STEP 3)
 class ShortLeave(Base):
     __tablename__ = "short_leaves"
-    id = Column(Integer, primary_key=True, index=True)
+    __table_args__ = (
+        Index("ix_short_leaves_company_employee_day", "company_id", "employee_id", "date_only"),
+        Index("ix_short_leaves_company_exit_id", "company_id", "exit_time", "id"),
+    )
+    id = Column(Integer, primary_key=True)
     
     company_id = Column(Integer, ForeignKey("companies.id"), nullable=False)
-    employee_id = Column(String, index=True)
-    date_only = Column(Date, index=True)
+    employee_id = Column(String)
+    date_only = Column(Date)
     
     reason = Column(String, nullable=False)
     exit_time = Column(DateTime, nullable=False)
     return_time = Column(DateTime, nullable=True)
 
+# DAILY ATTENDANCE SUMMARY (Counters per company per local day, updated with each attendance write)
+class DailyAttendanceSummary(Base):
+    __tablename__ = "daily_attendance_summary"
+    __table_args__ = (UniqueConstraint("company_id", "date_only", name="uq_daily_attendance_summary"),)
+    id = Column(Integer, primary_key=True)
+
+    company_id = Column(Integer, ForeignKey("companies.id"), nullable=False)
+    date_only = Column(Date, nullable=False)
+
+    present = Column(Integer, default=0)       # Check-in status counts
+    late = Column(Integer, default=0)
+    super_late = Column(Integer, default=0)
+    checked_out = Column(Integer, default=0)
+    emergency_checkouts = Column(Integer, default=0)
+    short_leaves = Column(Integer, default=0)  # Leaves started that day
+    on_short_leave = Column(Integer, default=0)  # Still out (not returned)
+    updated_at = Column(DateTime, nullable=True)
+
 class HardwareDevice(Base):
     __tablename__ = "hardware_devices"
     id = Column(Integer, primary_key=True)
@@ -158,6 +263,9 @@ class HardwareDevice(Base):
 
 class DoorEvent(Base):
     __tablename__ = "door_events"
+    __table_args__ = (
+        Index("ix_door_events_company_created_id", "company_id", "created_at", "id"),
+    )
     id = Column(Integer, primary_key=True)
     
     company_id = Column(Integer, ForeignKey("companies.id"), nullable=False)
@@ -166,4 +274,67 @@ class DoorEvent(Base):
     event_type = Column(String)
     trigger_reason = Column(String)
     device_id = Column(String)
-    created_at = Column(DateTime, default=datetime.utcnow)
\ No newline at end of file
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+# DOOR EVENT RETENTION (Raw rows purged, hourly counts kept)
+class DoorEventRetention(Base):
+    __tablename__ = "door_event_retention_policies"
+    company_id = Column(Integer, ForeignKey("companies.id"), primary_key=True)
+    retention_days = Column(Integer, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class DoorEventHourly(Base):
+    __tablename__ = "door_event_hourly_rollups"
+    __table_args__ = (
+        UniqueConstraint("company_id", "device_id", "hour_start", "event_type", name="uq_door_event_hourly"),
+        Index("ix_door_event_hourly_company_hour", "company_id", "hour_start"),
+    )
+    id = Column(Integer, primary_key=True)
+
+    company_id = Column(Integer, ForeignKey("companies.id"), nullable=False)
+    device_id = Column(String)
+    hour_start = Column(DateTime, nullable=False)
+    event_type = Column(String)
+    event_count = Column(Integer, default=0)
+
+# DEVICE LIVENESS (Flushed periodically from the in-memory heartbeat map)
+class DeviceHeartbeat(Base):
+    __tablename__ = "device_heartbeats"
+    device_uid = Column(String, primary_key=True)
+    company_id = Column(Integer, ForeignKey("companies.id"), nullable=False, index=True)
+    last_seen_at = Column(DateTime, nullable=False)
+
+class QueuedDeviceCommand(Base):
+    """Unacked device commands (app/core/device_commands.py); the device's ack deletes the rows it got"""
+    __tablename__ = "device_commands"
+    id = Column(String, primary_key=True)  # DeviceCommand.id, returned to the admin
+    device_uid = Column(String, nullable=False, index=True)
+    command = Column(String, nullable=False)
+    reason = Column(String, default="")
+    duration_ms = Column(Integer, default=3000)
+    issued_at = Column(DateTime, nullable=False)   # UTC
+    expires_at = Column(DateTime, nullable=False)  # A stale unlock must never open the door later
+    claimed_at = Column(DateTime, nullable=True)   # UTC start of the current delivery lease (NULL = not delivered)
+    deliveries = Column(Integer, nullable=False, default=0)
+
+# --- 4. SCHEMA VERSION (app/db/migrations.py) ---
+
+class SchemaMigration(Base):
+    __tablename__ = "schema_migrations"
+    version = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False)
+    applied_at = Column(DateTime, default=datetime.utcnow)
+
+# --- 5. CLOUD SYNC STATE ---
+
+class ZkSyncCursor(Base):
+    __tablename__ = "zk_sync_cursors"
+    id = Column(Integer, primary_key=True)
+
+    company_id = Column(Integer, ForeignKey("companies.id"), nullable=False, index=True)
+    device_uid = Column(String, unique=True, index=True)
+
+    last_punch_id = Column(Integer, default=0)        # Highest cloud transaction id ingested
+    last_punch_time = Column(DateTime, nullable=True)
+    last_synced_at = Column(DateTime, nullable=True)
+    rows_synced = Column(Integer, default=0)
@@ -2,7 +2,16 @@ import logging
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import settings
-from app.db.database import engine, Base
+from app.db.database import engine, SessionLocal
+from app.db.migrations import migrate
+from app.core.roster import roster_index
+from app.core.retention import retention_task
+from app.core.heartbeat import heartbeat_flush_task
+from app.core.notify import notify_listener
+from app.core.location_buffer import location_writer
+from app.core.positions import backfill_positions
+from app.core.location_archive import location_compaction_task
+from app.core.location_rollup import location_rollup_task
 
 # Import Routers
 from app.routers import auth, super_admin, company, employee, hardware
@@ -11,8 +20,8 @@ from app.routers import auth, super_admin, company, employee, hardware
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("saas_core")
 
-# 2. CREATE DATABASE TABLES
-Base.metadata.create_all(bind=engine)
+# 2. CREATE / MIGRATE DATABASE TABLES (new tables + pending versioned migrations)
+migrate(engine)
 
 # 3. INIT APP
 app = FastAPI(
@@ -43,6 +52,43 @@ app.include_router(company.router, tags=["Company Management"])
 app.include_router(employee.router, tags=["Employee App"])
 app.include_router(hardware.router, tags=["IoT & Hardware"])
 
+# 6. IN-MEMORY DOOR STATE & BACKGROUND JOBS
+@app.on_event("startup")
+def warm_door_state():
+    db = SessionLocal()
+    try:
+        roster_index.warm(db)
+        backfill_positions(db)  # No-op once the live-position table has rows
+    finally:
+        db.close()
+
+    if settings.DOOR_WRITE_BEHIND:
+        if not settings.WRITE_BEHIND_SPILL_DIR:
+            # Acknowledged scans must survive a shutdown during a DB outage
+            raise RuntimeError("DOOR_WRITE_BEHIND=true requires WRITE_BEHIND_SPILL_DIR")
+        hardware.door_writer.start()
+    if settings.LOCATION_BUFFER_ENABLED:
+        location_writer.start()
+    if settings.RETENTION_JOB_ENABLED:
+        retention_task.start()
+    if settings.LOCATION_COMPACTION_ENABLED:
+        location_compaction_task.start()
+    if settings.LOCATION_ROLLUP_ENABLED:
+        location_rollup_task.start()
+    heartbeat_flush_task.start()
+    notify_listener.start()  # PostgreSQL only: device commands and roster changes from other workers
+
+@app.on_event("shutdown")
+def flush_background_writers():
+    # Durability: persist every queued door scan before the process exits
+    hardware.door_writer.stop()
+    location_writer.stop()  # Pending GPS fixes
+    retention_task.stop()
+    location_compaction_task.stop()
+    location_rollup_task.stop()
+    heartbeat_flush_task.stop()  # Final flush of last-seen times
+    notify_listener.stop()
+
 @app.get("/")
 def root():
     return {"message": "Attendance SaaS API is Running 🚀"}
\ No newline at end of file
@@ -6,7 +6,7 @@ from jose import JWTError, jwt # <--- New Import for decoding tokens
 
 from app.db.database import get_db
 from app.db.models import SuperAdmin, CompanyAdmin, Employee
-from app.core.security import verify_password, create_access_token, get_password_hash
+from app.core.security import verify_password, create_access_token, get_password_hash, STREAM_TICKET_ROLE
 from app.core.config import settings # <--- New Import for Secret Key
 from app.schemas.schemas import LoginRequest, Token, TokenData # <--- New Import
 
@@ -36,11 +36,25 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
         if username is None:
             raise credentials_exception
             
-        token_data = TokenData(username=username, role=role, company_id=company_id)
+        token_data = TokenData(username=username, role=role, company_id=company_id, expires_at=payload.get("exp"))
     except JWTError:
         raise credentials_exception
     return token_data
 
+# 1b. Decode a live tracking stream ticket (?ticket=); expires_at is the admin session's
+def get_stream_ticket_user(ticket: str) -> TokenData:
+    credentials_exception = HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or expired stream ticket")
+    try:
+        payload = jwt.decode(ticket, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    except JWTError:
+        raise credentials_exception
+    if payload.get("role") != STREAM_TICKET_ROLE or payload.get("sub") is None or payload.get("company_id") is None:
+        raise credentials_exception
+    return TokenData(
+        username=payload["sub"], role=STREAM_TICKET_ROLE,
+        company_id=payload["company_id"], expires_at=payload.get("session_exp")
+    )
+
 # 2. Guard: Only Allow Company Admins
 def get_current_active_admin(current_user: TokenData = Depends(get_current_user)):
     if current_user.role != "admin":
@@ -1,16 +1,42 @@
-from fastapi import APIRouter, Depends, HTTPException, Form
+from fastapi import APIRouter, Depends, HTTPException, Form, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy.orm import Session
-from datetime import datetime
+from datetime import datetime, date
+from typing import Optional
 from pydantic import BaseModel, validator
+import json
 import re
-
-from app.db.database import get_db
-from app.db.models import Employee, Attendance, HardwareDevice, DoorEvent, LocationLog, Company, DepartmentSession, ShortLeave, CompanyAdmin
-from app.core.security import get_password_hash
-from app.routers.auth import get_current_active_admin
+import time
+import numpy as np
+import pytz
+
+from app.db.database import get_db, SessionLocal
+from app.db.models import (
+    Employee, Attendance, HardwareDevice, DoorEvent, Company, DepartmentSession, CompanyAdmin,
+    DoorEventRetention, DeviceHeartbeat, EmployeePosition, GeofenceSite
+)
+from app.core.security import get_password_hash, create_stream_ticket
+from app.core.roster import roster_index
+from app.core.retention import retention_days_for
+from app.core.heartbeat import heartbeats
+from app.core.device_commands import command_broker, DeviceCommand
+from app.core.tracking_hub import tracking_hub
+from app.core.route_summary import needs_summary, session_points, summarize_points, summarize_session
+from app.core.geofence import geofence_cache
+from app.core.session_registry import session_registry
+from app.core.company_config import company_configs
+from app.core.route_replay import replay_route
+from app.core.location_rollup import daily_report, hourly_report
+from app.core.attendance_summary import snapshot, record_change, summary_range
+from app.core.attendance_export import EXPORT_FORMATS, stream_export
+from app.core.pagination import keyset_page
+from app.core import queries
+from app.core.config import settings
+from app.routers.auth import get_current_active_admin, get_stream_ticket_user
 from app.schemas.schemas import (
     EmployeeCreate, EmployeeUpdate, ManualAttendance, 
-    EmergencyOpen, TokenData, OfficeSettings
+    EmergencyOpen, TokenData, OfficeSettings, RetentionSettings, GeofenceSiteCreate
 )
 
 class ScheduleUpdate(BaseModel):
@@ -39,6 +65,12 @@ def get_safe_company_id(current_user: TokenData, db: Session) -> int:
         raise HTTPException(401, "Admin not found in Database")
     return admin.company_id
 
+def fetch_page(query, keys, cursor: Optional[str], limit: int):
+    try:
+        return keyset_page(query, keys, cursor, limit)
+    except ValueError:
+        raise HTTPException(400, "Invalid cursor")
+
 
 # ==========================================
 # 1. EMPLOYEE MANAGEMENT
@@ -87,7 +119,9 @@ def add_employee(
             exists.password_hash = get_password_hash(payload.password)
             exists.role = payload.role
             exists.status = "active"
+            roster_index.publish(db, company_id)
             db.commit()
+            roster_index.upsert_employee(company_id, exists.employee_id, exists.id, exists.name, exists.status)
             return {"status": "success", "message": "Employee Restored"}
         raise HTTPException(400, "Employee ID already exists")
 
@@ -100,7 +134,9 @@ def add_employee(
         status="active"
     )
     db.add(new_emp)
+    roster_index.publish(db, company_id)
     db.commit()
+    roster_index.upsert_employee(company_id, new_emp.employee_id, new_emp.id, new_emp.name, new_emp.status)
     return {"status": "success", "message": "Employee Added"}
 
 @router.put("/company/employees/{emp_db_id}")
@@ -119,7 +155,10 @@ def update_employee(
     if payload.role: emp.role = payload.role
     if payload.name: emp.name = payload.name
     
+    roster_index.publish(db, company_id)
     db.commit()
+    if emp.deleted_at is None:
+        roster_index.upsert_employee(company_id, emp.employee_id, emp.id, emp.name, emp.status)
     return {"status": "success", "message": "Employee updated"}
 
 @router.delete("/company/employees/{emp_db_id}")
@@ -134,7 +173,11 @@ def delete_employee(
     if not emp: raise HTTPException(404, "Employee not found")
     
     emp.deleted_at = datetime.utcnow()
+    employee_code, employee_db_id = emp.employee_id, emp.id
+    roster_index.publish(db, company_id)  # Other workers stop opening doors for them at commit
     db.commit()
+    roster_index.remove_employee(company_id, employee_code)
+    session_registry.end_employee(employee_db_id)
     return {"status": "success", "message": "Employee deleted"}
 
 
@@ -145,6 +188,8 @@ def delete_employee(
 @router.get("/company/employees/{employee_id}/attendance")
 def get_employee_history(
     employee_id: str, 
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=settings.PAGE_MAX_SIZE),
     current_user: TokenData = Depends(get_current_active_admin),
     db: Session = Depends(get_db)
 ):
@@ -157,11 +202,11 @@ def get_employee_history(
     
     if not employee: raise HTTPException(404, "Employee not found")
         
-    logs = db.query(Attendance).filter(
-        Attendance.employee_id == employee.employee_id 
-    ).order_by(Attendance.timestamp.desc()).limit(50).all()
+    logs, next_cursor = fetch_page(
+        queries.attendance_history(db, company_id, employee.employee_id), queries.ATTENDANCE_PAGE_KEYS, cursor, limit
+    )
 
-    return [
+    items = [
         {
             "date_only": log.date_only.strftime("%Y-%m-%d"),
             "status": log.status,
@@ -173,6 +218,31 @@ def get_employee_history(
             "late_reason": getattr(log, 'late_reason', None) 
         } for log in logs
     ]
+    return {"items": items, "next_cursor": next_cursor}
+
+def live_positions(db: Session, company_id: int) -> list:
+    """One indexed read of the maintained latest-position table"""
+    rows = db.query(
+        Employee.employee_id, Employee.name, Employee.role,
+        EmployeePosition.latitude, EmployeePosition.longitude, EmployeePosition.recorded_at
+    ).join(
+        EmployeePosition, EmployeePosition.employee_id == Employee.id
+    ).filter(
+        EmployeePosition.company_id == company_id,
+        Employee.role.ilike("%Marketing%")
+    ).all()
+
+    # Plain JSON types up front: skips jsonable_encoder, which dominates at 10k rows
+    return [
+        {
+            "id": r.employee_id,
+            "name": r.name,
+            "role": r.role,
+            "lat": r.latitude,
+            "lon": r.longitude,
+            "last_seen": r.recorded_at.isoformat()
+        } for r in rows
+    ]
 
 @router.get("/company/tracking/live")
 def get_live_tracking(
@@ -180,28 +250,287 @@ def get_live_tracking(
     db: Session = Depends(get_db)
 ):
     company_id = get_safe_company_id(current_user, db)
-    employees = db.query(Employee).filter(
-        Employee.company_id == company_id,
-        Employee.role.ilike("%Marketing%") 
-    ).all()
-    
-    live_data = []
-    for emp in employees:
-        last_loc = db.query(LocationLog).join(DepartmentSession).filter(
-            DepartmentSession.employee_id == emp.id
-        ).order_by(LocationLog.recorded_at.desc()).first() 
-        
-        if last_loc:
-            live_data.append({
-                "id": emp.employee_id,
-                "name": emp.name,
-                "role": emp.role,
-                "lat": last_loc.latitude,
-                "lon": last_loc.longitude,
-                "last_seen": last_loc.recorded_at 
+    return JSONResponse(live_positions(db, company_id))
+
+# Threadpool helpers for the async stream endpoint (short-lived sessions)
+def stream_access_allowed(username: str, company_id: int) -> bool:
+    """The admin still exists in the company and the company isn't suspended"""
+    db = SessionLocal()
+    try:
+        company = db.query(Company.status).join(CompanyAdmin, CompanyAdmin.company_id == Company.id).filter(
+            CompanyAdmin.username == username, Company.id == company_id
+        ).first()
+        return company is not None and company.status == "active"
+    finally:
+        db.close()
+
+def load_stream_snapshot(company_id: int) -> list:
+    db = SessionLocal()
+    try:
+        return live_positions(db, company_id)
+    finally:
+        db.close()
+
+@router.post("/company/tracking/stream-ticket")
+def create_tracking_stream_ticket(
+    current_user: TokenData = Depends(get_current_active_admin),
+    db: Session = Depends(get_db)
+):
+    """
+    EventSource can't send headers, so the stream takes a ?ticket= instead of
+    the admin JWT: single-purpose and valid for TRACKING_STREAM_TICKET_SECONDS.
+    """
+    company_id = get_safe_company_id(current_user, db)
+    if not stream_access_allowed(current_user.username, company_id):
+        raise HTTPException(403, "Stream access revoked")
+    return {
+        "ticket": create_stream_ticket(current_user.username, company_id, current_user.expires_at),
+        "expires_in": settings.TRACKING_STREAM_TICKET_SECONDS
+    }
+
+@router.get("/company/tracking/stream")
+async def stream_live_tracking(request: Request, ticket: str):
+    """
+    Server-Sent Events: one "snapshot" event, then "positions" events with the
+    latest fix per changed employee. Open it with a ticket from
+    POST /company/tracking/stream-ticket. Every keepalive interval the admin's
+    session expiry, the admin and the company status are checked again; once
+    any fails the stream sends "revoked" and closes.
+    """
+    current_user = get_stream_ticket_user(ticket)
+    company_id = current_user.company_id
+
+    def session_expired() -> bool:
+        return current_user.expires_at is not None and time.time() >= current_user.expires_at
+
+    if session_expired() or not await run_in_threadpool(stream_access_allowed, current_user.username, company_id):
+        raise HTTPException(403, "Stream access revoked")
+
+    # Subscribe before the snapshot so nothing published in between is missed
+    subscriber = tracking_hub.subscribe(company_id)
+    try:
+        snapshot = await run_in_threadpool(load_stream_snapshot, company_id)
+    except Exception:
+        tracking_hub.unsubscribe(subscriber)
+        raise
+
+    async def events():
+        keepalive = settings.TRACKING_STREAM_KEEPALIVE_SECONDS
+        try:
+            yield "retry: 3000\n\n"
+            yield f"event: snapshot\ndata: {json.dumps(snapshot)}\n\n"
+            next_check = time.monotonic() + keepalive
+            while not await request.is_disconnected():
+                batch = await subscriber.next_batch(keepalive)
+                if time.monotonic() >= next_check:
+                    if session_expired() or not await run_in_threadpool(
+                        stream_access_allowed, current_user.username, company_id
+                    ):
+                        yield "event: revoked\ndata: {}\n\n"
+                        return
+                    next_check = time.monotonic() + keepalive
+                if batch:
+                    yield f"event: positions\ndata: {json.dumps(batch)}\n\n"
+                else:
+                    yield ": keepalive\n\n"
+        finally:
+            tracking_hub.unsubscribe(subscriber)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"  # Don't let a reverse proxy buffer the stream
+    })
+
+@router.get("/company/tracking/sessions/{session_id}/summary")
+def get_route_summary(
+    session_id: int,
+    refresh: bool = False,
+    current_user: TokenData = Depends(get_current_active_admin),
+    db: Session = Depends(get_db)
+):
+    company_id = get_safe_company_id(current_user, db)
+    session = db.query(DepartmentSession).filter(
+        DepartmentSession.id == session_id,
+        DepartmentSession.company_id == company_id
+    ).first()
+    if not session:
+        raise HTTPException(404, "Tracking session not found")
+
+    # Active sessions are summarised on the fly and not stored (they're still growing)
+    if session.active:
+        summary = summarize_points(*session_points(db, session.id))
+    elif needs_summary(session, refresh):
+        summary = summarize_session(db, session)
+        db.commit()
+    else:
+        summary = session.route_summary
+
+    return {
+        "session_id": session.id,
+        "department": session.department,
+        "active": session.active,
+        "start_time": session.start_time,
+        "end_time": session.end_time,
+        **summary
+    }
+
+@router.get("/company/tracking/sessions/{session_id}/route")
+def get_route_replay(
+    session_id: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    points: int = settings.ROUTE_REPLAY_DEFAULT_POINTS,
+    current_user: TokenData = Depends(get_current_active_admin),
+    db: Session = Depends(get_db)
+):
+    """Downsampled track for a window (start/end in company local time) as an encoded polyline"""
+    company_id = get_safe_company_id(current_user, db)
+    session = db.query(DepartmentSession.id, DepartmentSession.department, DepartmentSession.active).filter(
+        DepartmentSession.id == session_id,
+        DepartmentSession.company_id == company_id
+    ).first()
+    if not session:
+        raise HTTPException(404, "Tracking session not found")
+    if (start and start.tzinfo) or (end and end.tzinfo):
+        # Fixes are stored as naive company-local time
+        tz_name = db.query(Company.timezone).filter(Company.id == company_id).scalar() or "UTC"
+        try:
+            tz = pytz.timezone(tz_name)
+        except pytz.UnknownTimeZoneError:
+            tz = pytz.UTC
+        if start and start.tzinfo: start = start.astimezone(tz).replace(tzinfo=None)
+        if end and end.tzinfo: end = end.astimezone(tz).replace(tzinfo=None)
+
+    points = min(max(points, 3), settings.ROUTE_REPLAY_MAX_POINTS)
+    return {
+        "session_id": session.id,
+        "department": session.department,
+        "active": session.active,
+        **replay_route(db, session.id, start, end, points)
+    }
+
+@router.get("/company/tracking/sessions/{session_id}/geofence")
+def get_session_geofence(
+    session_id: int,
+    current_user: TokenData = Depends(get_current_active_admin),
+    db: Session = Depends(get_db)
+):
+    company_id = get_safe_company_id(current_user, db)
+    session = db.query(DepartmentSession.id).filter(
+        DepartmentSession.id == session_id,
+        DepartmentSession.company_id == company_id
+    ).first()
+    if not session:
+        raise HTTPException(404, "Tracking session not found")
+
+    times, lats, lons = session_points(db, session_id)
+    fences = geofence_cache.get(db, company_id)
+    labels = fences.classify(lats, lons)  # One vectorised pass over the whole session
+
+    # Time between two fixes counts towards the site of the earlier one (gaps count nowhere)
+    seconds = {}
+    if len(times) > 1:
+        t = np.asarray(times, dtype="datetime64[us]").astype(np.int64) / 1e6
+        dt = np.diff(t)
+        usable = dt <= settings.ROUTE_GAP_SECONDS
+        for label in np.unique(labels[:-1]):
+            seconds[int(label)] = int(dt[usable & (labels[:-1] == label)].sum())
+
+    # Consecutive fixes with the same label form one visit
+    visits = []
+    if len(times):
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(labels)) + 1))
+        ends = np.concatenate((starts[1:] - 1, [len(times) - 1]))
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            label = int(labels[start])
+            visits.append({
+                "site_id": fences.fences[label].id if label >= 0 else None,
+                "site": fences.fences[label].name if label >= 0 else None,
+                "start": times[start].isoformat(),
+                "end": times[end].isoformat(),
+                "points": end - start + 1
             })
-            
-    return live_data
+
+    return {
+        "session_id": session_id,
+        "point_count": len(times),
+        "inside_points": int((labels >= 0).sum()),
+        "outside_points": int((labels < 0).sum()),
+        "outside_seconds": seconds.get(-1, 0),
+        "sites": [
+            {**fence.to_dict(), "points": int((labels == i).sum()), "seconds": seconds.get(i, 0)}
+            for i, fence in enumerate(fences.fences)
+        ],
+        "visits": visits
+    }
+
+def check_report_window(start: date, end: date, max_days: int = settings.TRACKING_REPORT_MAX_DAYS):
+    if end < start:
+        raise HTTPException(400, "end must not be before start")
+    if (end - start).days + 1 > max_days:
+        raise HTTPException(400, f"Date range too long (max {max_days} days)")
+
+# Field reports read the hourly rollups only (never employee_location_logs)
+@router.get("/company/tracking/reports/daily")
+def get_tracking_daily_report(
+    start: date,
+    end: date,
+    employee_id: Optional[str] = None,
+    current_user: TokenData = Depends(get_current_active_admin),
+    db: Session = Depends(get_db)
+):
+    company_id = get_safe_company_id(current_user, db)
+    check_report_window(start, end)
+    return JSONResponse(daily_report(db, company_id, start, end, employee_id))
+
+@router.get("/company/tracking/reports/hourly")
+def get_tracking_hourly_report(
+    employee_id: str,
+    start: date,
+    end: Optional[date] = None,
+    current_user: TokenData = Depends(get_current_active_admin),
+    db: Session = Depends(get_db)
+):
+    company_id = get_safe_company_id(current_user, db)
+    end = end or start
+    check_report_window(start, end)
+    return JSONResponse(hourly_report(db, company_id, employee_id, start, end))
+
+# Dashboard counters: one summary row per day (never scans the attendance table)
+@router.get("/company/attendance/summary")
+def get_attendance_summary(
+    start: date,
+    end: Optional[date] = None,
+    current_user: TokenData = Depends(get_current_active_admin),
+    db: Session = Depends(get_db)
+):
+    company_id = get_safe_company_id(current_user, db)
+    end = end or start
+    check_report_window(start, end, settings.ATTENDANCE_SUMMARY_MAX_DAYS)
+    return summary_range(db, company_id, start, end)
+
+# Payroll export: every row in the range, streamed (CSV or NDJSON)
+@router.get("/company/attendance/export")
+def export_attendance(
+    start: date,
+    end: date,
+    employee_id: Optional[str] = None,
+    export_format: str = Query("csv", alias="format"),
+    current_user: TokenData = Depends(get_current_active_admin),
+    db: Session = Depends(get_db)
+):
+    company_id = get_safe_company_id(current_user, db)
+    if export_format not in EXPORT_FORMATS:
+        raise HTTPException(400, f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+    if end < start:
+        raise HTTPException(400, "end must not be before start")
+
+    filename = f"attendance_{start}_{end}.{export_format}"
+    rows = stream_export(company_id, start, end, export_format, employee_id, settings.ATTENDANCE_EXPORT_CHUNK_SIZE)
+    return StreamingResponse(rows, media_type=EXPORT_FORMATS[export_format], headers={
+        "Content-Disposition": f'attachment; filename="{filename}"',
+        "X-Accel-Buffering": "no"
+    })
 
 @router.post("/company/attendance/manual")
 def mark_manual_attendance(
@@ -222,11 +551,26 @@ def mark_manual_attendance(
     status = "Present"
 
     if payload.type == 'check_in':
-        company = db.query(Company).filter(Company.id == company_id).first()
-        if company and company.work_start_time:
-            work_start = datetime.strptime(company.work_start_time, "%H:%M").time()
-            if record_time.time() > work_start:
-                status = "Late"
+        company = company_configs.get(db, company_id)
+        if company and company.work_start and record_time.time() > company.work_start:
+            status = "Late"
+
+    # One row per employee per day: a manual entry corrects the existing day
+    existing = queries.attendance_day(db, company_id, emp.employee_id, record_date).first()
+    if existing:
+        before = snapshot(existing)
+        if payload.type == 'check_in':
+            existing.check_in_time = record_time
+            existing.timestamp = record_time
+            existing.status = status
+        else:
+            existing.check_out_time = record_time
+        existing.type = payload.type
+        existing.method = "MANUAL_ADMIN"
+        existing.image_url = payload.notes or existing.image_url
+        record_change(db, before, snapshot(existing))
+        db.commit()
+        return {"status": "success", "message": f"Attendance updated ({existing.status})"}
 
     new_log = Attendance(
         company_id=company_id,
@@ -240,6 +584,7 @@ def mark_manual_attendance(
         method="MANUAL_ADMIN",
         image_url=payload.notes 
     )
+    record_change(db, None, snapshot(new_log))
     db.add(new_log)
     db.commit()
     return {"status": "success", "message": f"Attendance marked ({status})"}
@@ -275,7 +620,25 @@ def get_company_devices(
     db: Session = Depends(get_db)
 ):
     company_id = get_safe_company_id(current_user, db)
-    return db.query(HardwareDevice).filter(HardwareDevice.company_id == company_id).all()
+    rows = db.query(HardwareDevice, DeviceHeartbeat.last_seen_at).outerjoin(
+        DeviceHeartbeat, DeviceHeartbeat.device_uid == HardwareDevice.device_uid
+    ).filter(HardwareDevice.company_id == company_id).all()
+
+    result = []
+    for d, persisted in rows:
+        last_seen = heartbeats.last_seen(d.device_uid, persisted)
+        result.append({
+            "id": d.id,
+            "company_id": d.company_id,
+            "device_uid": d.device_uid,
+            "device_type": d.device_type,
+            "location": d.location,
+            "secret_key": d.secret_key,
+            "active": d.active,
+            "online": bool(d.active and heartbeats.is_online(last_seen)),
+            "last_seen": last_seen.isoformat() if last_seen else None
+        })
+    return result
 
 @router.post("/company/devices/emergency-open")
 def emergency_open(
@@ -297,8 +660,10 @@ def emergency_open(
         trigger_reason=f"Opened by Admin: {payload.reason}",
         created_at=datetime.utcnow()
     ))
-    db.commit()
-    return {"status": "success", "message": "Door Unlock Command Sent"}
+    # Commits the door event with the queued command, then releases the device's parked long-poll
+    command = DeviceCommand(command="UNLOCK", reason=payload.reason)
+    waiting = command_broker.publish(db, device.device_uid, command)
+    return {"status": "success", "message": "Door Unlock Command Sent", "command_id": command.id, "device_waiting": waiting > 0}
 
 @router.post("/company/settings/location")
 def update_settings(
@@ -314,8 +679,70 @@ def update_settings(
     company.office_lng = payload.lng
     company.office_radius = payload.radius
     db.commit()
+    geofence_cache.invalidate(company_id)
+    company_configs.invalidate(company_id)
     return {"status": "success", "message": "Office Location Updated"}
 
+@router.get("/company/geofences")
+def get_geofences(
+    current_user: TokenData = Depends(get_current_active_admin),
+    db: Session = Depends(get_db)
+):
+    company_id = get_safe_company_id(current_user, db)
+    sites = db.query(GeofenceSite).filter(
+        GeofenceSite.company_id == company_id,
+        GeofenceSite.active == True
+    ).order_by(GeofenceSite.id).all()
+    return [{
+        "id": s.id,
+        "name": s.name,
+        "kind": s.kind,
+        "lat": s.center_lat,
+        "lng": s.center_lng,
+        "radius_m": s.radius_m,
+        "polygon": s.polygon,
+        "created_at": s.created_at
+    } for s in sites]
+
+@router.post("/company/geofences")
+def create_geofence(
+    payload: GeofenceSiteCreate,
+    current_user: TokenData = Depends(get_current_active_admin),
+    db: Session = Depends(get_db)
+):
+    company_id = get_safe_company_id(current_user, db)
+    site = GeofenceSite(
+        company_id=company_id,
+        name=payload.name,
+        kind=payload.kind,
+        center_lat=payload.lat if payload.kind == "circle" else None,
+        center_lng=payload.lng if payload.kind == "circle" else None,
+        radius_m=payload.radius_m if payload.kind == "circle" else None,
+        polygon=payload.polygon if payload.kind == "polygon" else None
+    )
+    db.add(site)
+    db.commit()
+    geofence_cache.invalidate(company_id)
+    return {"status": "success", "message": "Geofence Created", "id": site.id}
+
+@router.delete("/company/geofences/{site_id}")
+def delete_geofence(
+    site_id: int,
+    current_user: TokenData = Depends(get_current_active_admin),
+    db: Session = Depends(get_db)
+):
+    company_id = get_safe_company_id(current_user, db)
+    site = db.query(GeofenceSite).filter(
+        GeofenceSite.id == site_id,
+        GeofenceSite.company_id == company_id
+    ).first()
+    if not site: raise HTTPException(404, "Geofence not found")
+
+    site.active = False  # Soft delete: historical reports may still reference the site
+    db.commit()
+    geofence_cache.invalidate(company_id)
+    return {"status": "success", "message": "Geofence Deleted"}
+
 @router.post("/company/settings/schedule")
 def update_schedule(
     payload: ScheduleUpdate,
@@ -332,21 +759,56 @@ def update_schedule(
     company.super_late_threshold = payload.super_late_threshold
     
     db.commit()
+    company_configs.invalidate(company_id)
+    session_registry.invalidate_company(company_id)  # Cached session clocks use the old timezone
     return {"status": "success", "message": "Work Schedule Updated"}
 
+@router.get("/company/settings/retention")
+def get_retention_settings(
+    current_user: TokenData = Depends(get_current_active_admin),
+    db: Session = Depends(get_db)
+):
+    company_id = get_safe_company_id(current_user, db)
+    return {"retention_days": retention_days_for(db, company_id)}
+
+@router.post("/company/settings/retention")
+def update_retention_settings(
+    payload: RetentionSettings,
+    current_user: TokenData = Depends(get_current_active_admin),
+    db: Session = Depends(get_db)
+):
+    company_id = get_safe_company_id(current_user, db)
+    if payload.retention_days < 0:
+        raise HTTPException(400, "Retention days cannot be negative")
+
+    policy = db.query(DoorEventRetention).filter(DoorEventRetention.company_id == company_id).first()
+    if not policy:
+        policy = DoorEventRetention(company_id=company_id)
+        db.add(policy)
+    policy.retention_days = payload.retention_days
+    policy.updated_at = datetime.utcnow()
+    db.commit()
+    return {"status": "success", "message": "Door Event Retention Updated"}
+
 
 # ==========================================
 # 4. FULL AUDIT ENDPOINTS
 # ==========================================
 
+# Audit lists are newest first, paged by keyset: pass next_cursor back as ?cursor= for older rows
 @router.get("/company/audit/attendance")
-def get_all_attendance(db: Session = Depends(get_db), current_user: TokenData = Depends(get_current_active_admin)):
+def get_all_attendance(
+    cursor: Optional[str] = None,
+    limit: int = Query(500, ge=1, le=settings.PAGE_MAX_SIZE),
+    db: Session = Depends(get_db),
+    current_user: TokenData = Depends(get_current_active_admin)
+):
     company_id = get_safe_company_id(current_user, db)
-    logs = db.query(Attendance).filter(
-        Attendance.company_id == company_id
-    ).order_by(Attendance.date_only.desc(), Attendance.timestamp.desc()).limit(500).all()
+    logs, next_cursor = fetch_page(
+        queries.audit_attendance(db, company_id), queries.ATTENDANCE_PAGE_KEYS, cursor, limit
+    )
     
-    return [
+    items = [
         {
             "id": log.id,
             "employee_id": log.employee_id,
@@ -360,15 +822,21 @@ def get_all_attendance(db: Session = Depends(get_db), current_user: TokenData =
             "late_reason": getattr(log, 'late_reason', None) 
         } for log in logs
     ]
+    return {"items": items, "next_cursor": next_cursor}
 
 @router.get("/company/audit/short_leaves")
-def get_all_short_leaves(db: Session = Depends(get_db), current_user: TokenData = Depends(get_current_active_admin)):
+def get_all_short_leaves(
+    cursor: Optional[str] = None,
+    limit: int = Query(500, ge=1, le=settings.PAGE_MAX_SIZE),
+    db: Session = Depends(get_db),
+    current_user: TokenData = Depends(get_current_active_admin)
+):
     company_id = get_safe_company_id(current_user, db)
-    leaves = db.query(ShortLeave).filter(
-        ShortLeave.company_id == company_id
-    ).order_by(ShortLeave.exit_time.desc()).limit(500).all()
+    leaves, next_cursor = fetch_page(
+        queries.audit_short_leaves(db, company_id), queries.SHORT_LEAVE_PAGE_KEYS, cursor, limit
+    )
     
-    return [
+    items = [
         {
             "id": l.id,
             "employee_id": l.employee_id,
@@ -378,15 +846,21 @@ def get_all_short_leaves(db: Session = Depends(get_db), current_user: TokenData
             "return_time": l.return_time.isoformat() if l.return_time else None
         } for l in leaves
     ]
+    return {"items": items, "next_cursor": next_cursor}
 
 @router.get("/company/audit/door_events")
-def get_all_door_events(db: Session = Depends(get_db), current_user: TokenData = Depends(get_current_active_admin)):
+def get_all_door_events(
+    cursor: Optional[str] = None,
+    limit: int = Query(500, ge=1, le=settings.PAGE_MAX_SIZE),
+    db: Session = Depends(get_db),
+    current_user: TokenData = Depends(get_current_active_admin)
+):
     company_id = get_safe_company_id(current_user, db)
-    events = db.query(DoorEvent).filter(
-        DoorEvent.company_id == company_id
-    ).order_by(DoorEvent.created_at.desc()).limit(500).all()
+    events, next_cursor = fetch_page(
+        queries.audit_door_events(db, company_id), queries.DOOR_EVENT_PAGE_KEYS, cursor, limit
+    )
     
-    return [
+    items = [
         {
             "id": e.id,
             "event_type": e.event_type,
@@ -394,4 +868,24 @@ def get_all_door_events(db: Session = Depends(get_db), current_user: TokenData =
             "device_id": e.device_id,
             "timestamp": e.created_at.isoformat()
         } for e in events
-    ]
\ No newline at end of file
+    ]
+    return {"items": items, "next_cursor": next_cursor}
+
+# Hourly door activity kept after raw door events are purged by retention
+@router.get("/company/audit/door_activity")
+def get_door_activity(
+    start: date,
+    end: date,
+    device_id: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: TokenData = Depends(get_current_active_admin)
+):
+    company_id = get_safe_company_id(current_user, db)
+    return [
+        {
+            "device_id": r.device_id,
+            "hour": r.hour_start.isoformat(),
+            "event_type": r.event_type,
+            "count": r.event_count
+        } for r in queries.door_activity(db, company_id, start, end, device_id)
+    ]
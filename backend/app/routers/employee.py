@@ -1,4 +1,5 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
 import pytz
@@ -6,11 +7,21 @@ from typing import List, Optional
 from pydantic import BaseModel
 from jose import jwt
 
-from app.db.models import Company, Employee, Attendance, DepartmentSession, LocationLog, ShortLeave
+from app.db.models import Employee, Attendance, DepartmentSession, ShortLeave
 from app.db.database import get_db
-from app.schemas.schemas import AttendanceMark, TrackingStart, LocationUpdate, EmergencyCheckout, ShortLeaveRequest
+from app.schemas.schemas import AttendanceMark, TrackingStart, LocationUpdate, LocationBatch, EmergencyCheckout, ShortLeaveRequest
 from app.routers.auth import oauth2_scheme
 from app.core.config import settings
+from app.core.location_buffer import location_writer
+from app.core.positions import write_fixes
+from app.core.tracking_hub import tracking_hub
+from app.core.route_summary import summarize_sessions
+from app.core.geofence import geofence_cache, parse_location
+from app.core.session_registry import session_registry, SessionEntry
+from app.core.company_config import company_configs, CompanyConfig
+from app.core.attendance_summary import snapshot, record_change, add_counts
+from app.core.pagination import keyset_page
+from app.core import queries
 
 router = APIRouter()
 
@@ -29,16 +40,19 @@ class AttendanceHistoryItem(BaseModel):
     check_out_time: Optional[str] = None
     late_reason: Optional[str] = None 
 
+class AttendanceHistoryPage(BaseModel):
+    items: List[AttendanceHistoryItem]
+    next_cursor: Optional[str] = None  # Pass back as ?cursor= for older days
+
 class EmployeeActionPayload(BaseModel):
     employee_id: str
 
-# --- HELPER: Get Company Local Time ---
-def get_local_now(company: Company) -> datetime:
-    tz_str = company.timezone if company and getattr(company, 'timezone', None) else "UTC"
-    try:
-        tz = pytz.timezone(tz_str)
-    except Exception:
-        tz = pytz.UTC
+# --- HELPER: Get Company Local Time (config from the shared company cache) ---
+def get_company_tz(company: Optional[CompanyConfig]):
+    return company.tz if company else pytz.UTC
+
+def get_local_now(company: Optional[CompanyConfig]) -> datetime:
+    tz = get_company_tz(company)
     # Strip tzinfo so PostgreSQL saves it exactly as the naive local time (e.g., 09:00 Dhaka time)
     return datetime.now(tz).replace(tzinfo=None)
 
@@ -58,14 +72,11 @@ def get_my_profile(db: Session = Depends(get_db), user: dict = Depends(get_curre
     if not emp: 
         raise HTTPException(404, "User not found")
     
-    company = db.query(Company).filter(Company.id == emp.company_id).first()
+    company = company_configs.get(db, emp.company_id)
     now = get_local_now(company)
     today = now.date()
     
-    att = db.query(Attendance).filter(
-        Attendance.employee_id == emp.employee_id, 
-        Attendance.date_only == today
-    ).first()
+    att = queries.attendance_day(db, emp.company_id, emp.employee_id, today).first()
     
     return {
         "id": emp.employee_id,
@@ -89,35 +100,29 @@ def mark_attendance(
     if payload.employee_id != user["sub"]:
         raise HTTPException(403, "Cannot mark attendance for another user")
 
-    company = db.query(Company).filter(Company.id == user["company_id"]).first()
+    company = company_configs.get(db, user["company_id"])
     now = get_local_now(company)
     today = now.date()
+
+    # Server-side geofence check (the app's own check can't be trusted)
+    point = (payload.lat, payload.lng) if payload.lat is not None and payload.lng is not None else parse_location(payload.location)
+    fences = geofence_cache.get(db, user["company_id"])
+    site = fences.locate(*point) if point else None
+    if settings.GEOFENCE_ENFORCE_CHECKIN and fences.fences and site is None:
+        return {"status": "error", "message": "You are outside the office area"}
         
-    existing = db.query(Attendance).filter(
-        Attendance.employee_id == payload.employee_id,
-        Attendance.date_only == today
-    ).first()
+    existing = queries.attendance_day(db, user["company_id"], payload.employee_id, today).first()
     
     if not existing:
         status = "Present"
-        if company and company.work_start_time:
-            try:
-                start_dt = datetime.strptime(company.work_start_time, "%H:%M").time()
-                start_datetime = datetime.combine(today, start_dt)
-                
-                threshold_minutes = getattr(company, 'super_late_threshold', 30)
-                if threshold_minutes is None: threshold_minutes = 30
-                
-                super_late_datetime = start_datetime + timedelta(minutes=threshold_minutes)
-                
-                if now > super_late_datetime:
-                    status = "Super Late"
-                elif now.time() > start_dt:
-                    status = "Late"
-            except Exception:
-                pass 
-
-        db.add(Attendance(
+        if company and company.work_start:
+            super_late_datetime = datetime.combine(today, company.work_start) + timedelta(minutes=company.super_late_threshold)
+            if now > super_late_datetime:
+                status = "Super Late"
+            elif now.time() > company.work_start:
+                status = "Late"
+
+        att = Attendance(
             company_id=user["company_id"],
             employee_id=payload.employee_id,
             timestamp=now,
@@ -127,9 +132,19 @@ def mark_attendance(
             source="MOBILE",
             type="check_in",
             check_in_time=now
-        ))
-        db.commit()
-        return {"status": "success", "message": f"Checked In ({status})"}
+        )
+        record_change(db, None, snapshot(att))
+        db.add(att)
+        try:
+            db.commit()
+        except IntegrityError:
+            # Concurrent check-in (double tap, door scan) created the day's row first
+            db.rollback()
+            return {"status": "error", "message": "Already checked in today"}
+        return {
+            "status": "success", "message": f"Checked In ({status})",
+            "inside_geofence": site is not None, "site": site.name if site else None
+        }
     
     return {"status": "error", "message": "Already checked in today"}
 
@@ -142,27 +157,19 @@ def unlock_door(
     if payload.employee_id != user["sub"]:
         raise HTTPException(403, "Not authorized")
 
-    company = db.query(Company).filter(Company.id == user["company_id"]).first()
+    company = company_configs.get(db, user["company_id"])
     now = get_local_now(company)
     today = now.date()
 
-    att = db.query(Attendance).filter(
-        Attendance.employee_id == payload.employee_id,
-        Attendance.date_only == today
-    ).first()
+    att = queries.attendance_day(db, user["company_id"], payload.employee_id, today).first()
 
     if not att:
         return {"status": "error", "message": "Must check in first"}
         
     att.door_unlock_time = now
     
-    if company and company.work_end_time:
-        try:
-            end_time_dt = datetime.strptime(company.work_end_time, "%H:%M").time()
-            enabled_dt = datetime.combine(today, end_time_dt)
-            att.check_out_enabled_time = enabled_dt
-        except Exception:
-            pass
+    if company and company.work_end:
+        att.check_out_enabled_time = datetime.combine(today, company.work_end)
 
     db.commit()
     return {"status": "success", "message": "Door unlocked"}
@@ -176,28 +183,22 @@ def mark_checkout(
     if payload.employee_id != user["sub"]:
         raise HTTPException(403, "Not authorized")
 
-    company = db.query(Company).filter(Company.id == user["company_id"]).first()
+    company = company_configs.get(db, user["company_id"])
     now = get_local_now(company)
     today = now.date()
 
-    att = db.query(Attendance).filter(
-        Attendance.employee_id == payload.employee_id,
-        Attendance.date_only == today
-    ).first()
+    att = queries.attendance_day(db, user["company_id"], payload.employee_id, today).first()
 
     if not att:
         return {"status": "error", "message": "Must check in first"}
 
-    if company and company.work_end_time:
-        try:
-            end_time_dt = datetime.strptime(company.work_end_time, "%H:%M").time()
-            if now.time() < end_time_dt:
-                return {"status": "error", "message": f"Cannot check out before {company.work_end_time}"}
-        except Exception:
-            pass
+    if company and company.work_end and now.time() < company.work_end:
+        return {"status": "error", "message": f"Cannot check out before {company.work_end_time}"}
 
+    before = snapshot(att)
     att.check_out_time = now
     att.type = "check_out"
+    record_change(db, before, snapshot(att))
     db.commit()
     return {"status": "success", "message": "Checked out successfully"}
 
@@ -210,22 +211,21 @@ def emergency_checkout(
     if payload.employee_id != user["sub"]:
         raise HTTPException(403, "Not authorized")
 
-    company = db.query(Company).filter(Company.id == user["company_id"]).first()
+    company = company_configs.get(db, user["company_id"])
     now = get_local_now(company)
     today = now.date()
 
-    att = db.query(Attendance).filter(
-        Attendance.employee_id == payload.employee_id,
-        Attendance.date_only == today
-    ).first()
+    att = queries.attendance_day(db, user["company_id"], payload.employee_id, today).first()
 
     if not att:
         return {"status": "error", "message": "Must check in first"}
 
+    before = snapshot(att)
     att.check_out_time = now
     att.type = "check_out"
     att.is_emergency_checkout = True
     att.emergency_checkout_reason = payload.reason
+    record_change(db, before, snapshot(att))
     
     db.commit()
     return {"status": "success", "message": "Emergency checkout recorded"}
@@ -238,21 +238,18 @@ def submit_excuse(
     user: dict = Depends(get_current_employee)
 ):
     emp_id = payload.employee_id or user.get("sub")
-    company = db.query(Company).filter(Company.id == user["company_id"]).first()
+    company = company_configs.get(db, user["company_id"])
     now = get_local_now(company)
     today = now.date()
     
     # 1. Try to find today's attendance
-    att = db.query(Attendance).filter(
-        Attendance.employee_id == emp_id,
-        Attendance.date_only == today
-    ).first()
+    att = queries.attendance_day(db, user["company_id"], emp_id, today).first()
     
     # 2. Fallback if midnight crossed between check-in and excuse submission
     if not att:
-        att = db.query(Attendance).filter(
-            Attendance.employee_id == emp_id
-        ).order_by(Attendance.timestamp.desc()).first()
+        att = queries.attendance_history(db, user["company_id"], emp_id).order_by(
+            Attendance.date_only.desc(), Attendance.timestamp.desc()
+        ).first()
         
         if not att:
             raise HTTPException(404, "No attendance record found to attach reason")
@@ -271,22 +268,15 @@ def request_short_leave(
     if payload.employee_id != user["sub"]:
         raise HTTPException(403, "Not authorized")
 
-    company = db.query(Company).filter(Company.id == user["company_id"]).first()
+    company = company_configs.get(db, user["company_id"])
     now = get_local_now(company)
     today = now.date()
 
-    att = db.query(Attendance).filter(
-        Attendance.employee_id == payload.employee_id,
-        Attendance.date_only == today
-    ).first()
+    att = queries.attendance_day(db, user["company_id"], payload.employee_id, today).first()
     if not att:
         return {"status": "error", "message": "Must check in for the day first"}
 
-    active_leave = db.query(ShortLeave).filter(
-        ShortLeave.employee_id == payload.employee_id,
-        ShortLeave.date_only == today,
-        ShortLeave.return_time == None
-    ).first()
+    active_leave = queries.active_short_leave(db, user["company_id"], payload.employee_id, today).first()
     if active_leave:
         return {"status": "error", "message": "You are already on an active short leave"}
 
@@ -298,6 +288,7 @@ def request_short_leave(
         exit_time=now
     )
     db.add(new_leave)
+    add_counts(db, user["company_id"], today, short_leaves=1, on_short_leave=1)
     db.commit()
     return {"status": "success", "message": "Short leave door unlocked for exit"}
 
@@ -310,20 +301,17 @@ def return_short_leave(
     if payload.employee_id != user["sub"]:
         raise HTTPException(403, "Not authorized")
 
-    company = db.query(Company).filter(Company.id == user["company_id"]).first()
+    company = company_configs.get(db, user["company_id"])
     now = get_local_now(company)
     today = now.date()
 
-    active_leave = db.query(ShortLeave).filter(
-        ShortLeave.employee_id == payload.employee_id,
-        ShortLeave.date_only == today,
-        ShortLeave.return_time == None
-    ).first()
+    active_leave = queries.active_short_leave(db, user["company_id"], payload.employee_id, today).first()
 
     if not active_leave:
         return {"status": "error", "message": "No active short leave found to return from"}
 
     active_leave.return_time = now
+    add_counts(db, active_leave.company_id, active_leave.date_only, on_short_leave=-1)
     db.commit()
     return {"status": "success", "message": "Door unlocked for entry. Welcome back!"}
 
@@ -332,13 +320,10 @@ def get_today_short_leaves(
     db: Session = Depends(get_db),
     user: dict = Depends(get_current_employee)
 ):
-    company = db.query(Company).filter(Company.id == user["company_id"]).first()
+    company = company_configs.get(db, user["company_id"])
     today = get_local_now(company).date()
     
-    leaves = db.query(ShortLeave).filter(
-        ShortLeave.employee_id == user["sub"],
-        ShortLeave.date_only == today
-    ).order_by(ShortLeave.exit_time.asc()).all()
+    leaves = queries.short_leaves_on(db, user["company_id"], user["sub"], today).all()
     
     return [
         {
@@ -352,17 +337,21 @@ def get_today_short_leaves(
 @router.post("/api/tracking/start")
 def start_tracking(
     payload: TrackingStart,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     user: dict = Depends(get_current_employee)
 ):
-    emp = db.query(Employee).filter(Employee.employee_id == payload.employee_id).first()
-    company = db.query(Company).filter(Company.id == emp.company_id).first()
+    emp = db.query(Employee).filter(
+        Employee.employee_id == payload.employee_id,
+        Employee.company_id == user["company_id"]
+    ).first()
+    if not emp:
+        raise HTTPException(404, "User not found")
+    company = company_configs.get(db, emp.company_id)
     now = get_local_now(company)
     
-    db.query(DepartmentSession).filter(
-        DepartmentSession.employee_id == emp.id, 
-        DepartmentSession.active == True
-    ).update({"active": False, "end_time": now})
+    ended = [sid for (sid,) in queries.active_sessions(db, emp.id).with_entities(DepartmentSession.id)]
+    queries.active_sessions(db, emp.id).update({"active": False, "end_time": now})
     
     sess = DepartmentSession(
         employee_id=emp.id, 
@@ -373,32 +362,131 @@ def start_tracking(
     )
     db.add(sess)
     db.commit()
+
+    session_registry.end(ended)
+    session_registry.put(SessionEntry(
+        session_id=sess.id,
+        employee_id=emp.id,
+        employee_code=emp.employee_id,
+        name=emp.name,
+        role=emp.role,
+        company_id=emp.company_id,
+        tz=get_company_tz(company),
+        active=True
+    ))
+
+    # Summarise the closed sessions after the response is sent
+    if ended:
+        background_tasks.add_task(summarize_sessions, ended)
     return {"status": "success", "session_id": sess.id}
 
+def publish_live_position(company_id: int, employee_code: str, name: str, role: str, fix: dict):
+    """Pushes the fix to open dashboard streams (same shape and filter as /company/tracking/live)"""
+    if not tracking_hub.has_subscribers(company_id) or "marketing" not in (role or "").lower():
+        return
+    tracking_hub.publish(company_id, [{
+        "id": employee_code,
+        "name": name,
+        "role": role,
+        "lat": fix["latitude"],
+        "lon": fix["longitude"],
+        "last_seen": fix["recorded_at"].isoformat()
+    }])
+
+def get_owned_session(db: Session, session_id: int, user: dict, require_active: bool = True) -> SessionEntry:
+    """Registry lookup; the session must belong to the caller (and be open, for live pings)"""
+    entry = session_registry.get(db, session_id)
+    if not entry or not entry.owned_by(user):
+        raise HTTPException(404, "Tracking session not found")
+    if require_active and not entry.active:
+        raise HTTPException(409, "Tracking session has ended")
+    return entry
+
 @router.post("/api/tracking/update")
-def update_location(payload: LocationUpdate, db: Session = Depends(get_db)):
-    session = db.query(DepartmentSession).filter(DepartmentSession.id == payload.session_id).first()
-    company = db.query(Company).filter(Company.id == session.company_id).first() if session else None
-    now = get_local_now(company)
+def update_location(
+    payload: LocationUpdate,
+    db: Session = Depends(get_db),
+    user: dict = Depends(get_current_employee)
+):
+    entry = get_owned_session(db, payload.session_id, user)
+    now = entry.local_now()
+
+    fix = {
+        "employee_id": entry.employee_id,
+        "company_id": entry.company_id,
+        "session_id": payload.session_id,
+        "latitude": payload.lat,
+        "longitude": payload.lng,
+        "status": payload.status,
+        "recorded_at": now
+    }
 
-    db.add(LocationLog(
-        session_id=payload.session_id,
-        latitude=payload.lat,
-        longitude=payload.lng,
-        status=payload.status,
-        recorded_at=now
-    ))
-    db.commit()
-    return {"status": "success"}
+    # Acknowledge now, insert with the next batch (full buffer = write inline)
+    if not (settings.LOCATION_BUFFER_ENABLED and location_writer.submit(fix)):
+        write_fixes(db, [fix])
+        db.commit()
+
+    publish_live_position(entry.company_id, entry.employee_code, entry.name, entry.role, fix)
+    site = geofence_cache.get(db, entry.company_id).locate(payload.lat, payload.lng)
+    return {"status": "success", "inside_geofence": site is not None, "site": site.name if site else None}
 
-@router.get("/api/history", response_model=List[AttendanceHistoryItem])
+@router.post("/api/tracking/update/batch")
+def update_location_batch(
+    payload: LocationBatch,
+    db: Session = Depends(get_db),
+    user: dict = Depends(get_current_employee)
+):
+    if len(payload.fixes) > settings.TRACKING_BATCH_MAX_FIXES:
+        raise HTTPException(413, f"Batch too large (max {settings.TRACKING_BATCH_MAX_FIXES} fixes)")
+
+    # Validate the session once for the whole batch (offline replay may arrive after it closed)
+    entry = get_owned_session(db, payload.session_id, user, require_active=False)
+    tz = entry.tz
+    now = entry.local_now()
+    oldest = now - timedelta(hours=settings.TRACKING_BATCH_MAX_AGE_HOURS)
+    newest = now + timedelta(minutes=5)  # Phone clock skew
+
+    rows, rejected = [], 0
+    for fix in payload.fixes:
+        # Offline fixes keep their device timestamp, stored as naive company-local time
+        recorded_at = now
+        if fix.recorded_at:
+            recorded_at = fix.recorded_at
+            if recorded_at.tzinfo:
+                recorded_at = recorded_at.astimezone(tz).replace(tzinfo=None)
+        if not oldest <= recorded_at <= newest:
+            rejected += 1
+            continue
+        rows.append({
+            "employee_id": entry.employee_id,
+            "company_id": entry.company_id,
+            "session_id": entry.session_id,
+            "latitude": fix.lat,
+            "longitude": fix.lng,
+            "status": fix.status,
+            "recorded_at": recorded_at
+        })
+
+    if rows:
+        write_fixes(db, rows)
+        db.commit()
+        newest = max(rows, key=lambda r: r["recorded_at"])
+        publish_live_position(entry.company_id, entry.employee_code, entry.name, entry.role, newest)
+    return {"status": "success", "received": len(payload.fixes), "accepted": len(rows), "rejected": rejected}
+
+@router.get("/api/history", response_model=AttendanceHistoryPage)
 def get_my_history(
+    cursor: Optional[str] = None,
+    limit: int = Query(60, ge=1, le=settings.PAGE_MAX_SIZE),
     db: Session = Depends(get_db),
     user: dict = Depends(get_current_employee)
 ):
-    history = db.query(Attendance).filter(
-        Attendance.employee_id == user["sub"]
-    ).order_by(Attendance.date_only.desc()).limit(60).all()
+    try:
+        history, next_cursor = keyset_page(
+            queries.attendance_history(db, user["company_id"], user["sub"]), queries.ATTENDANCE_PAGE_KEYS, cursor, limit
+        )
+    except ValueError:
+        raise HTTPException(400, "Invalid cursor")
     
     results = []
     for record in history:
@@ -413,14 +501,14 @@ def get_my_history(
             "late_reason": getattr(record, 'late_reason', None) 
         })
         
-    return results
+    return {"items": results, "next_cursor": next_cursor}
 
 @router.get("/api/office_config")
 def get_office_config(
     db: Session = Depends(get_db), 
     user: dict = Depends(get_current_employee)
 ):
-    company = db.query(Company).filter(Company.id == user["company_id"]).first()
+    company = company_configs.get(db, user["company_id"])
     
     if not company:
         return {
@@ -430,13 +518,14 @@ def get_office_config(
         }
         
     return {
-        "lat": float(company.office_lat) if company.office_lat else 0.0,
-        "lng": float(company.office_lng) if company.office_lng else 0.0,
-        "radius": float(company.office_radius) if company.office_radius else 50.0,
+        "lat": company.office_lat if company.office_lat is not None else 0.0,
+        "lng": company.office_lng if company.office_lng is not None else 0.0,
+        "radius": company.office_radius if company.office_radius is not None else 50.0,
         "start_time": company.work_start_time, 
         "end_time": company.work_end_time,
-        "timezone": getattr(company, 'timezone', 'UTC'),
-        "super_late_threshold": getattr(company, 'super_late_threshold', 30)
+        "timezone": company.timezone,
+        "super_late_threshold": company.super_late_threshold,
+        "sites": [fence.to_dict() for fence in geofence_cache.get(db, company.id).fences]
     }
 
 @router.get("/api/me/attendance")
@@ -444,7 +533,7 @@ def get_my_attendance(
     current_user: dict = Depends(get_current_employee),
     db: Session = Depends(get_db)
 ):
-    logs = db.query(Attendance).filter(
-        Attendance.employee_id == current_user["sub"]
-    ).order_by(Attendance.timestamp.desc()).limit(60).all()
+    logs = queries.attendance_history(db, current_user["company_id"], current_user["sub"]).order_by(
+        Attendance.date_only.desc(), Attendance.timestamp.desc()
+    ).limit(60).all()
     return logs
\ No newline at end of file
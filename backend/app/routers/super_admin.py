@@ -1,12 +1,28 @@
 import secrets
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+from typing import Optional
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 
 from app.db.database import get_db
-from app.db.models import Company, CompanyAdmin, HardwareDevice, SuperAdmin
+from app.db.models import Company, CompanyAdmin, HardwareDevice, SuperAdmin, DeviceHeartbeat
 from app.schemas.schemas import CompanyCreate, HardwareUpdate, CompanyUpdate
 from app.core.security import get_password_hash
+from app.core.device_cache import device_cache
+from app.core.roster import roster_index
+from app.core.retention import retention_task
+from app.core.heartbeat import heartbeats, heartbeat_flush_task
+from app.core.device_commands import command_broker
+from app.core.scan_dedupe import scan_dedupe
+from app.core.geofence import geofence_cache
+from app.core.session_registry import session_registry
+from app.core.company_config import company_configs
+from app.core.location_buffer import location_writer
+from app.core.tracking_hub import tracking_hub
+from app.core.location_archive import location_compaction_task
+from app.core.location_rollup import location_rollup_task
+from app.core.attendance_summary import rebuild as rebuild_attendance_summary
+from app.routers.hardware import door_writer
 
 router = APIRouter()
 
@@ -52,6 +68,7 @@ def create_company(payload: CompanyCreate, db: Session = Depends(get_db)):
         ))
         
         db.commit()
+        device_cache.invalidate(uid)
         
         return {
             "status": "success",
@@ -72,14 +89,25 @@ def list_companies(db: Session = Depends(get_db)):
 @router.get("/saas/hardware")
 def list_hardware(db: Session = Depends(get_db)):
     # In prod, restrict this to Super Admin Token
-    devices = db.query(HardwareDevice).all()
-    return [{
-        "id": d.id, 
-        "uid": d.device_uid, 
-        "type": d.device_type, 
-        "company": d.company.name,
-        "status": "Online" if d.active else "Offline"
-    } for d in devices]
+    rows = db.query(HardwareDevice, Company.name, DeviceHeartbeat.last_seen_at).join(
+        Company, Company.id == HardwareDevice.company_id
+    ).outerjoin(
+        DeviceHeartbeat, DeviceHeartbeat.device_uid == HardwareDevice.device_uid
+    ).all()
+
+    result = []
+    for d, company_name, persisted in rows:
+        last_seen = heartbeats.last_seen(d.device_uid, persisted)
+        online = d.active and heartbeats.is_online(last_seen)
+        result.append({
+            "id": d.id, 
+            "uid": d.device_uid, 
+            "type": d.device_type, 
+            "company": company_name,
+            "status": "Online" if online else ("Offline" if d.active else "Disabled"),
+            "last_seen": last_seen.isoformat() if last_seen else None
+        })
+    return result
 
 # 4. SETUP OWNER (Run once)
 @router.get("/setup-owner")
@@ -94,6 +122,55 @@ def setup_owner(db: Session = Depends(get_db)):
     db.commit()
     return {"message": "Owner created: owner / owner123"}
 
+# 5. DOOR PATH METRICS
+@router.get("/saas/metrics")
+def get_metrics():
+    # In prod, restrict this to Super Admin Token
+    return {
+        "device_cache": device_cache.stats(),
+        "roster_index": roster_index.stats(),
+        "door_writer": door_writer.stats(),
+        "location_writer": location_writer.stats(),
+        "tracking_stream": tracking_hub.stats(),
+        "retention_job": retention_task.stats(),
+        "location_compaction_job": location_compaction_task.stats(),
+        "location_rollup_job": location_rollup_task.stats(),
+        "heartbeats": {**heartbeats.stats(), "flush_job": heartbeat_flush_task.stats()},
+        "device_commands": command_broker.stats(),
+        "scan_dedupe": scan_dedupe.stats(),
+        "geofences": geofence_cache.stats(),
+        "tracking_sessions": session_registry.stats(),
+        "company_configs": company_configs.stats()
+    }
+
+@router.post("/saas/maintenance/door-retention")
+def run_door_retention():
+    # In prod, restrict this to Super Admin Token
+    return {"status": "success", **(retention_task.run_once() or {})}
+
+@router.post("/saas/maintenance/location-compaction")
+def run_location_compaction():
+    # In prod, restrict this to Super Admin Token
+    return {"status": "success", **(location_compaction_task.run_once() or {})}
+
+@router.post("/saas/maintenance/location-rollup")
+def run_location_rollup():
+    # In prod, restrict this to Super Admin Token
+    return {"status": "success", **(location_rollup_task.run_once() or {})}
+
+# Backfill / repair of the daily attendance counters (all companies when company_id is omitted)
+@router.post("/saas/maintenance/attendance-summary")
+def run_attendance_summary_rebuild(
+    company_id: Optional[int] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    db: Session = Depends(get_db)
+):
+    # In prod, restrict this to Super Admin Token
+    result = rebuild_attendance_summary(db, company_id, start, end)
+    db.commit()
+    return {"status": "success", **result}
+
 # [NEW FEATURE 1: DELETE COMPANY]
 @router.delete("/saas/companies/{company_id}")
 def delete_company(company_id: int, db: Session = Depends(get_db)):
@@ -110,8 +187,15 @@ def delete_company(company_id: int, db: Session = Depends(get_db)):
     devices = db.query(HardwareDevice).filter(HardwareDevice.company_id == company_id).all()
     for d in devices:
         d.active = False
+    device_uids = [d.device_uid for d in devices]
 
+    roster_index.publish(db, company_id)
     db.commit()
+    for uid in device_uids:
+        device_cache.invalidate(uid)
+    roster_index.set_company_status(company_id, "deleted")
+    company_configs.invalidate(company_id)
+    session_registry.invalidate_company(company_id)
     return {"status": "success", "message": f"Company '{company.name}' deleted."}
 
 # [NEW FEATURE 2: UPDATE HARDWARE]
@@ -123,7 +207,9 @@ def update_hardware(device_id: int, payload: HardwareUpdate, db: Session = Depen
     
     # Update the type
     device.device_type = payload.device_type
+    device_uid = device.device_uid
     db.commit()
+    device_cache.invalidate(device_uid)
     
     return {"status": "success", "message": "Hardware settings updated"}
 
@@ -147,6 +233,10 @@ def update_company(company_id: int, payload: CompanyUpdate, db: Session = Depend
         if payload.status not in ["active", "suspended"]:
              raise HTTPException(400, "Invalid Status")
         company.status = payload.status
+        roster_index.publish(db, company_id)  # Other workers re-read the status at commit
 
     db.commit()
+    company_configs.invalidate(company_id)
+    if payload.status:
+        roster_index.set_company_status(company_id, payload.status)
     return {"status": "success", "message": f"Company '{company.name}' updated."}
\ No newline at end of file
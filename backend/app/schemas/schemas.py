@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, model_validator
 from typing import Optional, List
 from datetime import datetime
 
@@ -14,6 +14,7 @@ class TokenData(BaseModel):
     username: Optional[str] = None
     role: Optional[str] = None
     company_id: Optional[int] = None
+    expires_at: Optional[int] = None  # JWT exp (epoch seconds)
 
 class LoginRequest(BaseModel):
     employee_id: str
@@ -57,6 +58,8 @@ class EmployeeResponse(BaseModel):
 class AttendanceMark(BaseModel):
     employee_id: str
     location: str
+    lat: Optional[float] = None  # Preferred over parsing "lat,lng" out of location
+    lng: Optional[float] = None
 
 class TrackingStart(BaseModel):
     employee_id: str
@@ -68,6 +71,16 @@ class LocationUpdate(BaseModel):
     lng: float
     status: str
 
+class LocationFix(BaseModel):
+    lat: float
+    lng: float
+    status: str
+    recorded_at: Optional[datetime] = None  # Device clock; naive = company local time
+
+class LocationBatch(BaseModel):
+    session_id: int
+    fixes: List[LocationFix]
+
 class ManualAttendance(BaseModel):
     employee_id: str
     timestamp: datetime
@@ -95,6 +108,29 @@ class OfficeSettings(BaseModel):
     lng: str
     radius: str
 
+class GeofenceSiteCreate(BaseModel):
+    name: str
+    kind: str = "circle"  # circle | polygon
+    lat: Optional[float] = None
+    lng: Optional[float] = None
+    radius_m: Optional[float] = None
+    polygon: Optional[List[List[float]]] = None  # [[lat, lng], ...]
+
+    @model_validator(mode="after")
+    def check_shape(self):
+        if self.kind == "circle":
+            if self.lat is None or self.lng is None or not self.radius_m or self.radius_m <= 0:
+                raise ValueError("circle needs lat, lng and a positive radius_m")
+        elif self.kind == "polygon":
+            if not self.polygon or len(self.polygon) < 3 or any(len(p) != 2 for p in self.polygon):
+                raise ValueError("polygon needs at least 3 [lat, lng] points")
+        else:
+            raise ValueError("kind must be 'circle' or 'polygon'")
+        return self
+
+class RetentionSettings(BaseModel):
+    retention_days: int  # 0 = keep raw door events forever
+
 class HardwareUpdate(BaseModel):
     device_type: str
 
@@ -102,9 +138,16 @@ class HardwareLog(BaseModel):
     employee_code: str
     time_iso: str
 
+class HardwareLogBatch(BaseModel):
+    logs: List[HardwareLog]
+
 class EmergencyOpen(BaseModel):
     device_id: int
     reason: str
+    company_id: Optional[int] = None  # Sent by the super admin console
+
+class DeviceCommandAck(BaseModel):
+    ids: List[str]  # DeviceCommand ids the device received
 
 class ScheduleUpdate(BaseModel):
     start_time: str 
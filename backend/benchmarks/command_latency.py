@@ -0,0 +1,136 @@
+"""
+Emergency-open delivery benchmark: admin click -> device release.
+
+Starts the app on a real uvicorn server, parks --parked devices on
+GET /integrations/device/commands (long-poll), then fires --clicks admin
+POST /company/devices/emergency-open requests at random parked devices.
+For each click it measures the time from sending the admin request until the
+target device's poll returns the UNLOCK command, plus the admin call itself.
+
+Usage (from backend/):
+
+    python -m benchmarks.command_latency --parked 2000 --clicks 200
+"""
+import argparse
+import asyncio
+import logging
+import random
+import time
+
+from benchmarks.common import configure_database, reset_schema, seed, start_server, summarize, write_report
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", help="Defaults to a throwaway SQLite file")
+    parser.add_argument("--reset", action="store_true", help="Allow wiping a non-SQLite database")
+    parser.add_argument("--parked", type=int, default=1000, help="Devices holding a long-poll open")
+    parser.add_argument("--clicks", type=int, default=100, help="Emergency-open requests to send")
+    parser.add_argument("--click-interval-ms", type=float, default=20)
+    parser.add_argument("--poll-timeout", type=int, default=25)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", default="command_latency.json")
+    return parser.parse_args()
+
+
+async def run(args, base_url: str, devices: list, admin_token: str) -> dict:
+    import httpx
+
+    rng = random.Random(args.seed)
+    released = {}  # command_id -> perf_counter when the device got it
+    stop = asyncio.Event()
+    parked = asyncio.Semaphore(0)
+
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    timeout = httpx.Timeout(args.poll_timeout + 10)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=timeout) as client:
+
+        async def device_loop(device_id: int, uid: str, key: str):
+            headers = {"X-DEVICE-ID": uid, "X-DEVICE-KEY": key}
+            first, acks = True, []
+            while not stop.is_set():
+                params = {"timeout": args.poll_timeout, **({"ack": ",".join(acks)} if acks else {})}
+                request = client.get("/integrations/device/commands", params=params, headers=headers)
+                task = asyncio.ensure_future(request)
+                if first:
+                    await asyncio.sleep(0.05)  # Give the request time to reach the server
+                    parked.release()
+                    first = False
+                res = await task
+                now = time.perf_counter()
+                acks = []
+                for command in res.json().get("commands", []):
+                    released.setdefault(command["id"], now)
+                    acks.append(command["id"])
+
+        pollers = [asyncio.create_task(device_loop(*d)) for d in devices]
+        for _ in devices:
+            await parked.acquire()
+        await asyncio.sleep(0.5)
+
+        admin_headers = {"Authorization": f"Bearer {admin_token}"}
+        clicks = []  # (command_id, click started, admin latency ms, device was parked)
+        for _ in range(args.clicks):
+            device_id = rng.choice(devices)[0]
+            started = time.perf_counter()
+            res = await client.post("/company/devices/emergency-open", headers=admin_headers,
+                                    json={"device_id": device_id, "reason": "benchmark"})
+            body = res.json()
+            clicks.append((body.get("command_id"), started, (time.perf_counter() - started) * 1000, body.get("device_waiting")))
+            await asyncio.sleep(args.click_interval_ms / 1000)
+
+        await asyncio.sleep(1.0)
+        stop.set()
+        for task in pollers:
+            task.cancel()
+        await asyncio.gather(*pollers, return_exceptions=True)
+
+    delivery = [(released[cid] - started) * 1000 for cid, started, _, _ in clicks if cid in released]
+    missed = sum(1 for cid, *_ in clicks if cid not in released)
+    wall = args.clicks * args.click_interval_ms / 1000 or 1
+    return {
+        "click_to_release": summarize(delivery, missed, wall),
+        "admin_request": summarize([c[2] for c in clicks], 0, wall),
+        "clicks_with_parked_device": sum(1 for c in clicks if c[3]),
+    }
+
+
+def main():
+    args = parse_args()
+    database_url = configure_database(args.database_url, env={"RETENTION_JOB_ENABLED": "false"})
+    logging.disable(logging.INFO)
+
+    from app.core.security import create_access_token
+    from app.db.database import engine, SessionLocal
+    from app.db.models import HardwareDevice
+    from app.main import app
+
+    reset_schema(engine, args.reset)
+    data = seed(engine, companies=1, employees=10, devices=args.parked, days=0)
+    tenant = data["tenants"][0]
+
+    db = SessionLocal()
+    ids = dict(db.query(HardwareDevice.device_uid, HardwareDevice.id))
+    db.close()
+    devices = [(ids[uid], uid, key) for uid, key in tenant["devices"]]
+    admin_token = create_access_token(tenant["admin_username"], "admin", tenant["company_id"])
+
+    server, thread, base_url = start_server(app)
+    try:
+        results = asyncio.run(run(args, base_url, devices, admin_token))
+    finally:
+        server.should_exit = True
+        thread.join(10)
+
+    params = {k: v for k, v in vars(args).items() if k not in ("database_url", "output")}
+    write_report(args.output, "command_latency", params, results, database_url)
+
+    r = results["click_to_release"]
+    print(f"parked={args.parked} clicks={args.clicks} click->release p50={r['p50_ms']:.2f}ms "
+          f"p95={r['p95_ms']:.2f}ms p99={r['p99_ms']:.2f}ms missed={r['errors']} "
+          f"(device parked at click: {results['clicks_with_parked_device']}/{args.clicks})")
+    print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
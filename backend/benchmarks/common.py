@@ -0,0 +1,227 @@
+"""
+Shared helpers for the benchmark scripts in this folder.
+
+Import `configure_database()` BEFORE anything from `app`, because
+app.core.config reads DATABASE_URL (and the feature flags) at import time.
+"""
+import json
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+
+def configure_database(database_url: str = None, env: dict = None) -> str:
+    """Points the app at `database_url` (or a throwaway SQLite file) and applies env overrides"""
+    if not database_url:
+        tmp = tempfile.mkdtemp(prefix="attendance-bench-")
+        database_url = f"sqlite:///{tmp}/bench.db"
+    os.environ["DATABASE_URL"] = database_url
+    for key, value in (env or {}).items():
+        os.environ[key] = str(value)
+    return database_url
+
+
+def reset_schema(engine, allow_reset: bool):
+    from app.db.database import Base
+    from app.db.migrations import migrate
+    from app.db.models import Company
+
+    if engine.dialect.name != "sqlite" and not allow_reset:
+        with engine.connect() as conn:
+            if engine.dialect.has_table(conn, Company.__tablename__):
+                raise SystemExit("Refusing to wipe a non-SQLite database without --reset")
+    Base.metadata.drop_all(bind=engine)
+    migrate(engine)
+
+
+# --- SEEDING ---
+def seed(engine, companies: int, employees: int, devices: int, days: int,
+         device_type: str = "ESP32", batch_size: int = 5000, marketing_every: int = 10) -> dict:
+    """
+    Bulk-seeds tenants with `employees` staff and `devices` scanners each,
+    plus `days` of historical attendance per employee (ending yesterday).
+    Every `marketing_every`-th employee gets the tracked "Marketing" role.
+    Returns the credentials the traffic generators need.
+    """
+    from sqlalchemy import insert
+    from app.core.security import get_password_hash
+    from app.db.models import Company, CompanyAdmin, Employee, HardwareDevice, Attendance
+
+    password_hash = get_password_hash("bench")
+    today = datetime.now().date()
+    tenants = []
+
+    with engine.begin() as conn:
+        for c in range(companies):
+            company_id = conn.execute(insert(Company).values(
+                name=f"Bench Co {c}", status="active", valid_until=today + timedelta(days=365)
+            )).inserted_primary_key[0]
+            conn.execute(insert(CompanyAdmin).values(
+                company_id=company_id, username=f"bench_admin_{c}", password="bench"
+            ))
+
+            device_rows = [{
+                "company_id": company_id,
+                "device_uid": f"BENCH_{c}_{d}",
+                "device_type": device_type,
+                "location": f"Gate {d}",
+                "secret_key": f"bench-key-{c}-{d}",
+                "active": True
+            } for d in range(devices)]
+            conn.execute(insert(HardwareDevice), device_rows)
+
+            codes = [f"B{c}E{e}" for e in range(employees)]
+            conn.execute(insert(Employee), [{
+                "company_id": company_id,
+                "employee_id": code,
+                "name": f"Bench Employee {code}",
+                "password_hash": password_hash,
+                "status": "active",
+                "role": "Marketing" if e % marketing_every == 0 else "Staff"
+            } for e, code in enumerate(codes)])
+
+            history = []
+            for day in range(1, days + 1):
+                date_only = today - timedelta(days=day)
+                check_in = datetime.combine(date_only, datetime.min.time()) + timedelta(hours=9)
+                for code in codes:
+                    history.append({
+                        "company_id": company_id,
+                        "employee_id": code,
+                        "timestamp": check_in,
+                        "date_only": date_only,
+                        "status": "Present",
+                        "location": "Bench",
+                        "source": "HARDWARE",
+                        "check_in_time": check_in,
+                        "check_out_time": check_in + timedelta(hours=8)
+                    })
+                    if len(history) >= batch_size:
+                        conn.execute(insert(Attendance), history)
+                        history = []
+            if history:
+                conn.execute(insert(Attendance), history)
+
+            tenants.append({
+                "company_id": company_id,
+                "admin_username": f"bench_admin_{c}",
+                "employee_codes": codes,
+                "devices": [(r["device_uid"], r["secret_key"]) for r in device_rows]
+            })
+
+    return {"tenants": tenants}
+
+
+# --- MEASUREMENT ---
+class QueryCounter:
+    """Counts every statement the engine executes (all threads)"""
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+        self.count = 0
+        self._lock = threading.Lock()
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args):
+        with self._lock:
+            self.count += 1
+
+    def reset(self) -> int:
+        with self._lock:
+            count, self.count = self.count, 0
+        return count
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct / 100
+    lo, hi = int(k), min(int(k) + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def summarize(latencies_ms: list, errors: int, wall_seconds: float, queries: int = None) -> dict:
+    values = sorted(latencies_ms)
+    result = {
+        "requests": len(values),
+        "errors": errors,
+        "throughput_rps": round(len(values) / wall_seconds, 2) if wall_seconds else 0.0,
+        "mean_ms": round(statistics.fmean(values), 3) if values else 0.0,
+        "p50_ms": round(percentile(values, 50), 3),
+        "p95_ms": round(percentile(values, 95), 3),
+        "p99_ms": round(percentile(values, 99), 3),
+        "max_ms": round(values[-1], 3) if values else 0.0,
+    }
+    if queries is not None:
+        result["db_queries"] = queries
+        result["queries_per_request"] = round(queries / len(values), 2) if values else 0.0
+    return result
+
+
+def run_concurrent(fn, jobs: list, concurrency: int):
+    """Calls fn(job) for every job on `concurrency` threads; returns (latencies_ms, errors, wall_seconds)"""
+    from concurrent.futures import ThreadPoolExecutor
+
+    latencies, errors = [], 0
+    lock = threading.Lock()
+
+    def timed(job):
+        nonlocal errors
+        started = time.perf_counter()
+        ok = fn(job)
+        elapsed = (time.perf_counter() - started) * 1000
+        with lock:
+            latencies.append(elapsed)
+            if not ok:
+                errors += 1
+
+    wall_started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(timed, jobs))
+    return latencies, errors, time.perf_counter() - wall_started
+
+
+# --- REAL HTTP SERVER (for long-poll / streaming benchmarks) ---
+def start_server(app, host: str = "127.0.0.1"):
+    """Runs uvicorn on a free port in a background thread; returns (server, thread, base_url)"""
+    import socket
+    import uvicorn
+
+    with socket.socket() as sock:
+        sock.bind((host, 0))
+        port = sock.getsockname()[1]
+
+    server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning", backlog=4096))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, thread, f"http://{host}:{port}"
+
+
+# --- REPORTING ---
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return "unknown"
+
+
+def write_report(path: str, name: str, params: dict, results: dict, database_url: str):
+    report = {
+        "benchmark": name,
+        "created_at": datetime.utcnow().isoformat() + "Z",
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "database": database_url.split("://")[0],
+        "params": params,
+        "results": results,
+    }
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    return report
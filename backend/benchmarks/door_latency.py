@@ -0,0 +1,146 @@
+"""
+Door-open latency benchmark.
+
+Runs the FastAPI app from app/main.py in-process against a seeded database and
+drives concurrent traffic at the two check-in paths:
+
+    POST /integrations/zkteco/push-log   (hardware scans)
+    POST /api/mark_attendance            (mobile check-ins)
+
+Reports p50/p95/p99 latency, throughput and DB queries per request for each
+endpoint and writes the results as JSON so runs can be compared.
+
+Usage (from backend/):
+
+    python -m benchmarks.door_latency --employees 2000 --days 60 --requests 5000
+    python -m benchmarks.door_latency --database-url postgresql://localhost/bench --reset
+    python -m benchmarks.door_latency --write-behind --output wb.json
+    python -m benchmarks.door_latency --double-fire 0.3   # readers re-sending the same finger
+"""
+import argparse
+import logging
+import random
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from benchmarks.common import (
+    configure_database, reset_schema, seed, QueryCounter,
+    run_concurrent, summarize, write_report
+)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", help="Defaults to a throwaway SQLite file")
+    parser.add_argument("--reset", action="store_true", help="Allow wiping a non-SQLite database")
+    parser.add_argument("--companies", type=int, default=2)
+    parser.add_argument("--employees", type=int, default=500, help="Employees per company")
+    parser.add_argument("--devices", type=int, default=4, help="Devices per company")
+    parser.add_argument("--days", type=int, default=30, help="Historical attendance days per employee")
+    parser.add_argument("--requests", type=int, default=2000, help="Measured requests per endpoint")
+    parser.add_argument("--warmup", type=int, default=50, help="Unmeasured requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--write-behind", action="store_true", help="Benchmark with DOOR_WRITE_BEHIND=true")
+    parser.add_argument("--double-fire", type=float, default=0.0,
+                        help="Fraction of scans the reader sends twice back to back (absorbed by the dedupe window)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="door_latency.json")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    database_url = configure_database(args.database_url, env={
+        "DOOR_WRITE_BEHIND": "true" if args.write_behind else "false",
+        "WRITE_BEHIND_SPILL_DIR": tempfile.mkdtemp(prefix="attendance-bench-spill-")
+    })
+    logging.disable(logging.INFO)
+
+    from fastapi.testclient import TestClient
+    from app.core.security import create_access_token
+    from app.core.scan_dedupe import scan_dedupe
+    from app.db.database import engine
+    from app.main import app
+
+    rng = random.Random(args.seed)
+    reset_schema(engine, args.reset)
+
+    started = time.perf_counter()
+    data = seed(engine, args.companies, args.employees, args.devices, args.days)
+    print(f"Seeded {args.companies} companies x {args.employees} employees x {args.days} days "
+          f"in {time.perf_counter() - started:.1f}s")
+
+    counter = QueryCounter(engine)
+    results = {}
+
+    with TestClient(app) as client:
+        # --- /integrations/zkteco/push-log ---
+        def scan_job():
+            tenant = rng.choice(data["tenants"])
+            uid, key = rng.choice(tenant["devices"])
+            return ({"X-DEVICE-ID": uid, "X-DEVICE-KEY": key}, rng.choice(tenant["employee_codes"]))
+
+        def scan_jobs(n):
+            jobs = []
+            while len(jobs) < n:
+                job = scan_job()
+                jobs.append(job)
+                if rng.random() < args.double_fire:
+                    jobs.append(job)
+            return jobs[:n]
+
+        def push_log(job):
+            headers, code = job
+            res = client.post("/integrations/zkteco/push-log", headers=headers, json={
+                "employee_code": code,
+                "time_iso": datetime.now(timezone.utc).isoformat()
+            })
+            return res.status_code == 200 and res.json().get("open_door") is True
+
+        run_concurrent(push_log, scan_jobs(args.warmup), args.concurrency)
+        counter.reset()
+        latencies, errors, wall = run_concurrent(push_log, scan_jobs(args.requests), args.concurrency)
+        results["push_log"] = summarize(latencies, errors, wall, counter.reset())
+        results["push_log"]["scan_dedupe"] = scan_dedupe.stats()
+
+        # --- /api/mark_attendance ---
+        employees = [
+            (tenant["company_id"], code)
+            for tenant in data["tenants"] for code in tenant["employee_codes"]
+        ]
+        rng.shuffle(employees)
+        tokens = {}
+
+        def check_in_job(i):
+            company_id, code = employees[i % len(employees)]
+            if code not in tokens:
+                tokens[code] = create_access_token(code, "employee", company_id)
+            return ({"Authorization": f"Bearer {tokens[code]}"}, code)
+
+        def mark_attendance(job):
+            headers, code = job
+            res = client.post("/api/mark_attendance", headers=headers, json={
+                "employee_id": code,
+                "location": "23.8103,90.4125"
+            })
+            # "Already checked in" is a valid answer once every employee has checked in
+            return res.status_code == 200
+
+        jobs = [check_in_job(i) for i in range(args.warmup + args.requests)]
+        run_concurrent(mark_attendance, jobs[:args.warmup], args.concurrency)
+        counter.reset()
+        latencies, errors, wall = run_concurrent(mark_attendance, jobs[args.warmup:], args.concurrency)
+        results["mark_attendance"] = summarize(latencies, errors, wall, counter.reset())
+
+    params = {k: v for k, v in vars(args).items() if k not in ("database_url", "output")}
+    write_report(args.output, "door_latency", params, results, database_url)
+
+    for endpoint, r in results.items():
+        print(f"{endpoint:16} p50={r['p50_ms']:.2f}ms p95={r['p95_ms']:.2f}ms p99={r['p99_ms']:.2f}ms "
+              f"rps={r['throughput_rps']:.0f} queries/req={r['queries_per_request']} errors={r['errors']}")
+    print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
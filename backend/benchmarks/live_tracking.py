@@ -0,0 +1,114 @@
+"""
+Live tracking map benchmark.
+
+Seeds one company with --employees tracked ("Marketing") staff, each with a
+tracking session and --fixes location history rows, then measures
+GET /company/tracking/live (latency + DB queries per request).
+
+Usage (from backend/):
+
+    python -m benchmarks.live_tracking --employees 10000 --fixes 50
+"""
+import argparse
+import logging
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.common import (
+    configure_database, reset_schema, seed, QueryCounter,
+    run_concurrent, summarize, write_report
+)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", help="Defaults to a throwaway SQLite file")
+    parser.add_argument("--reset", action="store_true", help="Allow wiping a non-SQLite database")
+    parser.add_argument("--employees", type=int, default=10000, help="Tracked employees")
+    parser.add_argument("--fixes", type=int, default=50, help="LocationLog rows per employee")
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--output", default="live_tracking.json")
+    return parser.parse_args()
+
+
+def seed_tracking(engine, company_id: int, fixes: int, batch_size: int = 20000):
+    from sqlalchemy import insert, select
+    from app.db.models import DepartmentSession, Employee, LocationLog
+    from app.core.positions import backfill_positions
+    from app.db.database import SessionLocal
+
+    start = datetime.now().replace(microsecond=0) - timedelta(hours=8)
+    with engine.begin() as conn:
+        employee_ids = conn.execute(select(Employee.id).where(Employee.company_id == company_id)).scalars().all()
+        conn.execute(insert(DepartmentSession), [{
+            "employee_id": emp_id, "company_id": company_id, "department": "Marketing",
+            "start_time": start, "active": True
+        } for emp_id in employee_ids])
+        sessions = conn.execute(select(DepartmentSession.id)).scalars().all()
+
+        rows = []
+        for n, session_id in enumerate(sessions):
+            for i in range(fixes):
+                rows.append({
+                    "session_id": session_id,
+                    "latitude": 23.8 + (n % 100) / 1000 + i / 10000,
+                    "longitude": 90.4 + (n // 100) / 1000,
+                    "status": "moving",
+                    "recorded_at": start + timedelta(seconds=30 * i)
+                })
+                if len(rows) >= batch_size:
+                    conn.execute(insert(LocationLog), rows)
+                    rows = []
+        if rows:
+            conn.execute(insert(LocationLog), rows)
+
+    db = SessionLocal()
+    try:
+        return backfill_positions(db)
+    finally:
+        db.close()
+
+
+def main():
+    args = parse_args()
+    database_url = configure_database(args.database_url, env={"RETENTION_JOB_ENABLED": "false"})
+    logging.disable(logging.INFO)
+
+    from fastapi.testclient import TestClient
+    from app.core.security import create_access_token
+    from app.db.database import engine
+    from app.main import app
+
+    reset_schema(engine, args.reset)
+    started = time.perf_counter()
+    tenant = seed(engine, companies=1, employees=args.employees, devices=1, days=0, marketing_every=1)["tenants"][0]
+    positions = seed_tracking(engine, tenant["company_id"], args.fixes)
+    print(f"Seeded {args.employees} tracked employees x {args.fixes} fixes "
+          f"({positions} positions) in {time.perf_counter() - started:.1f}s")
+
+    headers = {"Authorization": f"Bearer {create_access_token(tenant['admin_username'], 'admin', tenant['company_id'])}"}
+    counter = QueryCounter(engine)
+    results = {}
+
+    with TestClient(app) as client:
+        def live(_):
+            res = client.get("/company/tracking/live", headers=headers)
+            return res.status_code == 200 and len(res.json()) == positions
+
+        live(None)
+        counter.reset()
+        latencies, errors, wall = run_concurrent(live, range(args.requests), args.concurrency)
+        results["tracking_live"] = summarize(latencies, errors, wall, counter.reset())
+
+    params = {k: v for k, v in vars(args).items() if k not in ("database_url", "output")}
+    write_report(args.output, "live_tracking", params, results, database_url)
+
+    r = results["tracking_live"]
+    print(f"tracking_live    p50={r['p50_ms']:.2f}ms p95={r['p95_ms']:.2f}ms p99={r['p99_ms']:.2f}ms "
+          f"queries/req={r['queries_per_request']} errors={r['errors']}")
+    print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
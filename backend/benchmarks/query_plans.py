@@ -0,0 +1,234 @@
+"""
+Query-plan regression check for the hot lookups.
+
+Seeds a database through the migration runner, runs ANALYZE, then EXPLAINs
+each hot query (built by the same app.core.queries / app.core.pagination
+functions the endpoints call, so the SQL is what ships) and checks
+that the planner reaches its rows through the expected index:
+
+    SQLite      EXPLAIN QUERY PLAN: the index is named, the table is not
+                SCANned, and an ordered query needs no temp B-tree sort.
+    PostgreSQL  EXPLAIN with enable_seqscan off: the index is named and
+                there is no Seq Scan (which, with seqscan disabled, means
+                no usable index exists).
+
+Exits non-zero when any plan regressed, so it can run in CI next to the
+benchmarks.
+
+Usage (from backend/):
+
+    python -m benchmarks.query_plans
+    python -m benchmarks.query_plans --database-url postgresql://localhost/bench --reset
+    python -m benchmarks.query_plans --verbose   # print every plan
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Optional
+
+from benchmarks.common import configure_database, reset_schema, seed, write_report
+
+
+@dataclass
+class HotQuery:
+    name: str
+    statement: object
+    index: str
+    ordered: bool = False   # The ORDER BY must be served by the index
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", help="Defaults to a throwaway SQLite file")
+    parser.add_argument("--reset", action="store_true", help="Allow wiping a non-SQLite database")
+    parser.add_argument("--companies", type=int, default=3)
+    parser.add_argument("--employees", type=int, default=200, help="Employees per company")
+    parser.add_argument("--days", type=int, default=20, help="Historical attendance days per employee")
+    parser.add_argument("--verbose", action="store_true")
+    parser.add_argument("--output", default=os.path.join(tempfile.gettempdir(), "query_plans.json"))
+    return parser.parse_args()
+
+
+def seed_activity(engine, tenants: list, days: int):
+    """Short leaves, door events, hourly rollups and tracking sessions on top of seed()"""
+    from sqlalchemy import insert, select
+    from app.db.models import DepartmentSession, DoorEvent, DoorEventHourly, Employee, LocationLog, ShortLeave
+
+    today = datetime.now().date()
+    with engine.begin() as conn:
+        for tenant in tenants:
+            company_id = tenant["company_id"]
+            leaves, events, hourly = [], [], []
+            for day in range(1, days + 1):
+                date_only = today - timedelta(days=day)
+                noon = datetime.combine(date_only, datetime.min.time()) + timedelta(hours=12)
+                for e, code in enumerate(tenant["employee_codes"]):
+                    if e % 4 == 0:
+                        leaves.append({
+                            "company_id": company_id, "employee_id": code, "date_only": date_only,
+                            "reason": "Bench", "exit_time": noon, "return_time": noon + timedelta(minutes=20)
+                        })
+                    events.append({
+                        "company_id": company_id, "event_type": "UNLOCK", "trigger_reason": "SCAN",
+                        "device_id": tenant["devices"][0][0], "created_at": noon + timedelta(seconds=e)
+                    })
+                for hour in range(24):
+                    hourly.append({
+                        "company_id": company_id, "device_id": tenant["devices"][0][0], "event_type": "UNLOCK",
+                        "hour_start": noon.replace(hour=hour), "event_count": 3
+                    })
+            conn.execute(insert(ShortLeave), leaves)
+            conn.execute(insert(DoorEvent), events)
+            conn.execute(insert(DoorEventHourly), hourly)
+
+            employee_ids = conn.execute(
+                select(Employee.id).where(Employee.company_id == company_id)
+            ).scalars().all()
+            for employee_id in employee_ids[::10]:
+                session_id = conn.execute(insert(DepartmentSession).values(
+                    employee_id=employee_id, company_id=company_id, department="Marketing",
+                    start_time=datetime.now() - timedelta(hours=2), active=True, route_summary={}
+                )).inserted_primary_key[0]
+                started = datetime.now() - timedelta(hours=2)
+                conn.execute(insert(LocationLog), [{
+                    "session_id": session_id, "latitude": 23.81 + i * 1e-4, "longitude": 90.41,
+                    "status": "moving", "recorded_at": started + timedelta(seconds=30 * i)
+                } for i in range(100)])
+
+
+def hot_queries(db, company_id: int, employee_code: str, employee_id: int, session_id: int) -> list:
+    """The endpoints' own queries, built by app.core.queries and paged by app.core.pagination"""
+    from app.core import queries
+    from app.core.location_archive import raw_points_query
+    from app.core.pagination import encode_cursor, page_query
+
+    today = datetime.now().date()
+    week_ago = today - timedelta(days=7)
+    week_start = datetime.combine(week_ago, datetime.min.time())
+
+    def page(query, keys, *after):
+        """First page, or the page after `after` (a deep cursor) when given"""
+        return page_query(query, keys, encode_cursor(after) if after else None, 500).statement
+
+    return [
+        HotQuery("attendance_employee_day", queries.attendance_day(
+            db, company_id, employee_code, today
+        ).statement, "uq_attendance_company_employee_day"),
+        HotQuery("attendance_employee_history", page_query(
+            queries.attendance_history(db, company_id, employee_code), queries.ATTENDANCE_PAGE_KEYS, None, 60
+        ).statement, "uq_attendance_company_employee_day"),
+        HotQuery("audit_attendance", page(
+            queries.audit_attendance(db, company_id), queries.ATTENDANCE_PAGE_KEYS
+        ), "ix_attendance_company_day_ts_id", ordered=True),
+        HotQuery("audit_attendance_deep_page", page(
+            queries.audit_attendance(db, company_id), queries.ATTENDANCE_PAGE_KEYS,
+            today - timedelta(days=10), datetime.combine(today - timedelta(days=10), datetime.min.time()), 1
+        ), "ix_attendance_company_day_ts_id", ordered=True),
+        HotQuery("short_leave_active", queries.active_short_leave(
+            db, company_id, employee_code, today
+        ).statement, "ix_short_leaves_company_employee_day"),
+        HotQuery("short_leave_today", queries.short_leaves_on(
+            db, company_id, employee_code, today
+        ).statement, "ix_short_leaves_company_employee_day"),
+        HotQuery("audit_short_leaves", page(
+            queries.audit_short_leaves(db, company_id), queries.SHORT_LEAVE_PAGE_KEYS
+        ), "ix_short_leaves_company_exit_id", ordered=True),
+        HotQuery("audit_short_leaves_deep_page", page(
+            queries.audit_short_leaves(db, company_id), queries.SHORT_LEAVE_PAGE_KEYS, week_start, 1
+        ), "ix_short_leaves_company_exit_id", ordered=True),
+        HotQuery("audit_door_events", page(
+            queries.audit_door_events(db, company_id), queries.DOOR_EVENT_PAGE_KEYS
+        ), "ix_door_events_company_created_id", ordered=True),
+        HotQuery("audit_door_events_deep_page", page(
+            queries.audit_door_events(db, company_id), queries.DOOR_EVENT_PAGE_KEYS, week_start, 1
+        ), "ix_door_events_company_created_id", ordered=True),
+        HotQuery("door_activity", queries.door_activity(
+            db, company_id, week_ago, today
+        ).statement, "ix_door_event_hourly_company_hour"),
+        HotQuery("sessions_employee_active", queries.active_sessions(
+            db, employee_id
+        ).statement, "ix_sessions_employee_active"),
+        HotQuery("location_logs_session", raw_points_query(
+            db, session_id, None
+        ).statement, "ix_location_logs_session_recorded", ordered=True),
+    ]
+
+
+def explain(conn, statement) -> list:
+    compiled = statement.compile(dialect=conn.dialect, compile_kwargs={"render_postcompile": True})
+    if conn.dialect.name == "sqlite":
+        params = tuple(compiled.params[key] for key in compiled.positiontup)
+        rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", params).all()
+        return [row[-1] for row in rows]
+    rows = conn.exec_driver_sql(f"EXPLAIN {compiled}", compiled.params).all()
+    return [row[0] for row in rows]
+
+
+def check_plan(dialect: str, query: HotQuery, plan: list) -> Optional[str]:
+    text = "\n".join(plan)
+    if query.index not in text:
+        return f"expected index {query.index} is not used"
+    if dialect == "sqlite":
+        table = query.statement.get_final_froms()[0].name
+        if any(line.startswith(f"SCAN {table}") and "INDEX" not in line for line in plan):
+            return f"full scan of {table}"
+        if query.ordered and "USE TEMP B-TREE" in text:
+            return "ORDER BY is sorted in a temp B-tree instead of read from the index"
+    elif "Seq Scan" in text:
+        return "sequential scan"
+    return None
+
+
+def main():
+    args = parse_args()
+    database_url = configure_database(args.database_url)
+    logging.disable(logging.INFO)
+
+    from sqlalchemy import select, text
+    from sqlalchemy.orm import Session
+    from app.db.database import engine
+    from app.db.models import DepartmentSession, Employee
+
+    reset_schema(engine, args.reset)
+    seeded = seed(engine, args.companies, args.employees, devices=1, days=args.days)
+    seed_activity(engine, seeded["tenants"], args.days)
+
+    tenant = seeded["tenants"][-1]
+    failures, results = 0, {}
+    with engine.connect() as conn:
+        conn.execute(text("ANALYZE"))
+        if engine.dialect.name == "postgresql":
+            conn.execute(text("SET enable_seqscan = off"))
+        employee_code = tenant["employee_codes"][0]
+        employee_id = conn.execute(select(Employee.id).where(
+            Employee.company_id == tenant["company_id"], Employee.employee_id == employee_code
+        )).scalar_one()
+        session_id = conn.execute(select(DepartmentSession.id).where(
+            DepartmentSession.company_id == tenant["company_id"]
+        ).limit(1)).scalar_one()
+
+        db = Session(bind=conn)  # Only builds the statements; EXPLAIN runs on conn
+        for query in hot_queries(db, tenant["company_id"], employee_code, employee_id, session_id):
+            plan = explain(conn, query.statement)
+            problem = check_plan(engine.dialect.name, query, plan)
+            results[query.name] = {"index": query.index, "ok": problem is None, "problem": problem, "plan": plan}
+            print(f"{query.name:28} {'ok' if problem is None else 'REGRESSION: ' + problem}")
+            if args.verbose or problem:
+                for line in plan:
+                    print(f"    {line}")
+            failures += problem is not None
+
+    params = {k: v for k, v in vars(args).items() if k not in ("database_url", "output", "verbose")}
+    write_report(args.output, "query_plans", params, results, database_url)
+    print(f"Wrote {args.output}")
+    if failures:
+        print(f"{failures} hot quer{'y' if failures == 1 else 'ies'} lost their index")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
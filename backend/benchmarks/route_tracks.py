@@ -0,0 +1,178 @@
+"""
+Movement classification check on synthetic GPS tracks.
+
+Builds tracks with known ground truth (walking and driving at 1-5 s fix
+intervals with GPS noise, standing still with jitter, a stop in the middle
+of a walk, an offline gap) and checks against it:
+
+    summary   distance and moving / idle time from
+              app.core.route_summary.summarize_points
+    rollup    distance in location_hourly_rollups after the rollup job has
+              folded the track in --rollup-chunk row pieces (several runs,
+              so excursions have to join up across them)
+
+Exits non-zero when a track is off by more than its tolerance, so it can
+run in CI next to the benchmarks.
+
+Usage (from backend/):
+
+    python -m benchmarks.route_tracks
+    python -m benchmarks.route_tracks --noise 5 --seed 7
+"""
+import argparse
+import logging
+import sys
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from benchmarks.common import configure_database, reset_schema, seed
+
+METRES_PER_DEG_LAT = 111_320.0
+ORIGIN = (23.8103, 90.4125)  # Dhaka
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--noise", type=float, default=3.0, help="GPS noise (metres, 1 sigma per axis)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--rollup-chunk", type=int, default=700, help="Location rows per rollup chunk")
+    return parser.parse_args()
+
+
+def build_track(legs: list, interval: float, noise: float, rng, start: datetime = None):
+    """
+    legs: (seconds, speed m/s, heading degrees) pieces of the route; speed 0
+    stands still, speed None is an offline gap (no fixes). Returns
+    (times, lats, lons, true distance, true moving seconds).
+    """
+    start = start or datetime(2026, 1, 5, 9, 0)
+    x = y = elapsed = 0.0
+    times, xs, ys = [start], [0.0], [0.0]
+    distance = moving = 0.0
+    for seconds, speed, heading in legs:
+        if speed is None:
+            elapsed += seconds
+            continue
+        dx, dy = np.sin(np.radians(heading)), np.cos(np.radians(heading))
+        for _ in range(int(seconds / interval)):
+            elapsed += interval
+            x, y = x + dx * speed * interval, y + dy * speed * interval
+            times.append(start + timedelta(seconds=elapsed))
+            xs.append(x)
+            ys.append(y)
+        distance += speed * seconds
+        moving += seconds if speed else 0
+
+    xs = np.asarray(xs) + rng.normal(0, noise, len(xs))
+    ys = np.asarray(ys) + rng.normal(0, noise, len(ys))
+    lats = ORIGIN[0] + ys / METRES_PER_DEG_LAT
+    lons = ORIGIN[1] + xs / (METRES_PER_DEG_LAT * np.cos(np.radians(ORIGIN[0])))
+    return times, lats.tolist(), lons.tolist(), distance, moving
+
+
+def city_walk(seconds: float, speed: float = 1.4) -> list:
+    """Blocks of 250 m, turning right at each corner"""
+    side = 250 / speed
+    legs, heading = [], 0
+    while seconds > 0:
+        legs.append((min(side, seconds), speed, heading))
+        seconds -= side
+        heading = (heading + 90) % 360
+    return legs
+
+
+def scenarios() -> list:
+    """(name, legs, interval, distance tolerance, moving-time tolerance) as fractions of the truth"""
+    cases = []
+    for interval in (1, 2, 5):
+        cases.append((f"walk_1h_{interval}s", city_walk(3600), interval, 0.10, 0.10))
+    cases += [
+        ("drive_30m_5s", [(600, 12.0, 0), (600, 8.0, 90), (600, 15.0, 180)], 5, 0.05, 0.05),
+        ("stand_1h_1s", [(3600, 0.0, 0)], 1, None, None),
+        ("stand_1h_5s", [(3600, 0.0, 0)], 5, None, None),
+        ("walk_stop_walk_2s", city_walk(900) + [(1800, 0.0, 0)] + city_walk(900), 2, 0.10, 0.10),
+        ("walk_gap_walk_5s", city_walk(900) + [(3600, None, 0)] + city_walk(900), 5, 0.10, 0.10),
+    ]
+    return cases
+
+
+def rollup_distances(engine, tracks: list) -> list:
+    """Inserts each track as a session, runs the rollup job to the end; distance_m per track"""
+    from sqlalchemy import func, insert, select
+    from app.core.location_rollup import run_rollup
+    from app.db.database import SessionLocal
+    from app.db.models import DepartmentSession, Employee, LocationHourly, LocationLog
+
+    with engine.begin() as conn:
+        employee_id, company_id = conn.execute(select(Employee.id, Employee.company_id).limit(1)).one()
+        session_ids = []
+        for times, lats, lons in tracks:
+            session_id = conn.execute(insert(DepartmentSession).values(
+                employee_id=employee_id, company_id=company_id, department="Marketing",
+                start_time=times[0], active=False, route_summary={}
+            )).inserted_primary_key[0]
+            conn.execute(insert(LocationLog), [{
+                "session_id": session_id, "latitude": lat, "longitude": lon, "status": "moving", "recorded_at": at
+            } for at, lat, lon in zip(times, lats, lons)])
+            session_ids.append(session_id)
+
+    db = SessionLocal()
+    try:
+        run_rollup(db)  # A run only goes up to the ids the previous run saw
+        run_rollup(db)
+        totals = dict(db.query(LocationHourly.session_id, func.sum(LocationHourly.distance_m)).group_by(
+            LocationHourly.session_id
+        ).all())
+    finally:
+        db.close()
+    return [totals.get(session_id) or 0.0 for session_id in session_ids]
+
+
+def main():
+    args = parse_args()
+    configure_database(env={"LOCATION_ROLLUP_CHUNK_SIZE": args.rollup_chunk})
+    logging.disable(logging.INFO)
+
+    from app.core.route_summary import summarize_points
+    from app.db.database import engine
+
+    reset_schema(engine, False)
+    seed(engine, 1, 1, devices=1, days=0)
+
+    rng = np.random.default_rng(args.seed)
+    cases = [(case, build_track(case[1], case[2], args.noise, rng)) for case in scenarios()]
+    rolled = rollup_distances(engine, [track[:3] for _, track in cases])
+
+    failures = 0
+    print(f"{'track':22} {'distance m':>18} {'rollup m':>9} {'moving s':>16} {'idle s':>7} {'gap s':>6}")
+    for ((name, _, _, dist_tol, moving_tol), (times, lats, lons, distance, moving)), rollup in zip(cases, rolled):
+        summary = summarize_points(times, lats, lons)
+
+        problems = []
+        if dist_tol is None:
+            # Standing still: jitter may leak through now and then, but not a walk's worth (~1%)
+            if summary["distance_m"] > 50 or summary["moving_seconds"] > 0.02 * summary["idle_seconds"]:
+                problems.append("jitter counted as movement")
+            if rollup > 50:
+                problems.append("jitter rolled up as distance")
+        else:
+            if abs(summary["distance_m"] - distance) > dist_tol * distance:
+                problems.append(f"distance off by more than {dist_tol:.0%}")
+            if abs(rollup - distance) > dist_tol * distance:
+                problems.append(f"rollup distance off by more than {dist_tol:.0%}")
+            if abs(summary["moving_seconds"] - moving) > moving_tol * moving:
+                problems.append(f"moving time off by more than {moving_tol:.0%}")
+
+        print(f"{name:22} {summary['distance_m']:8.0f} / {distance:7.0f} {rollup:9.0f} "
+              f"{summary['moving_seconds']:6} / {moving:6.0f} {summary['idle_seconds']:7} {summary['gap_seconds']:6}"
+              f"  {'ok' if not problems else 'FAIL: ' + '; '.join(problems)}")
+        failures += bool(problems)
+
+    if failures:
+        print(f"{failures} track{'' if failures == 1 else 's'} misclassified")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
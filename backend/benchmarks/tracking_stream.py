@@ -0,0 +1,202 @@
+"""
+Live tracking stream load test.
+
+Starts the app on a real uvicorn server, opens --subscribers concurrent SSE
+connections to GET /company/tracking/stream, then posts --fixes location
+updates (POST /api/tracking/update) spread over --employees tracked staff at
+--rate fixes/second. Every fix carries a unique latitude, so each subscriber
+can time fix POST -> event received.
+
+Subscribers run in --client-procs separate processes so parsing the streams
+doesn't compete with the server for the GIL. Reports fan-out latency
+percentiles, positions received per subscriber (fewer than sent = coalesced
+for a slow reader) and the hub counters.
+
+Usage (from backend/):
+
+    python -m benchmarks.tracking_stream --subscribers 500 --employees 200 --fixes 2000 --rate 200
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+
+from benchmarks.common import configure_database, reset_schema, seed, start_server, summarize, write_report
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", help="Defaults to a throwaway SQLite file")
+    parser.add_argument("--reset", action="store_true", help="Allow wiping a non-SQLite database")
+    parser.add_argument("--subscribers", type=int, default=200, help="Concurrent dashboard streams")
+    parser.add_argument("--employees", type=int, default=100, help="Tracked employees sending fixes")
+    parser.add_argument("--fixes", type=int, default=1000, help="Location updates to send")
+    parser.add_argument("--rate", type=float, default=100, help="Location updates per second")
+    parser.add_argument("--publishers", type=int, default=8, help="Concurrent update senders")
+    parser.add_argument("--client-procs", type=int, default=4, help="Processes the subscribers are spread over")
+    parser.add_argument("--output", default="tracking_stream.json")
+    return parser.parse_args()
+
+
+def seed_sessions(engine, company_id: int) -> list:
+    """One open session per employee; returns (session_id, employee bearer token) pairs"""
+    from sqlalchemy import insert, select
+    from app.core.security import create_access_token
+    from app.db.models import DepartmentSession, Employee
+
+    with engine.begin() as conn:
+        employee_ids = conn.execute(select(Employee.id).where(Employee.company_id == company_id)).scalars().all()
+        conn.execute(insert(DepartmentSession), [{
+            "employee_id": emp_id, "company_id": company_id, "department": "Marketing", "active": True
+        } for emp_id in employee_ids])
+        rows = conn.execute(select(DepartmentSession.id, Employee.employee_id).join(
+            Employee, Employee.id == DepartmentSession.employee_id
+        )).all()
+    return [(session_id, create_access_token(code, "employee", company_id)) for session_id, code in rows]
+
+
+async def _subscribe_streams(base_url: str, token: str, count: int, ready, stop) -> list:
+    import httpx
+
+    arrivals = []  # (latitude, perf_counter at receipt) per position received
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=httpx.Timeout(None)) as client:
+
+        async def subscriber():
+            res = await client.post("/company/tracking/stream-ticket", headers={"Authorization": f"Bearer {token}"})
+            res.raise_for_status()
+            async with client.stream("GET", "/company/tracking/stream", params={"ticket": res.json()["ticket"]}) as res:
+                event = None
+                async for line in res.aiter_lines():
+                    if line.startswith("event: "):
+                        event = line[7:]
+                    elif line.startswith("data: "):
+                        if event == "snapshot":
+                            ready.put(1)
+                            continue
+                        now = time.perf_counter()
+                        arrivals.extend((position["lat"], now) for position in json.loads(line[6:]))
+
+        streams = [asyncio.create_task(subscriber()) for _ in range(count)]
+        while not stop.is_set():
+            await asyncio.sleep(0.1)
+        for task in streams:
+            task.cancel()
+        await asyncio.gather(*streams, return_exceptions=True)
+    return arrivals
+
+
+def subscriber_process(base_url: str, token: str, count: int, ready, stop, results):
+    """Runs `count` streams in its own process so readers don't share the server's GIL"""
+    logging.disable(logging.INFO)
+    results.put(asyncio.run(_subscribe_streams(base_url, token, count, ready, stop)))
+
+
+async def publish_fixes(args, base_url: str, sessions: list) -> tuple:
+    import httpx
+
+    sent_at = {}  # latitude -> perf_counter when the update was posted
+    errors = 0
+    queue = asyncio.Queue()
+    for i in range(args.fixes):
+        queue.put_nowait(i)
+    interval = args.publishers / args.rate if args.rate else 0
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=httpx.Timeout(30)) as client:
+        async def publisher():
+            nonlocal errors
+            while not queue.empty():
+                i = queue.get_nowait()
+                lat = round(23.0 + i / 1_000_000, 6)
+                sent_at[lat] = time.perf_counter()
+                session_id, employee_token = sessions[i % len(sessions)]
+                res = await client.post("/api/tracking/update", json={
+                    "session_id": session_id, "lat": lat, "lng": 90.4, "status": "moving"
+                }, headers={"Authorization": f"Bearer {employee_token}"})
+                if res.status_code != 200:
+                    errors += 1
+                await asyncio.sleep(interval)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(publisher() for _ in range(args.publishers)))
+        wall = time.perf_counter() - started
+        await asyncio.sleep(1.0)  # Let the last batches drain
+        hub = (await client.get("/saas/metrics")).json()["tracking_stream"]
+    return sent_at, errors, wall, hub
+
+
+def run(args, base_url: str, token: str, sessions: list) -> dict:
+    import multiprocessing
+
+    ctx = multiprocessing.get_context("spawn")
+    ready, results, stop = ctx.Queue(), ctx.Queue(), ctx.Event()
+    procs = []
+    per_proc = [args.subscribers // args.client_procs + (1 if i < args.subscribers % args.client_procs else 0)
+                for i in range(args.client_procs)]
+    for count in per_proc:
+        if count:
+            proc = ctx.Process(target=subscriber_process, args=(base_url, token, count, ready, stop, results))
+            proc.start()
+            procs.append(proc)
+    for _ in range(args.subscribers):
+        ready.get(timeout=120)
+
+    sent_at, errors, wall, hub = asyncio.run(publish_fixes(args, base_url, sessions))
+
+    stop.set()
+    per_subscriber_lists = [results.get(timeout=120) for _ in procs]
+    for proc in procs:
+        proc.join(30)
+
+    latencies = [
+        (received - sent_at[lat]) * 1000
+        for arrivals in per_subscriber_lists for lat, received in arrivals if lat in sent_at
+    ]
+    delivered = sum(len(a) for a in per_subscriber_lists)
+    return {
+        "fan_out": summarize(latencies, errors, wall),
+        "updates_per_second": round(args.fixes / wall, 2),
+        "positions_delivered": delivered,
+        "positions_per_subscriber": round(delivered / args.subscribers, 2) if args.subscribers else 0.0,
+        "hub": hub,
+    }
+
+
+def main():
+    args = parse_args()
+    database_url = configure_database(args.database_url, env={
+        "RETENTION_JOB_ENABLED": "false",
+        "TRACKING_STREAM_KEEPALIVE_SECONDS": "5"
+    })
+    logging.disable(logging.INFO)
+
+    from app.core.security import create_access_token
+    from app.db.database import engine
+    from app.main import app
+
+    reset_schema(engine, args.reset)
+    tenant = seed(engine, companies=1, employees=args.employees, devices=1, days=0, marketing_every=1)["tenants"][0]
+    sessions = seed_sessions(engine, tenant["company_id"])
+    token = create_access_token(tenant["admin_username"], "admin", tenant["company_id"])
+
+    server, thread, base_url = start_server(app)
+    try:
+        results = run(args, base_url, token, sessions)
+    finally:
+        server.should_exit = True
+        thread.join(10)
+
+    params = {k: v for k, v in vars(args).items() if k not in ("database_url", "output")}
+    write_report(args.output, "tracking_stream", params, results, database_url)
+
+    r = results["fan_out"]
+    print(f"subscribers={args.subscribers} updates/s={results['updates_per_second']} "
+          f"fan-out p50={r['p50_ms']:.2f}ms p95={r['p95_ms']:.2f}ms p99={r['p99_ms']:.2f}ms errors={r['errors']}")
+    print(f"positions/subscriber={results['positions_per_subscriber']} "
+          f"(sent {args.fixes}, coalesced {results['hub']['coalesced']})")
+    print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
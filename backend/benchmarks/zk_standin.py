@@ -0,0 +1,81 @@
+"""
+Local stand-in for the ZKTeco cloud transactions API used by app/core/zk_sync.py.
+
+Serves GET /iclock/api/transactions/?terminal_sn=&start_time=&page=&page_size=
+with BioTime-style pagination ({"count", "next", "previous", "data"}) from an
+in-memory punch list that callers can append to between sync runs.
+"""
+import json
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+
+
+class PunchStore:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._next_id = 1
+        self.by_terminal = {}
+        self.requests = 0
+
+    def add(self, terminal_sn: str, employee_codes: list, count: int, start: datetime, step_seconds: int = 7):
+        with self._lock:
+            punches = self.by_terminal.setdefault(terminal_sn, [])
+            for i in range(count):
+                punches.append({
+                    "id": self._next_id,
+                    "emp_code": employee_codes[i % len(employee_codes)],
+                    "punch_time": (start + timedelta(seconds=i * step_seconds)).strftime("%Y-%m-%d %H:%M:%S"),
+                    "terminal_sn": terminal_sn
+                })
+                self._next_id += 1
+
+    def query(self, terminal_sn: str, start_time: str = None):
+        with self._lock:
+            punches = list(self.by_terminal.get(terminal_sn, []))
+        if start_time:
+            punches = [p for p in punches if p["punch_time"] >= start_time]
+        return punches
+
+
+def make_handler(store: PunchStore, api_key: str):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path != "/iclock/api/transactions/":
+                return self._send(404, {"detail": "Not found"})
+            if self.headers.get("Authorization") != f"Token {api_key}":
+                return self._send(401, {"detail": "Invalid token"})
+
+            store.requests += 1
+            qs = {k: v[0] for k, v in parse_qs(url.query).items()}
+            page, page_size = int(qs.get("page", 1)), int(qs.get("page_size", 100))
+            punches = store.query(qs.get("terminal_sn", ""), qs.get("start_time"))
+            data = punches[(page - 1) * page_size: page * page_size]
+
+            next_url = None
+            if page * page_size < len(punches):
+                host = f"http://{self.headers.get('Host')}"
+                next_url = f"{host}{url.path}?{urlencode({**qs, 'page': page + 1})}"
+            self._send(200, {"count": len(punches), "next": next_url, "previous": None, "data": data})
+
+        def _send(self, status: int, body: dict):
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def start_standin(store: PunchStore, api_key: str, port: int = 0):
+    """Starts the server on a background thread; returns (server, base_url)"""
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(store, api_key))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
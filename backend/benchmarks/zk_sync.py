@@ -0,0 +1,133 @@
+"""
+ZKTeco cloud sync benchmark / end-to-end check.
+
+Starts the local stand-in API (benchmarks/zk_standin.py), seeds ZK_CONTROLLER
+devices, and runs app.core.zk_sync.run_sync:
+
+    1. initial backfill of --punches punches per device
+    2. immediately again: the cursors must make this fetch zero rows
+    3. after --new-punches more per device: only those must be ingested
+    4. after --new-punches more, two overlapping runs: each punch stored once
+
+Reports rows/second and per-device lag for each run and writes them as JSON.
+
+Usage (from backend/):
+
+    python -m benchmarks.zk_sync --companies 4 --devices 3 --punches 5000
+"""
+import argparse
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import pytz
+
+from benchmarks.common import configure_database, reset_schema, seed, write_report
+from benchmarks.zk_standin import PunchStore, start_standin
+
+API_KEY = "bench-zk-key"
+
+
+def dhaka_now() -> datetime:
+    # Terminals report naive local (Dhaka) punch times
+    return datetime.now(pytz.timezone("Asia/Dhaka")).replace(tzinfo=None)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", help="Defaults to a throwaway SQLite file")
+    parser.add_argument("--reset", action="store_true", help="Allow wiping a non-SQLite database")
+    parser.add_argument("--companies", type=int, default=3)
+    parser.add_argument("--employees", type=int, default=200, help="Employees per company")
+    parser.add_argument("--devices", type=int, default=2, help="ZK devices per company")
+    parser.add_argument("--punches", type=int, default=3000, help="Backfill punches per device")
+    parser.add_argument("--new-punches", type=int, default=250, help="Punches added before the last run")
+    parser.add_argument("--page-size", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--output", default="zk_sync.json")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    store = PunchStore()
+    server, base_url = start_standin(store, API_KEY)
+    database_url = configure_database(args.database_url, env={
+        "ZK_API_URL": base_url,
+        "ZK_API_KEY": API_KEY,
+        "ZK_SYNC_PAGE_SIZE": args.page_size,
+        "ZK_SYNC_CONCURRENCY": args.concurrency,
+        "ZK_SYNC_MAX_PAGES": 10_000
+    })
+    logging.disable(logging.INFO)
+
+    from app.db.database import engine, SessionLocal
+    from app.db.models import DoorEvent
+    from app.core.zk_sync import run_sync
+
+    reset_schema(engine, args.reset)
+    data = seed(engine, args.companies, args.employees, args.devices, days=0, device_type="ZK_CONTROLLER")
+
+    start = dhaka_now() - timedelta(hours=36)
+    for tenant in data["tenants"]:
+        for uid, _ in tenant["devices"]:
+            store.add(uid, tenant["employee_codes"], args.punches, start)
+
+    def run_sync_session() -> dict:
+        db = SessionLocal()
+        try:
+            return run_sync(db)
+        finally:
+            db.close()
+
+    def sync(label: str, expected_rows: int) -> dict:
+        report = run_sync_session()
+        ok = report["rows"] == expected_rows and not report["failed_devices"]
+        print(f"{label:10} rows={report['rows']:>7} expected={expected_rows:>7} "
+              f"rows/s={report['rows_per_second']:>9.1f} seconds={report['seconds']:.2f} {'OK' if ok else 'MISMATCH'}")
+        if not ok:
+            raise SystemExit(f"{label}: unexpected sync result")
+        return report
+
+    total_devices = args.companies * args.devices
+    results = {"backfill": sync("backfill", args.punches * total_devices)}
+    results["no_change"] = sync("no_change", 0)
+
+    later = dhaka_now() - timedelta(minutes=30)
+    for tenant in data["tenants"]:
+        for uid, _ in tenant["devices"]:
+            store.add(uid, tenant["employee_codes"], args.new_punches, later)
+    results["incremental"] = sync("increment", args.new_punches * total_devices)
+
+    # Two overlapping runs (a double-clicked /sync): together they store each new punch once
+    later = dhaka_now()  # After the last batch, whose punches run up to about a minute ago
+    for tenant in data["tenants"]:
+        for uid, _ in tenant["devices"]:
+            store.add(uid, tenant["employee_codes"], args.new_punches, later)
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        reports = list(pool.map(lambda _: run_sync_session(), range(2)))
+    overlap_rows = sum(r["rows"] for r in reports)
+    print(f"{'overlap':10} rows={overlap_rows:>7} expected={args.new_punches * total_devices:>7} "
+          f"skipped={sum(r['skipped_devices'] for r in reports)} "
+          f"{'OK' if overlap_rows == args.new_punches * total_devices else 'MISMATCH'}")
+    if overlap_rows != args.new_punches * total_devices or any(r["failed_devices"] for r in reports):
+        raise SystemExit("overlap: punches stored twice or not at all")
+    results["overlap"] = reports
+
+    db = SessionLocal()
+    events = db.query(DoorEvent).filter(DoorEvent.event_type == "ZK_CLOUD_SYNC").count()
+    db.close()
+    if events != (args.punches + 2 * args.new_punches) * total_devices:
+        raise SystemExit(f"Expected one door event per punch, found {events}")
+
+    results["http_requests"] = store.requests
+    server.shutdown()
+
+    params = {k: v for k, v in vars(args).items() if k not in ("database_url", "output")}
+    write_report(args.output, "zk_sync", params, results, database_url)
+    lags = [d["lag_seconds"] for d in results["incremental"]["per_device"]]
+    print(f"Max device lag after last run: {max(lags):.0f}s. Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
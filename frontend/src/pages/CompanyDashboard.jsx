@@ -29,6 +29,7 @@ const CompanyDashboard = () => {
 
   // AUDIT STATE 
   const [auditData, setAuditData] = useState({ attendance: [], shortLeaves: [], doorEvents: [] });
+  const [auditCursors, setAuditCursors] = useState({ attendance: null, shortLeaves: null, doorEvents: null });
   const [auditSubTab, setAuditSubTab] = useState('attendance');
   const [attFilter, setAttFilter] = useState('all'); 
 
@@ -78,15 +79,41 @@ const CompanyDashboard = () => {
         companyService.getAllDoorEvents()
       ]);
       setAuditData({
-        attendance: attRes.data,
-        shortLeaves: leavesRes.data,
-        doorEvents: doorsRes.data
+        attendance: attRes.data.items,
+        shortLeaves: leavesRes.data.items,
+        doorEvents: doorsRes.data.items
+      });
+      setAuditCursors({
+        attendance: attRes.data.next_cursor,
+        shortLeaves: leavesRes.data.next_cursor,
+        doorEvents: doorsRes.data.next_cursor
       });
     } catch (err) {
       toast.error("Failed to load audit logs");
     }
   };
 
+  const loadOlderAudit = async (key) => {
+    const fetchers = {
+      attendance: companyService.getAllAttendance,
+      shortLeaves: companyService.getAllShortLeaves,
+      doorEvents: companyService.getAllDoorEvents
+    };
+    try {
+      const res = await fetchers[key](auditCursors[key]);
+      setAuditData(prev => ({ ...prev, [key]: [...prev[key], ...res.data.items] }));
+      setAuditCursors(prev => ({ ...prev, [key]: res.data.next_cursor }));
+    } catch (err) {
+      toast.error("Failed to load older records");
+    }
+  };
+
+  const renderLoadOlder = (key) => auditCursors[key] ? (
+    <button onClick={() => loadOlderAudit(key)} className="mt-4 w-full py-2 rounded-lg border border-slate-200 text-sm font-bold text-slate-600 hover:bg-slate-100">
+      Load older records
+    </button>
+  ) : null;
+
   const handleSaveSchedule = async (e) => {
     e.preventDefault();
     try {
@@ -192,7 +219,7 @@ const CompanyDashboard = () => {
     setAttendanceHistory([]); 
     try {
       const res = await companyService.getEmployeeHistory(emp.employee_id);
-      setAttendanceHistory(res.data);
+      setAttendanceHistory(res.data.items);
     } catch (err) {
       toast.error("Could not fetch history");
     }
@@ -506,10 +533,12 @@ const CompanyDashboard = () => {
                       ))}
                     </tbody>
                   </table>
+                  {renderLoadOlder('attendance')}
                 </>
               )}
 
               {auditSubTab === 'short_leaves' && (
+                <>
                 <table className="w-full text-left text-sm whitespace-nowrap">
                   <thead className="bg-slate-100 text-slate-600">
                     <tr>
@@ -533,9 +562,12 @@ const CompanyDashboard = () => {
                     ))}
                   </tbody>
                 </table>
+                {renderLoadOlder('shortLeaves')}
+                </>
               )}
 
               {auditSubTab === 'door_events' && (
+                <>
                 <table className="w-full text-left text-sm whitespace-nowrap">
                   <thead className="bg-slate-100 text-slate-600">
                     <tr>
@@ -562,6 +594,8 @@ const CompanyDashboard = () => {
                     })}
                   </tbody>
                 </table>
+                {renderLoadOlder('doorEvents')}
+                </>
               )}
             </div>
           </div>
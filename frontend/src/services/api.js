@@ -70,7 +70,7 @@ export const companyService = {
   addEmployee: (data) => api.post('/company/employees', data),
   
   getEmployees: () => api.get('/company/employees'),
-  getEmployeeHistory: (empId) => api.get(`/company/employees/${empId}/attendance`),
+  getEmployeeHistory: (empId, cursor) => api.get(`/company/employees/${empId}/attendance`, { params: { cursor } }),
   getLiveTracking: () => api.get('/company/tracking/live'),
   
   deleteEmployee: (dbId) => api.delete(`/company/employees/${dbId}`),
@@ -109,10 +109,10 @@ export const companyService = {
     super_late_threshold: superLateThreshold
   }),
 
-  // FULL AUDIT ENDPOINTS
-  getAllAttendance: () => api.get('/company/audit/attendance'),
-  getAllShortLeaves: () => api.get('/company/audit/short_leaves'),
-  getAllDoorEvents: () => api.get('/company/audit/door_events'),
+  // FULL AUDIT ENDPOINTS (newest first; pass the previous page's next_cursor for older rows)
+  getAllAttendance: (cursor) => api.get('/company/audit/attendance', { params: { cursor } }),
+  getAllShortLeaves: (cursor) => api.get('/company/audit/short_leaves', { params: { cursor } }),
+  getAllDoorEvents: (cursor) => api.get('/company/audit/door_events', { params: { cursor } }),
 };
 
 export const employeeService = {